@@ -20,8 +20,10 @@ import re
 from AnomalyPlugin.wrappers import Track, Pad, Via, Net
 from AnomalyPlugin.track_gui import TrackGUI
 from AnomalyPlugin.show_results_dialog import ShowResultsDialog
-from AnomalyPlugin.generate_slices_mp import createSlicesMP
-from AnomalyPlugin.server_api import ServerAPI
+from AnomalyPlugin.generate_slices_mp import createSlicesMP, createLayers, createGeometry
+from AnomalyPlugin.server_api import ServerAPI, get_transfer_path
+from AnomalyPlugin.local_engine import LocalEngine
+from AnomalyPlugin.results_store import ResultsStore
 #from .wrappers import Track, Pad, Via, Net
 #from . import TrackGUI
 #from .alternative_generate_slices import createSlicesAlt
@@ -238,12 +240,13 @@ class MainPlugin(pcbnew.ActionPlugin):
 
 
     def scheduled_stop_server(self):
-        """Make sure to stop the locally started docker server once kicad is closed.
+        """Make sure to stop the locally started docker server or local engine once kicad is closed.
         """
         try:
             self.anopcb_server_container.stop()
         except Exception:
             pass
+        self.local_engine.stop()
 
     def scheduled_session_removal(self):
         """Make sure to remove session from server before closing application.
@@ -287,11 +290,13 @@ class MainPlugin(pcbnew.ActionPlugin):
             self.anopcb_regex_backup_path = os.path.join(
                 self.project_dir_path, 'anopcb_kicad_regex_backup.json')
             self.anopcb_filter_layers_path = os.path.join(
-                self.project_dir_path, 'anopcb_filter_layers.json')
+                self.project_dir_path, 'anopcb_filter_layers.npy')
             self.anopcb_filter_slices_path = os.path.join(
-                self.project_dir_path, 'anopcb_filter_slices.json')
+                self.project_dir_path, 'anopcb_filter_slices.npz')
             self.anopcb_filter_results_path = os.path.join(
-                self.project_dir_path, 'anopcb_filter_results.json')
+                self.project_dir_path, 'anopcb_filter_results.npz')
+            self.results_store = ResultsStore(os.path.join(
+                self.project_dir_path, 'anopcb_results'))
 
             # if anopcb already saved annotation data, we will want to load it
             # if we cant load it the backup wont be overriden with the new (empty) dictionary
@@ -334,6 +339,8 @@ class MainPlugin(pcbnew.ActionPlugin):
                 self.preferences["server_type"] = "remote"
             if self.preferences.get("save_filter_data") is None:
                 self.preferences["save_filter_data"] = False
+            if self.preferences.get("server_slicing") is None:
+                self.preferences["server_slicing"] = False
 
             if self.preferences.get("signal1") is None:
                 self.preferences["signal1"] = "digital stable"
@@ -377,14 +384,19 @@ class MainPlugin(pcbnew.ActionPlugin):
             self.server_api = ServerAPI(
                 self.get_preference("server_address"),
                 self.get_preference("server_port"))
+            # server running in a child process, used instead of docker with the "local" server type
+            self.local_engine = LocalEngine()
             
+            # registered once, stops a started server after the session was removed (run in reverse order)
+            atexit.register(self.scheduled_stop_server)
             atexit.register(self.scheduled_session_removal)
 
 
     def maybe_start_anopcb_server(self):
         """
         Checks whether a local server is wished for by the user.
-         Proceeds to start one, by using docker.
+         Proceeds to start one, by using docker. The "local" server type runs
+         the server in a child process of kicad instead, which is ready once started.
          When no docker server image is located on disk it also downloads it from the internet.
          It can start a server using the cpu or the gpu, decided by the user.
          Make sure to have docker installed, running and working!
@@ -403,6 +415,12 @@ class MainPlugin(pcbnew.ActionPlugin):
         if docker_tag == "remote":
             return False
 
+        if docker_tag == "local":
+            # the engine waits until it's ready to serve, no need to wait for it to boot
+            self.local_engine.start()
+            self.server_api.use_local_engine(self.local_engine)
+            return False
+
         if os.system("which docker") == 256:
             wx.MessageBox(
                 "Docker not installed, install or use remote server instead!",
@@ -442,8 +460,16 @@ class MainPlugin(pcbnew.ActionPlugin):
                 return False
 
             mount_volumes = {"anopcb-models": {"bind": "/anopcb-server/models", "mode": "rw"}}
+            # shared directory, slices and results are exchanged as files instead of json
+            transfer_path = get_transfer_path()
+            try:
+                os.makedirs(transfer_path, exist_ok=True)
+                mount_volumes.update({transfer_path: {"bind": "/anopcb-server/transfer", "mode": "rw"}})
+            except OSError:
+                pass
             try:
-                mount_volumes.update({f"{os.environ['ANOPCB_SERVER_SOURCE']}/AnomalyServer.py": {"bind": "/anopcb-server/AnomalyServer.py", "mode": "rw"}})
+                for module in ("AnomalyServer.py", "Slicer.py", "Reservations.py", "Storage.py", "LiteModels.py", "InferenceWorkers.py", "Scheduler.py", "Spooling.py"):
+                    mount_volumes.update({f"{os.environ['ANOPCB_SERVER_SOURCE']}/{module}": {"bind": f"/anopcb-server/{module}", "mode": "rw"}})
             except:
                 pass
 
@@ -453,13 +479,12 @@ class MainPlugin(pcbnew.ActionPlugin):
                 ports={23923: 23923},
                 detach=True,
                 volumes=mount_volumes,
+                # the image may predate the default set by the Dockerfile
+                environment={"ANOPCB_TRANSFER_PATH": "/anopcb-server/transfer"},
                 name=f"anopcb-server-{docker_tag}")
             server_started_here = True
         self.server_api.update_adress("localhost", 23923)
 
-        # register clean up function to stop the server later
-        atexit.register(self.scheduled_stop_server)
-
         return server_started_here
 
 
@@ -485,6 +510,9 @@ class MainPlugin(pcbnew.ActionPlugin):
         except:
             pass
         self.anopcb_server_container = None
+        if self.get_preference("server_type") == "local":
+            # the local engine doesn't use a docker image
+            return
 
         dlg = wx.MessageDialog(
             None,
@@ -584,7 +612,7 @@ class MainPlugin(pcbnew.ActionPlugin):
         print("maybe starting server here")
         if self.maybe_start_anopcb_server():
             # wait for the server to boot
-            time.sleep(6)
+            self.server_api.wait_for_server(60, idle=False)
 
         if self.server_api.is_busy():
             dia = wx.MessageDialog(
@@ -594,7 +622,8 @@ class MainPlugin(pcbnew.ActionPlugin):
                 style=wx.OK)
             dia.ShowModal()
             return
-        if self.server_api.get_active_model()["data"][0] is None:
+        active_model = self.server_api.get_active_model()["data"]
+        if active_model[0] is None:
             dia = wx.MessageDialog(
                 parent=self.gui,
                 message="No machine learning model is active, choose one under 'model configuration'!",
@@ -610,55 +639,81 @@ class MainPlugin(pcbnew.ActionPlugin):
                 style=wx.OK)
             dia.ShowModal()
             return
-        slices = self.create_slices_mp()
-        layers = slices[0]
-        slices = slices[1]
-        send_slices = [y.decode("utf-8") for x, y in slices]
-
-        # Dump slices here
-        if self.get_preference("save_filter_data"):
-            print("dumping slices")
-            with open(self.anopcb_filter_slices_path, "w") as f:
-                save_slices = [(x, y.decode("utf-8")) for x, y in slices]
-                json.dump(save_slices, f)
-                del save_slices
-
-        def get_slice_position(slice_meta):
-            splitted = slice_meta.split("_")
-            return (int(splitted[0]), int(splitted[1]))
-        slice_positions = [get_slice_position(slice[0]) for slice in slices]
-        del slices
-
-        # dump layers for debugging results dialog
+        server_slicing = self.get_preference("server_slicing")
+        # an unchanged board evaluated on an unchanged model shows the stored results
+        geometry = self.create_geometry()
+        results_key = self.results_store.key(
+            geometry, server_slicing, active_model[0], active_model[2] if len(active_model) > 2 else None)
+        stored = self.results_store.load(results_key)
+        if stored is not None:
+            print("showing stored results")
+            layers, slice_positions, resp = stored
+            ShowResultsDialog(self.gui, self, layers, slice_positions, resp).Show()
+            return
+        if server_slicing:
+            # the server slices the board, only rasterize it to show the results
+            layers = self.create_layers()
+        else:
+            slices = self.create_slices_mp()
+            layers = slices[0]
+            slices = slices[1]
+            send_slices = [y.decode("utf-8") for x, y in slices]
+
+            def get_slice_position(slice_meta):
+                splitted = slice_meta.split("_")
+                return (int(splitted[0]), int(splitted[1]))
+            slice_positions = [get_slice_position(slice[0]) for slice in slices]
+
+            # Dump slices here
+            if self.get_preference("save_filter_data"):
+                print("dumping slices")
+                np.savez_compressed(
+                    self.anopcb_filter_slices_path,
+                    names=np.array([x for x, y in slices]),
+                    positions=np.array(slice_positions, np.int64).reshape((-1, 2)),
+                    slices=np.array([np.frombuffer(y, np.uint8) for x, y in slices], np.uint8))
+            del slices
+
+        # dump layers for debugging results dialog, as raster the results viewer maps
         if self.get_preference("save_filter_data"):
             print("dumping layers")
-            layers_to_json = layers.tolist()
-            with open(self.anopcb_filter_layers_path, "w") as layers_json:
-                json.dump(layers_to_json, layers_json)
-                del layers_to_json
+            np.save(self.anopcb_filter_layers_path, layers)
 
         while self.server_api.is_busy():
             dia = wx.MessageDialog(
                 parent=self.gui,
-                message="The server can't be reached, is not listening on the chosen port or busy. Wait 10 seconds?",
+                message=f"{self.server_api.status_message()} Wait for it?",
                 caption="Server not responding",
                 style=wx.OK | wx.CANCEL | wx.OK_DEFAULT)
             if dia.ShowModal() == wx.ID_OK:
-                time.sleep(10)
+                self.server_api.wait_for_server(60)
             else:
                 return
 
-        print("sending slices to server and wait")
-        resp = self.server_api.evaluate(
-            send_slices,
-            (self.get_preference("slice_x"), self.get_preference("slice_y")))
+        if server_slicing:
+            print("sending geometry to server and wait")
+            resp = self.server_api.evaluate_geometry(geometry)
+        else:
+            print("sending slices to server and wait")
+            resp = self.server_api.evaluate(
+                send_slices,
+                (self.get_preference("slice_x"), self.get_preference("slice_y")))
+            del send_slices
         if resp is not False:
             resp = resp["data"]
         else:
             print("An Error occured. Check server log for more information.")
             return
 
-        del send_slices
+        if server_slicing:
+            # the server appends the positions of its slices to the results
+            slice_positions = [tuple(position) for position in resp.pop(3)]
+            if self.get_preference("save_filter_data"):
+                print("dumping slices")
+                # the slices and their names stay on the server, only their positions are known
+                np.savez_compressed(
+                    self.anopcb_filter_slices_path,
+                    positions=np.array(slice_positions, np.int64).reshape((-1, 2)))
 
         # add date to results
         results_date = datetime.datetime.now().strftime("%d.%m.%Y %H:%M")
@@ -666,8 +721,16 @@ class MainPlugin(pcbnew.ActionPlugin):
         # dumping results
         if self.get_preference("save_filter_data"):
             print("dumping results")
-            with open(self.anopcb_filter_results_path, "w") as f:
-                json.dump(resp, f)
+            np.savez(
+                self.anopcb_filter_results_path,
+                mse=np.asarray(resp[1], np.float32),
+                encoded=np.asarray(resp[2], np.float32),
+                date=np.asarray(resp[3]))
+        if results_key is not None:
+            # stored in the background, with a copy of the layers the dialog brightens
+            store = Thread(target=self.results_store.save, args=(results_key, layers.copy(), slice_positions, list(resp)))
+            store.daemon = True
+            store.start()
 
         ShowResultsDialog(self.gui, self, layers, slice_positions, resp).Show()
 
@@ -682,12 +745,30 @@ class MainPlugin(pcbnew.ActionPlugin):
         return createSlicesMP(self)
 
 
+    def create_layers(self):
+        """ Calls the "createLayers" method.
+
+        Returns:
+            array: The rasterized board.
+        """
+        return createLayers(self)
+
+
+    def create_geometry(self):
+        """ Calls the "createGeometry" method.
+
+        Returns:
+            dict: The geometry of the board to be sliced by the server.
+        """
+        return createGeometry(self)
+
+
     def cluster_results(self, latent_vectors, mse_list, cluster_size, threshold, cluster_alg):
         """Clusters the latent vectors with K-Means.
 
         Args:
-            latent_vectors (List): The slices compressed by the autoencoder in the server.
-            mse_list (List): The mean squared errors of the slices.
+            latent_vectors (array): The slices compressed by the autoencoder in the server (count x latent).
+            mse_list (array): The mean squared errors of the slices.
             cluster_size (int): The amount of cluster to create.
             threshold (int): The minimum error amount to be considered.
 
@@ -695,11 +776,11 @@ class MainPlugin(pcbnew.ActionPlugin):
             (List): The cluster indices of all slices in order.
              Only slices passing the threshold considered!
         """
-        latent_vectors = [latent_vector for latent_vector, mse in zip(latent_vectors, mse_list) if mse >= threshold]
+        latent_vectors = np.asarray(latent_vectors)[np.asarray(mse_list) >= threshold]
         if cluster_alg == ShowResultsDialog.Cluster_Alg.KMEANS:
             return sklearn.cluster.KMeans(
                 n_clusters=cluster_size,
-                max_iter=550).fit_predict(np.array(latent_vectors))
+                max_iter=550).fit_predict(latent_vectors)
         elif cluster_alg == ShowResultsDialog.Cluster_Alg.DBSCAN:
             clustering = [i + 1 for i in sklearn.cluster.DBSCAN(n_jobs=-1).fit_predict(latent_vectors)] # clustering returns indices starting from -1
             return clustering
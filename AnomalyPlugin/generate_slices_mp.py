@@ -450,18 +450,16 @@ def _slice_pad(start, stop):
                     y_pos = y_pos + y_vector[1]
     return slices
 
-def createSlicesMP(plugin):
-    """Creates slices from the PCB layout by converting the entire board into a byte array and slicing along its components.
-     Uses all CPU cores except for one (so the computer does not freeze). Rasterizes the Board with a precision of "minimum track width / 4".
-     Extremely big boards may cause the RAM to overflow.
+def _rasterize_board(plugin):
+    """Rasterizes the board with a precision of "minimum track width / 4" into a byte array in shared memory.
 
     Arguments:
         plugin (PrototypePlugin): The Plugin wanting the slices.
 
     Returns:
-        list: A list of slices as byte object. Contain no information about the slice dimensions (reshape in plugin).
+        tuple: the raw shared array, the layers, their shape, the rasterization precision,
+         the origin of the raster and the tracks, vias and pads of the board.
     """
-    start = localtime()
     board = pcbnew.GetBoard()
     layercount = plugin.get_preference("slice_y")
     track_list = board.GetTracks()
@@ -563,11 +561,80 @@ def createSlicesMP(plugin):
                 except IndexError:
                     pass
 
+    # for i in range(layercount):
+    #     skio.imsave(name + "-layer" + str(i) + ".png", layers[i])
+    return (layers_raw, layers, layers_shape, step_value, min_x, min_y, tracks, vias, pads)
+
+
+def createLayers(plugin):
+    """Rasterizes the board without slicing it, e.g. to display results of slices created on the server.
+
+    Arguments:
+        plugin (PrototypePlugin): The Plugin wanting the layers.
+
+    Returns:
+        array: The rasterized board (layercount x height x width).
+    """
+    return _rasterize_board(plugin)[1]
+
+
+def createGeometry(plugin):
+    """Creates a compact description of the boards geometry, so the server can rasterize and slice the board itself.
+     Coordinates are in pcbnew units, nets are already replaced by their annotated signal (0 if not annotated).
+     For the format see the "REST definition.txt" of the server.
+
+    Arguments:
+        plugin (PrototypePlugin): The Plugin wanting the geometry.
+
+    Returns:
+        dict: The geometry of the board.
+    """
+    board = pcbnew.GetBoard()
+    track_list = board.GetTracks()
+
+    def signal(netcode):
+        value = plugin.get_annotated_net(netcode)
+        return 0 if value is None else int(value)
+
+    tracks = [[t.get_startx(), t.get_start_y(), t.get_end_x(), t.get_end_y(), t.get_width(), t.get_layer_id(), signal(t.get_netcode())]
+        for t in [Track(t) for t in filter(lambda x: x.GetClass() != "VIA", track_list)]]
+    vias = [[v.get_x_pos(), v.get_y_pos(), v.get_width(), v.get_top_layer_id(), v.get_bottom_layer_id(), signal(v.get_netcode())]
+        for v in [Via(t) for t in filter(lambda x: x.GetClass() == "VIA", track_list)]]
+    pads = [[p.get_shape(), p.get_x_pos(), p.get_y_pos(), p.get_x_size(), p.get_y_size(), p.get_orientation(),
+        p.get_top_layer_id(), p.get_bottom_layer_id(), signal(p.get_netcode())]
+        for p in [Pad(p) for p in board.GetPads()]]
+
+    scalefactor = 4
+    box = board.GetBoardEdgesBoundingBox()
+    return {
+        "layercount": plugin.get_preference("slice_y"),
+        "width": plugin.get_preference("slice_x"),
+        "step_value": board.GetDesignSettings().GetSmallestClearanceValue() // scalefactor,
+        "box": [box.GetLeft(), box.GetTop(), box.GetRight(), box.GetBottom()],
+        "tracks": tracks,
+        "vias": vias,
+        "pads": pads
+    }
+
+
+def createSlicesMP(plugin):
+    """Creates slices from the PCB layout by converting the entire board into a byte array and slicing along its components.
+     Uses all CPU cores except for one (so the computer does not freeze). Rasterizes the Board with a precision of "minimum track width / 4".
+     Extremely big boards may cause the RAM to overflow.
+
+    Arguments:
+        plugin (PrototypePlugin): The Plugin wanting the slices.
+
+    Returns:
+        list: A list of slices as byte object. Contain no information about the slice dimensions (reshape in plugin).
+    """
+    board = pcbnew.GetBoard()
+    layercount = plugin.get_preference("slice_y")
+    layers_raw, layers, layers_shape, step_value, min_x, min_y, tracks, vias, pads = _rasterize_board(plugin)
+
     # the name of the project
     filename = board.GetFileName()
     name = re.search(r'[^\/]*\.kicad_pcb', filename).group(0)[:-10]
-    # for i in range(layercount):
-    #     skio.imsave(name + "-layer" + str(i) + ".png", layers[i])
 
     width = plugin.get_preference("slice_x")
     cpus = cpu_count()-1
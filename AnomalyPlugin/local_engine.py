@@ -0,0 +1,191 @@
+"""Contains the LocalEngine, which runs the ML-Server in a child process of the plugin."""
+import os
+import sys
+import json
+import itertools
+import multiprocessing
+import multiprocessing.util
+from threading import Event, Lock, Thread
+from requests.exceptions import ConnectionError, Timeout
+
+BOOT_TIMEOUT = 120
+
+
+def _engine_main(conn):
+    """Entry point of the child process, serves the requests of the plugin until the pipe is closed.
+     Uses the installed anopcb-server package or the server source in ${ANOPCB_SERVER_SOURCE}.
+
+    Args:
+        conn (multiprocessing.connection.Connection): The pipe to the plugin.
+    """
+    try:
+        from Server import AnomalyServer
+    except ImportError:
+        sys.path.insert(0, os.environ['ANOPCB_SERVER_SOURCE'])
+        import AnomalyServer
+    AnomalyServer.serve_pipe(conn)
+
+
+class LocalResponse:
+    """The response to a request of the LocalEngine, offers the parts of requests.Response used by the ServerAPI."""
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class LocalEngine:
+    """Runs the ML-Server in a child process, requests are exchanged over a pipe instead of http.
+     The models stay loaded as long as the child process runs. Offers the same get, post and put
+     methods as the requests module, so the ServerAPI can use it instead of http.
+     Like the http server it handles requests concurrently, the responses are matched to the requests
+     by their request id, so the status is answered while jobs run.
+    """
+
+    def __init__(self):
+        """Initializes the engine, the child process is started by "start"."""
+        self.process = None
+        self.conn = None
+        # held while starting, stopping and sending
+        self.lock = Lock()
+        self.request_ids = itertools.count()
+        # request id -> [event set once answered, response or None if the child stopped]
+        self.pending = dict()
+        # the child isn't daemonic, it's stopped before multiprocessing joins its children at exit
+        multiprocessing.util.Finalize(None, self.stop, exitpriority=10)
+
+
+    def is_running(self) -> bool:
+        """Checks whether the child process is running.
+
+        Returns:
+            bool: True if it runs, else False.
+        """
+        return self.process is not None and self.process.is_alive()
+
+
+    def start(self) -> bool:
+        """Starts the child process if it doesn't run yet and waits until it is ready to serve.
+
+        Returns:
+            bool: Whether the child process was actually started.
+        """
+        with self.lock:
+            if self.is_running():
+                return False
+            # spawn, since forking a process running wx and kicad is not safe
+            context = multiprocessing.get_context("spawn")
+            self.conn, child_conn = context.Pipe()
+            # not daemonic, the server starts processes for slicing and inference
+            self.process = context.Process(target=_engine_main, args=(child_conn,), daemon=False)
+            self.process.start()
+            child_conn.close()
+            # loading tensorflow takes a few seconds, the child reports when it's ready
+            try:
+                if self.conn.poll(BOOT_TIMEOUT):
+                    self.conn.recv()
+            except EOFError:
+                pass
+            receiver = Thread(target=self.receive, args=(self.conn,))
+            receiver.daemon = True
+            receiver.start()
+            return True
+
+
+    def receive(self, conn):
+        """Passes the responses of the child process to the waiting requests until the pipe is closed.
+
+        Args:
+            conn (multiprocessing.connection.Connection): The pipe to the child process.
+        """
+        while True:
+            try:
+                response_id, status_code, content = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self.lock:
+                waiter = self.pending.pop(response_id, None)
+            # answers to requests that timed out before are dropped
+            if waiter is not None:
+                waiter[1] = LocalResponse(status_code, content)
+                waiter[0].set()
+        # the child stopped, the waiting requests fail
+        with self.lock:
+            waiters = list(self.pending.values())
+            self.pending.clear()
+        for waiter in waiters:
+            waiter[0].set()
+
+
+    def stop(self):
+        """Stops the child process."""
+        with self.lock:
+            if not self.is_running():
+                return
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.conn.close()
+            self.process = None
+            self.conn = None
+
+
+    def request(self, method: str, data, timeout=None, headers=None) -> LocalResponse:
+        """Sends a request to the child process and waits for its response.
+
+        Args:
+            method (str): The http method (GET, POST or PUT).
+            data (str or bytes): The json payload or a binary body.
+            timeout (float, optional): Seconds to wait for the response. Defaults to None (wait forever).
+            headers (dict, optional): Further headers, like "Content-Type". Defaults to None.
+
+        Raises:
+            Timeout: The engine did not answer in time.
+            ConnectionError: The child process is not running or stopped.
+
+        Returns:
+            LocalResponse: The response.
+        """
+        body = data.encode() if isinstance(data, str) else data
+        waiter = [Event(), None]
+        # held by "start" while the child boots
+        if not self.lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise Timeout("local engine busy")
+        try:
+            if not self.is_running():
+                raise ConnectionError("local engine not running")
+            request_id = next(self.request_ids)
+            self.pending[request_id] = waiter
+            try:
+                self.conn.send((request_id, method, body, headers))
+            except OSError:
+                self.pending.pop(request_id, None)
+                raise ConnectionError("local engine stopped")
+        finally:
+            self.lock.release()
+        if not waiter[0].wait(timeout):
+            with self.lock:
+                self.pending.pop(request_id, None)
+            raise Timeout("local engine busy")
+        if waiter[1] is None:
+            raise ConnectionError("local engine stopped")
+        return waiter[1]
+
+
+    def get(self, url, data=None, timeout=None, headers=None):
+        return self.request("GET", data, timeout, headers)
+
+
+    def post(self, url, data=None, timeout=None, headers=None):
+        return self.request("POST", data, timeout, headers)
+
+
+    def put(self, url, data=None, timeout=None, headers=None):
+        return self.request("PUT", data, timeout, headers)
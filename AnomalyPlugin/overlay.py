@@ -0,0 +1,74 @@
+"""Contains the overlay functions used by the ShowResultsDialog to mark the anomalous slices on the layers."""
+import numpy as np
+
+
+def square_sums(size, positions, radius, weights):
+    """Sums weights over squares around positions for every pixel. The corners of the squares are
+     scattered into a difference array which is summed up, so the time only depends on the amount of
+     pixels and squares, not on the size of the squares.
+
+    Arguments:
+        size (tuple): Width and height of the image.
+        positions (array): The centers of the squares, x and y (count x 2).
+        radius (int): Distance from the center to the sides of the squares.
+        weights (array): The weight of each square.
+
+    Returns:
+        array: The sums (height x width, float32).
+    """
+    width, height = size
+    x_start = np.clip(positions[:, 0] - radius, 0, width)
+    x_end = np.clip(positions[:, 0] + radius + 1, 0, width)
+    y_start = np.clip(positions[:, 1] - radius, 0, height)
+    y_end = np.clip(positions[:, 1] + radius + 1, 0, height)
+    corners = np.concatenate((
+        y_start * (width + 1) + x_start,
+        y_start * (width + 1) + x_end,
+        y_end * (width + 1) + x_start,
+        y_end * (width + 1) + x_end))
+    weights = np.asarray(weights, np.float64)
+    differences = np.bincount(
+        corners, np.concatenate((weights, -weights, -weights, weights)), (width + 1) * (height + 1))
+    differences = differences.astype(np.float32).reshape((height + 1, width + 1))
+    return differences.cumsum(0).cumsum(1)[:height, :width]
+
+
+def render_overlay(size, positions, colours, radius, alpha):
+    """Renders translucent squares in one pass. Overlapping squares add up their opacity like squares drawn
+     on top of each other, the colour of a pixel is the mean colour of its squares.
+
+    Arguments:
+        size (tuple): Width and height of the image.
+        positions (array): The centers of the squares, x and y (count x 2).
+        colours (array): The rgb colour of each square (count x 3).
+        radius (int): Distance from the center to the sides of the squares.
+        alpha (float): The opacity of a single square, between 0 and 1.
+
+    Returns:
+        tuple: The colour (height x width x 3, float32) and the opacity (height x width, float32) of the overlay.
+    """
+    positions = np.asarray(positions, np.int64).reshape((-1, 2))
+    colours = np.asarray(colours, np.float32).reshape((-1, 3))
+    count = square_sums(size, positions, radius, np.ones(len(positions)))
+    opacity = 1 - np.power(np.float32(1 - alpha), count)
+    count = np.maximum(count, 1)
+    colour = np.empty(count.shape + (3,), np.float32)
+    for channel in range(3):
+        colour[..., channel] = square_sums(size, positions, radius, colours[:, channel]) / count
+    return colour, opacity
+
+
+def blend(layer, colour, opacity):
+    """Blends an overlay into a greyscale layer.
+
+    Arguments:
+        layer (array): The layer (height x width).
+        colour (array): The colour of the overlay (height x width x 3).
+        opacity (array): The opacity of the overlay (height x width).
+
+    Returns:
+        array: The rgb image (height x width x 3, uint8).
+    """
+    opacity = opacity[..., np.newaxis]
+    image = np.asarray(layer, np.float32)[..., np.newaxis] * (1 - opacity) + colour * opacity
+    return np.clip(np.rint(image), 0, 255).astype(np.uint8)
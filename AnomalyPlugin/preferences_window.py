@@ -16,7 +16,7 @@ class PreferencesWindow(wx.Frame):
             plugin (MainPlugin): The instance of the plugin.
         """
         self.plugin = plugin
-        self.server_type_choice_texts = ["remote", "gpu", "cpu"]
+        self.server_type_choice_texts = ["remote", "gpu", "cpu", "local"]
         wx.Frame.__init__(self, parent=parent, title="Preferences", size=(700, 400))
         self.control_elements()
         self.control_logic()
@@ -47,6 +47,7 @@ class PreferencesWindow(wx.Frame):
         self.server_panel = wx.Panel(self.grid_panel, style=wx.SUNKEN_BORDER)
         self.port_panel = wx.Panel(self.grid_panel, style=wx.SUNKEN_BORDER)
         self.filter_panel = wx.Panel(self.grid_panel, style=wx.SUNKEN_BORDER)
+        self.slicing_panel = wx.Panel(self.grid_panel, style=wx.SUNKEN_BORDER)
         self.slice_x_panel = wx.Panel(self.grid_panel, style=wx.SUNKEN_BORDER)
         self.slice_y_panel = wx.Panel(self.grid_panel, style=wx.SUNKEN_BORDER)
         self.server_type_panel = wx.Panel(self.grid_panel, style=wx.SUNKEN_BORDER)
@@ -76,6 +77,9 @@ class PreferencesWindow(wx.Frame):
         self.save_filter_data_label = wx.StaticText(self.filter_panel, label="Save filter data locally?    ")
         self.save_filter_data_checkbox = wx.CheckBox(self.filter_panel)
         self.save_filter_data_checkbox.SetValue(prefs[5])
+        self.server_slicing_label = wx.StaticText(self.slicing_panel, label="Slice board on server?    ")
+        self.server_slicing_checkbox = wx.CheckBox(self.slicing_panel)
+        self.server_slicing_checkbox.SetValue(prefs[14])
         self.empty_label = wx.StaticText(self, label="")#dont ask why its here, just accept that it is
 
         self.signal1_label = wx.StaticText(self.signal1_panel, label=" Signal 1:")
@@ -125,6 +129,7 @@ class PreferencesWindow(wx.Frame):
         server_horizontal_sizer = wx.BoxSizer(wx.HORIZONTAL)
         port_horizontal_sizer = wx.BoxSizer(wx.HORIZONTAL)
         filter_horizontal_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        slicing_horizontal_sizer = wx.BoxSizer(wx.HORIZONTAL)
         slice_x_horizontal_sizer = wx.BoxSizer(wx.HORIZONTAL)
         slice_y_horizontal_sizer = wx.BoxSizer(wx.HORIZONTAL)
         server_type_horizontal_sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -145,6 +150,8 @@ class PreferencesWindow(wx.Frame):
         port_horizontal_sizer.Add(self.portbox, 5, wx.ALL | wx.EXPAND)
         filter_horizontal_sizer.Add(self.save_filter_data_label, 2, wx.ALIGN_CENTER_VERTICAL)
         filter_horizontal_sizer.Add(self.save_filter_data_checkbox, 5, wx.ALL | wx.EXPAND)
+        slicing_horizontal_sizer.Add(self.server_slicing_label, 2, wx.ALIGN_CENTER_VERTICAL)
+        slicing_horizontal_sizer.Add(self.server_slicing_checkbox, 5, wx.ALL | wx.EXPAND)
         slice_x_horizontal_sizer.Add(self.slice_x_label, 2, wx.ALIGN_CENTER_VERTICAL)
         slice_x_horizontal_sizer.Add(self.slice_x_box, 5, wx.ALL | wx.EXPAND)
         slice_y_horizontal_sizer.Add(self.slice_y_label, 2, wx.ALIGN_CENTER_VERTICAL)
@@ -173,6 +180,7 @@ class PreferencesWindow(wx.Frame):
         self.server_panel.SetSizer(server_horizontal_sizer)
         self.port_panel.SetSizer(port_horizontal_sizer)
         self.filter_panel.SetSizer(filter_horizontal_sizer)
+        self.slicing_panel.SetSizer(slicing_horizontal_sizer)
         self.slice_x_panel.SetSizer(slice_x_horizontal_sizer)
         self.slice_y_panel.SetSizer(slice_y_horizontal_sizer)
         self.server_type_panel.SetSizer(server_type_horizontal_sizer)
@@ -195,7 +203,7 @@ class PreferencesWindow(wx.Frame):
         grid.Add(self.server_type_panel, 5, wx.EXPAND)
         grid.Add(self.filter_panel, 5, wx.EXPAND)
 
-        grid.Add(self.empty_label, 5, wx.EXPAND)
+        grid.Add(self.slicing_panel, 5, wx.EXPAND)
         grid.Add(self.empty_label, 5, wx.EXPAND)
 
         grid.Add(self.signal1_panel, 5, wx.EXPAND)
@@ -237,6 +245,7 @@ class PreferencesWindow(wx.Frame):
         slicey = self.plugin.get_preference("slice_y")
         server_type = self.plugin.get_preference("server_type")
         save_filter_data = self.plugin.get_preference("save_filter_data")
+        server_slicing = self.plugin.get_preference("server_slicing")
 
         signal1 = self.plugin.get_preference("signal1")
         signal2 = self.plugin.get_preference("signal2")
@@ -247,7 +256,7 @@ class PreferencesWindow(wx.Frame):
         signal7 = self.plugin.get_preference("signal7")
         signal8 = self.plugin.get_preference("signal8")
         # tuple #not anymore
-        return [serveradd, serverport, slicex, slicey, server_type, save_filter_data, signal1, signal2, signal3, signal4, signal5, signal6, signal7, signal8]
+        return [serveradd, serverport, slicex, slicey, server_type, save_filter_data, signal1, signal2, signal3, signal4, signal5, signal6, signal7, signal8, server_slicing]
 
 
     def save_prefs(self, event):
@@ -259,6 +268,7 @@ class PreferencesWindow(wx.Frame):
         y_dim = self.slice_y_box.GetValue()
         server_type = self.server_type_choice_texts[self.server_type_choice.GetSelection()]
         save_filter_data = self.save_filter_data_checkbox.GetValue()
+        server_slicing = self.server_slicing_checkbox.GetValue()
 
         signal1 = self.signal1_box.GetValue()
         signal2 = self.signal2_box.GetValue()
@@ -353,7 +363,7 @@ class PreferencesWindow(wx.Frame):
             self.signal8_box.SetValue(str(signal8))
             return
 
-        if server_type != 'remote' and os.system("which docker") == 256:
+        if server_type not in ('remote', 'local') and os.system("which docker") == 256:
             wx.MessageBox(
                 "Docker not installed, install or use remote server instead!",
                 'Error',
@@ -373,6 +383,7 @@ class PreferencesWindow(wx.Frame):
                 self.plugin.set_preference("slice_y", int(y_dim))
                 self.plugin.set_preference("server_type", server_type)
                 self.plugin.set_preference("save_filter_data", save_filter_data)
+                self.plugin.set_preference("server_slicing", server_slicing)
 
                 self.plugin.set_preference("signal1", signal1)
                 self.plugin.set_preference("signal2", signal2)
@@ -0,0 +1,117 @@
+"""Contains the ResultsStore, which keeps the results of evaluations of a board, so an unchanged board
+ evaluated on an unchanged model doesn't need to be evaluated again."""
+import os
+import glob
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+# stored evaluations per project, older ones are removed
+MAX_ENTRIES = 10
+
+
+class ResultsStore:
+    """Stores each evaluation as npz archive with one array per column: the errors, the encoded vectors
+     and the positions of the slices, the rasterized board and the date of the evaluation.
+     The entries are named after a hash of the boards geometry and the name and version of the model.
+    """
+
+    def __init__(self, path: str):
+        """Initializes the store.
+
+        Args:
+            path (str): The directory of the entries, created with the first entry.
+        """
+        self.path = path
+
+
+    def key(self, geometry: dict, server_slicing: bool, model: str, version: str):
+        """Gets the key of the results of an evaluation.
+
+        Args:
+            geometry (dict): The geometry of the board, see "createGeometry".
+            server_slicing (bool): Whether the server slices the board.
+            model (str): The name of the active model.
+            version (str): The version of the active model, None if it is unknown.
+
+        Returns:
+            str: The key, None if the results can't be stored.
+        """
+        if model is None or version is None:
+            return None
+        content = json.dumps([geometry, bool(server_slicing), model, version], sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+
+    def entry_path(self, key: str) -> str:
+        """Gets the path of an entry.
+
+        Args:
+            key (str): The key of the results.
+
+        Returns:
+            str: The path.
+        """
+        return os.path.join(self.path, key + ".npz")
+
+
+    def load(self, key: str):
+        """Loads stored results.
+
+        Args:
+            key (str): The key of the results, see "key".
+
+        Returns:
+            tuple: The rasterized board, the slice positions and the results [loss, mse, encoded vector, date],
+             None if there are no results for the key.
+        """
+        if key is None or not os.path.isfile(self.entry_path(key)):
+            return None
+        try:
+            with np.load(self.entry_path(key)) as entry:
+                layers = entry["layers"]
+                slice_positions = [tuple(position) for position in entry["positions"].tolist()]
+                results = ["dummy", entry["mse"], entry["encoded"], str(entry["date"])]
+            # the entry was used again, it is removed last
+            os.utime(self.entry_path(key))
+            return layers, slice_positions, results
+        except (OSError, ValueError, KeyError) as error:
+            print("Error: ", error.args)
+            return None
+
+
+    def save(self, key: str, layers, slice_positions, results):
+        """Stores the results of an evaluation.
+
+        Args:
+            key (str): The key of the results, see "key".
+            layers (array): The rasterized board.
+            slice_positions (list): The positions of the slices.
+            results (list): The results [loss, mse, encoded vector, date].
+        """
+        if key is None:
+            return
+        temp_path = None
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # written completely before it replaces an entry
+            with tempfile.NamedTemporaryFile(dir=self.path, suffix=".tmp", delete=False) as f:
+                temp_path = f.name
+                np.savez_compressed(
+                    f,
+                    layers=np.asarray(layers, np.uint8),
+                    positions=np.asarray(slice_positions, np.int64).reshape((-1, 2)),
+                    mse=np.asarray(results[1], np.float32),
+                    encoded=np.asarray(results[2], np.float32),
+                    date=np.asarray(results[3]))
+            os.replace(temp_path, self.entry_path(key))
+            temp_path = None
+            entries = sorted(glob.glob(os.path.join(glob.escape(self.path), "*.npz")), key=os.path.getmtime)
+            for old in entries[:-MAX_ENTRIES]:
+                os.remove(old)
+        except (OSError, ValueError) as error:
+            print("Error: ", error.args)
+        finally:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -1,11 +1,71 @@
 """Contains the Api for the ML-Server used by the plugin. Can also be used as a standalone.
 The first call should always be "is_busy" to check wether the server is available."""
 
+import io
 import json
+import os
+import time
+import uuid
 from typing import List, Tuple
+import numpy as np
 import requests
 from requests.exceptions import ConnectionError
 
+# delays in seconds between polling the server status
+MIN_POLL_DELAY = 0.25
+MAX_POLL_DELAY = 4
+# size of the chunks datasets are uploaded in
+UPLOAD_CHUNK_BYTES = 4 * 2**20
+# attempts to send the missing chunks of an upload
+UPLOAD_ATTEMPTS = 5
+
+
+def get_transfer_path():
+    """Gets the directory used to exchange slices with a server on the same host.
+     It is the "transfer" directory of the servers default data directory,
+     a local docker server gets it mounted.
+
+    Returns:
+        str: path of the transfer directory
+    """
+    if os.name == 'nt':
+        project_path = os.path.expandvars(r'%APPDATA%\.anopcb')
+    else:
+        project_path = os.path.expanduser('~/.anopcb/')
+    return os.path.join(project_path, 'anopcb-server', 'transfer')
+
+
+def upload_chunk(slice_bytes: int) -> int:
+    """Gets the number of slices per chunk of an upload.
+
+    Args:
+        slice_bytes (int): size of a slice
+
+    Returns:
+        int: slices per chunk
+    """
+    return max(1, UPLOAD_CHUNK_BYTES // slice_bytes)
+
+
+def read_results(res) -> dict:
+    """Reads the results of an evaluation. They are sent as npz archive if requested with "results": "npz",
+     older servers send them as json.
+
+    Args:
+        res (Response): the response of the server
+
+    Returns:
+        dict: "data": [loss, mse, encoded vector] and of sliced geometries the slice positions,
+         mse and encoded vector as numpy arrays if sent as npz
+    """
+    if not res.content.startswith(b"PK"):
+        return res.json()
+    with np.load(io.BytesIO(res.content)) as arrays:
+        data = ["dummy", arrays["mse"], arrays["encoded"]]
+        if "positions" in arrays.files:
+            data.append(arrays["positions"].tolist())
+    return {"data" : data}
+
 
 class ServerAPI:
     """
@@ -23,7 +83,14 @@ class ServerAPI:
         self.ip_adr = ip_adr
         self.port = port
         self.adress = f"http://{self.ip_adr}:{self.port}"
+        # pooled keep-alive connections, or a LocalEngine offering the same methods
+        self.http = requests.Session()
         self.model_name = None
+        self.transfer_path = get_transfer_path()
+        # whether the server shares the transfer directory, None if not checked yet
+        self.local_transfer = None
+        # (board, count, x_dim, y_dim, augment) -> id of an unfinished upload, to be resumed
+        self.uploads = dict()
         self.session = self.get_session()
         if self.session:
             self.session = self.session['data']
@@ -47,12 +114,49 @@ class ServerAPI:
         self.ip_adr = ip_adr
         self.port = port
         self.adress = address
+        self.http.close()
+        self.http = requests.Session()
+        self.model_name = None
+        self.local_transfer = None
+        self.uploads = dict()
+        self.session = self.get_session()
+        if self.session:
+            self.session = self.session['data']
+
+
+    def use_local_engine(self, engine):
+        """Sends all further requests to a local engine running in a child process instead of a http server.
+
+        Arguments:
+            engine (LocalEngine): The local engine.
+        """
+        if self.http is engine:
+            return
+
+        try:
+            self.remove_session()
+        except:
+            pass
+        self.adress = "local engine"
+        self.http.close()
+        self.http = engine
         self.model_name = None
+        self.local_transfer = None
+        self.uploads = dict()
         self.session = self.get_session()
         if self.session:
             self.session = self.session['data']
 
     def check_session_local(self):
+        """Makes sure the client has a session. After 30 minutes without session activity, the session is removed on the server.
+        Tied to a session is a reserved model. A model may be reserved and used by multiple users at the same time,
+        one session at a time trains its instance of it. A model in training can't be overwritten or deleted.
+        Requests using the session send the reserved model along ("reserved"),
+        the server recreates a removed session and reserves the model again, without further requests.
+
+        Returns:
+            success: True if there is a session, else False.
+        """
         if self.session:
             return True
         self.session = self.get_session()
@@ -60,22 +164,69 @@ class ServerAPI:
             self.session = self.session['data']
         return self.session
     
-    def check_session_online(self):
-        """After 30 minutes without session activity, the session is removed on the server. Tied to a server is a reserved model.
-        A model may be reserved and used by multiple users at the same time. But model training is only possible, when the model is not reserved by any session.
-        Vice-versa a model cannot be reserved if model training is in progress. Any api call with a session updates the timeout timestamp, so further api calls can be called without worry.
-        If the session of a client is removed, the client will automatically get a new session and try to reserve the previously selected model.
-        This function does so and has to be called prior to api calls using a session. Though this is entirely covered in the api and does not need to be considered outside this code-file.
-        """
-        if not self.model_name:
-            return True
-        if not self.get_active_model_straight()['data'][0]: # <- model_name or None
-            # session lost the model
-            # try to gain the model again
-            return self.serve(self.model_name)
-        return True
+    def check_transfer(self) -> bool:
+        """Checks whether the server runs on the same host and shares the transfer directory.
+         If so, slices and results are exchanged as files in the transfer directory
+         instead of being sent as json over http. The answer of the server is kept,
+         without an answer the next call checks again.
+
+        Returns:
+            bool: True if the transfer directory can be used, else False.
+        """
+        if self.local_transfer is not None:
+            return self.local_transfer
+        handle = f"{uuid.uuid4().hex}.probe"
+        token = uuid.uuid4().hex
+        try:
+            os.makedirs(self.transfer_path, exist_ok=True)
+            with open(os.path.join(self.transfer_path, handle), "w") as f:
+                f.write(token)
+        except OSError:
+            self.local_transfer = False
+            return False
+        payload = {
+            "type" : 15,
+            "name" : "transfer",
+            "handle" : handle,
+            "token" : token
+        }
+        try:
+            res = self.http.get(self.adress, data=json.dumps(payload), timeout=1)
+            self.local_transfer = res.status_code == 204
+        except requests.exceptions.RequestException as error:
+            # no answer, e.g. the server is busy, it's checked again with the next request
+            print("Error: ", error.args)
+        finally:
+            self.remove_transfer(handle)
+        return bool(self.local_transfer)
+
+
+    def write_transfer(self, slices: List[str]) -> str:
+        """Writes slices into a new file in the transfer directory.
+
+        Args:
+            slices (List[str]): list of slices
+
+        Returns:
+            str: the handle (name of the file) to be sent to the server
+        """
+        handle = f"{uuid.uuid4().hex}.slc"
+        with open(os.path.join(self.transfer_path, handle), "wb") as f:
+            f.write("".join(slices).encode("utf-8"))
+        return handle
+
+
+    def remove_transfer(self, handle: str):
+        """Removes a file from the transfer directory.
+
+        Args:
+            handle (str): name of the file
+        """
+        try:
+            os.remove(os.path.join(self.transfer_path, handle))
+        except OSError:
+            pass
 
-        
 
     def send_model(self, model: str, name: str, kind: str, comp: dict) -> bool:
         """Sends the model to the server. Since the model must be compiled first it requires
@@ -103,7 +254,7 @@ class ServerAPI:
             "comp" : comp
         }
         try:
-            res = requests.put(self.adress, data=json.dumps(payload))
+            res = self.http.put(self.adress, data=json.dumps(payload))
             return res.status_code == 204
         except ConnectionError as error:
             print("Error: ", error.args)
@@ -111,7 +262,8 @@ class ServerAPI:
 
 
     def send_slices(self, data: List[str], name: str, count: str, x_dim: str, y_dim: str, augment: bool) -> bool:
-        """Sends a set of slices to the server.
+        """Sends a set of slices to the server. Through the transfer directory if the server shares it,
+         else uploaded in chunks. An interrupted upload is resumed when the slices are sent again.
 
         Args:
             data (List): list of slices
@@ -131,16 +283,222 @@ class ServerAPI:
             "count": count,
             "x_dim": x_dim,
             "y_dim": y_dim,
+            "aug"  : augment
+        }
+        handle = None
+        if self.check_transfer():
+            handle = self.write_transfer(data)
+            payload["handle"] = handle
+        else:
+            uploaded = self.upload_slices(data, name, count, x_dim, y_dim, augment)
+            if uploaded is not None:
+                return bool(uploaded)
+            # server without uploads
+            payload["data"] = data
+        try:
+            res = self.http.put(self.adress, data=json.dumps(payload))
+            return res.status_code == 204
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+        finally:
+            if handle is not None:
+                self.remove_transfer(handle)
+
+    
+    def append_slices(self, data: List[str], dataset: str, x_dim: str, y_dim: str):
+        """Appends slices to a dataset on the server. The dataset is replaced by one without duplicate slices,
+         named after its new count. The slices are augmented if the dataset is augmented.
+
+        Args:
+            data (List): list of slices
+            dataset (str): name of the dataset
+            x_dim (str): their length in the x-dimension
+            y_dim (str): their length in the y-dimension
+
+        Returns:
+            str: the new name of the dataset if successfull, else False.
+        """
+        return self.upload_slices(data, dataset, len(data), x_dim, y_dim, False, dataset) or False
+
+
+    def merge_datasets(self, datasets: List[str], name: str, remove: bool):
+        """Merges datasets on the server into a single dataset without duplicate slices.
+         Merging a single dataset compacts it.
+
+        Args:
+            datasets (List[str]): names of the datasets, with slices of the same shape
+            name (str): the name of the board of the new dataset
+            remove (bool): whether the merged datasets should be removed
+
+        Returns:
+            str: the name of the new dataset if successfull, else False.
+        """
+        payload = {
+            "type" : 22,
+            "name" : "merge_datasets",
+            "datasets" : datasets,
+            "board" : name,
+            "remove" : remove
+        }
+        try:
+            res = self.http.put(self.adress, data=json.dumps(payload))
+            if res.status_code == 200:
+                return res.json()["data"]
+            else:
+                return False
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+
+
+    def upload_slices(self, data: List[str], name: str, count: str, x_dim: str, y_dim: str, augment: bool, append: str = None):
+        """Uploads a set of slices in chunks, arguments like "send_slices". Chunks that didn't arrive
+         are sent again. The upload is kept when it fails, so it can be resumed by the next call.
+
+        Args:
+            append (str, optional): name of a dataset the slices are appended to. Defaults to None.
+
+        Returns:
+            str: the name of the dataset if successfull, False if not and None if the server doesn't support uploads.
+        """
+        key = (name, str(count), str(x_dim), str(y_dim), bool(augment), append)
+        upload = self.uploads.get(key)
+        received = self.upload_status(upload) if upload is not None else False
+        if received is False:
+            upload = self.begin_upload(name, count, x_dim, y_dim, augment, append)
+            if not upload:
+                return upload
+            self.uploads[key] = upload
+            received = (upload_chunk(int(x_dim) * int(y_dim)), [])
+        chunk = received[0]
+        missing = [sequence for sequence in range((len(data) + chunk - 1) // chunk) if sequence not in received[1]]
+        for attempt in range(UPLOAD_ATTEMPTS):
+            for sequence in missing:
+                if not self.append_upload(upload, sequence, data[sequence*chunk:(sequence + 1)*chunk]):
+                    break
+            received = self.upload_status(upload)
+            if received is not False:
+                missing = [sequence for sequence in missing if sequence not in received[1]]
+                if not missing:
+                    break
+            time.sleep(min(MIN_POLL_DELAY * 2**attempt, MAX_POLL_DELAY))
+        dataset = False if missing else self.commit_upload(upload)
+        if dataset:
+            self.uploads.pop(key)
+        return dataset
+
+
+    def begin_upload(self, name: str, count: str, x_dim: str, y_dim: str, augment: bool, append: str = None):
+        """Begins the upload of a set of slices, arguments like "upload_slices".
+
+        Returns:
+            str: id of the upload if successfull, False if not and None if the server doesn't support uploads.
+        """
+        payload = {
+            "type" : 18,
+            "name" : "begin_upload",
+            "board": name,
+            "count": int(count),
+            "x_dim": int(x_dim),
+            "y_dim": int(y_dim),
             "aug"  : augment,
-            "data" : data
+            "chunk": upload_chunk(int(x_dim) * int(y_dim))
         }
+        if append is not None:
+            payload["append"] = append
         try:
-            res = requests.put(self.adress, data=json.dumps(payload))
+            res = self.http.put(self.adress, data=json.dumps(payload))
+            if res.status_code == 200:
+                return res.json()["data"]
+            elif res.status_code == 400:
+                return None
+            else:
+                return False
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+
+
+    def append_upload(self, upload: str, sequence: int, slices: List[str]) -> bool:
+        """Sends a chunk of an upload as binary body.
+
+        Args:
+            upload (str): id of the upload
+            sequence (int): sequence number of the chunk, the first chunk is 0
+            slices (List[str]): the slices of the chunk
+
+        Returns:
+            bool: True if successfull, else False.
+        """
+        payload = {
+            "type" : 19,
+            "name" : "append_upload",
+            "upload" : upload,
+            "sequence" : sequence
+        }
+        headers = {
+            "Content-Type" : "application/octet-stream",
+            "Payload" : json.dumps(payload)
+        }
+        try:
+            res = self.http.put(self.adress, data="".join(slices).encode("utf-8"), headers=headers)
             return res.status_code == 204
         except ConnectionError as error:
             print("Error: ", error.args)
             return False
 
+
+    def upload_status(self, upload: str):
+        """Gets which chunks of an upload the server received.
+
+        Args:
+            upload (str): id of the upload
+
+        Returns:
+            Tuple: slices per chunk and the sequence numbers of the received chunks if successfull, else False.
+        """
+        payload = {
+            "type" : 20,
+            "name" : "upload_status",
+            "upload" : upload
+        }
+        try:
+            res = self.http.get(self.adress, data=json.dumps(payload))
+            if res.status_code == 200:
+                status = res.json()["data"]
+                return status["chunk"], set(status["received"])
+            else:
+                return False
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+
+
+    def commit_upload(self, upload: str):
+        """Saves a complete upload as dataset on the server.
+
+        Args:
+            upload (str): id of the upload
+
+        Returns:
+            str: the name of the dataset if successfull, else False.
+        """
+        payload = {
+            "type" : 21,
+            "name" : "commit_upload",
+            "upload" : upload
+        }
+        try:
+            res = self.http.put(self.adress, data=json.dumps(payload))
+            if res.status_code == 200:
+                return res.json()["data"]
+            else:
+                return False
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+
     
     def delete_slices(self, name: str) -> bool:
         """Deletes dataset of slices with name "name".
@@ -157,7 +515,7 @@ class ServerAPI:
             "board": name
         }
         try:
-            res = requests.put(self.adress, data=json.dumps(payload))
+            res = self.http.put(self.adress, data=json.dumps(payload))
             return res.status_code == 204
         except ConnectionError as error:
             print("Error: ", error.args)
@@ -180,25 +538,96 @@ class ServerAPI:
             "model": name,
         }
         try:
-            res = requests.put(self.adress, data=json.dumps(payload))
+            res = self.http.put(self.adress, data=json.dumps(payload))
             return res.status_code == 204
         except ConnectionError as error:
             print("Error: ", error.args)
             return False
 
 
+    def get_status(self, timeout: float = 2):
+        """Gets the readiness and the load of the server. Answered by the server even while it runs a job.
+
+        Arguments:
+            timeout (float): Seconds to wait for the answer.
+
+        Returns:
+            status: dict with "ready", "queued", "running", "running_for", "estimated_wait", "sessions" and "models"
+                if successfull, None if the server offers no status, else False.
+        """
+        payload = {
+            "type" : 16,
+            "name" : "status"
+        }
+        try:
+            res = self.http.get(self.adress, data=json.dumps(payload), timeout=timeout)
+            if res.status_code == 200:
+                return res.json()["data"]
+            return None
+        except requests.exceptions.RequestException:
+            return False
+
+
+    def status_message(self) -> str:
+        """Describes the status of the server for the user.
+
+        Returns:
+            str: The description.
+        """
+        status = self.get_status()
+        if not status:
+            return "The server can't be reached, is not listening on the chosen port or busy."
+        if not status["ready"]:
+            return "The server is starting."
+        jobs = status["queued"] + len(status["running"])
+        return f"The server is busy with {jobs} job(s), about {round(status['estimated_wait'])} seconds left."
+
+
+    def wait_for_server(self, max_wait: float, idle: bool = True) -> bool:
+        """Polls the status of the server with an increasing delay until it is ready.
+
+        Arguments:
+            max_wait (float): Seconds to wait at most.
+            idle (bool): Also wait until the server has no running or waiting jobs.
+
+        Returns:
+            success: True if the server is ready (and idle), False if it wasn't within max_wait.
+        """
+        deadline = time.time() + max_wait
+        delay = MIN_POLL_DELAY
+        while True:
+            status = self.get_status()
+            if status is None:
+                # server without status
+                return not self.is_busy()
+            if status and status["ready"] and (not idle or (not status["running"] and status["queued"] == 0)):
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, MAX_POLL_DELAY)
+
+
     def is_busy(self) -> bool:
-        """The only request with a timeout (of 1 second) to test wether the server is available.
+        """Tests wether the server is available, using its status.
+         Servers without status are probed with a request with a timeout (of 1 second).
 
         Returns:
             success: True if the server is busy, else False.
         """
+        status = self.get_status()
+        if status is False:
+            return True
+        if status is not None:
+            # running jobs don't keep the server from handling further requests
+            return not status["ready"] or status["queued"] > 0
         payload = {
             "type" : 6,
             "name" : "busy"
         }
         try:
-            requests.get(self.adress, data=json.dumps(payload), timeout=1)
+            self.http.get(self.adress, data=json.dumps(payload), timeout=1)
             return False
         except requests.exceptions.Timeout as error:
             return True
@@ -218,7 +647,7 @@ class ServerAPI:
             "name" : "models"
         }
         try:
-            res = requests.get(self.adress, data=json.dumps(payload))
+            res = self.http.get(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
                 return res.json()
             else:
@@ -237,14 +666,14 @@ class ServerAPI:
         if not self.check_session_local():
             print("Error: no session")
             return False
-        self.check_session_online() # only call it, whether it succeeds or not
         payload = {
             "type" : 5,
             "name" : "active",
-            "session" : self.session
+            "session" : self.session,
+            "reserved" : self.model_name
         }
         try:
-            res = requests.get(self.adress, data=json.dumps(payload))
+            res = self.http.get(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
                 return res.json()
             else:
@@ -268,7 +697,7 @@ class ServerAPI:
             "session" : self.session
         }
         try:
-            res = requests.get(self.adress, data=json.dumps(payload))
+            res = self.http.get(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
                 return res.json()
             else:
@@ -288,7 +717,29 @@ class ServerAPI:
             "name" : "get_data"
         }
         try:
-            res = requests.get(self.adress, data=json.dumps(payload))
+            res = self.http.get(self.adress, data=json.dumps(payload))
+            if res.status_code == 200:
+                return res.json()
+            else:
+                return False
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+
+
+    def get_datasets_info(self):
+        """Gets the metadata of the available datasets from the server: board, count, x_dim, y_dim,
+         augmented, bytes, hash and created.
+
+        Returns:
+            datasets: list of dicts with the metadata and the name of each dataset if successfull, else False.
+        """
+        payload = {
+            "type" : 17,
+            "name" : "datasets_info"
+        }
+        try:
+            res = self.http.get(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
                 return res.json()
             else:
@@ -315,9 +766,6 @@ class ServerAPI:
         if not self.check_session_local():
             print("Error: no session")
             return False
-        if not self.check_session_online():
-            print("Error: Old model couldn't be served again, please manually serve a model again")
-            return False
         payload = {
             "type" : 2,
             "name" : "train",
@@ -326,7 +774,7 @@ class ServerAPI:
             "fit"  : fit
         }
         try:
-            res = requests.post(self.adress, data=json.dumps(payload))
+            res = self.http.post(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
                 return res.json()
             else:
@@ -352,19 +800,17 @@ class ServerAPI:
         if not self.check_session_local():
             print("Error: no session")
             return False
-        if not self.check_session_online():
-            print("Error: Old model couldn't be served again, please manually serve a model again")
-            return False
         payload = {
             "type" : 2,
             "name" : "train",
             "datasets"  : datasets,
             "batch_size": batch_size,
             "train_time": train_time,
-            "session" : self.session
+            "session" : self.session,
+            "reserved" : self.model_name
         }
         try:
-            res = requests.post(self.adress, data=json.dumps(payload))
+            res = self.http.post(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
                 return res.json()
             else:
@@ -374,13 +820,18 @@ class ServerAPI:
             return False
 
 
-    def test(self, datasets: List[str], batch_size: int):
+    def test(self, datasets: List[str], batch_size: int, stream: bool = False, percentiles: List[float] = None):
         """Queries the server tp evaluate the currently active model on the
          selected datasets.
 
         Args:
             datasets (List[str]): list of dataset-names
-            batch_size (int): the total amount of samples selected from the datasets
+            batch_size (int): the total amount of samples selected from the datasets,
+             when streaming the amount of samples evaluated at once (0 for the servers default)
+            stream (bool, optional): evaluate all samples of the datasets in batches and report
+             statistics of the loss and the error. Defaults to False.
+            percentiles (List[float], optional): percentiles of the error reported when streaming.
+             Defaults to None (the servers default).
 
         Returns:
             metrics: evaluation summary if successfull, else False
@@ -388,18 +839,20 @@ class ServerAPI:
         if not self.check_session_local():
             print("Error: no session")
             return False
-        if not self.check_session_online():
-            print("Error: Old model couldn't be served again, please manually serve a model again")
-            return False
         payload = {
             "type" : 11,
             "name" : "test",
             "datasets"  : datasets,
             "batch_size": batch_size,
-            "session" : self.session
+            "session" : self.session,
+            "reserved" : self.model_name
         }
+        if stream:
+            payload["stream"] = True
+        if percentiles is not None:
+            payload["percentiles"] = percentiles
         try:
-            res = requests.post(self.adress, data=json.dumps(payload))
+            res = self.http.post(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
                 return res.json()
             else:
@@ -418,25 +871,28 @@ class ServerAPI:
             shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
 
         Returns:
-            metrics: list [loss, mse, encoded vector]
+            metrics: list [loss, mse, encoded vector], mse and encoded vector as numpy arrays
         """
         if not self.check_session_local():
             print("Error: no session")
             return False
-        if not self.check_session_online():
-            print("Error: Old model couldn't be served again, please manually serve a model again")
-            return False
+        if self.check_transfer():
+            return self.evaluate_transfer(slices, shape)
         payload = {
             "type" : 3,
             "name" : "evaluate",
             "data" : slices,
             "shape": shape,
-            "session" : self.session
+            "results": "npz",
+            "session" : self.session,
+            "reserved" : self.model_name
         }
         try:
-            res = requests.post(self.adress, data=json.dumps(payload))
+            res = self.http.post(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
-                return res.json()
+                return read_results(res)
+            elif res.status_code == 413 and len(slices) > 1:
+                return self.evaluate_halves(slices, shape, self.evaluate)
             else:
                 return False
         except ConnectionError as error:
@@ -444,6 +900,128 @@ class ServerAPI:
             return False
 
 
+    def evaluate_halves(self, slices: List[str], shape: Tuple[int, int], evaluate):
+        """Evaluates the slices in two requests, used when a request exceeds the memory budget of the server.
+
+        Arguments:
+            slices (list): list of slices
+            shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
+            evaluate (function): evaluates a half, "evaluate" or "evaluate_transfer"
+
+        Returns:
+            metrics: like "evaluate", False if a half failed
+        """
+        half = len(slices) // 2
+        first = evaluate(slices[:half], shape)
+        second = first and evaluate(slices[half:], shape)
+        if not second:
+            return False
+        joined = [np.concatenate((a, b)) if isinstance(a, np.ndarray) else a + b
+            for a, b in zip(first["data"][1:], second["data"][1:])]
+        return {"data" : ["dummy"] + joined}
+
+
+    def evaluate_transfer(self, slices: List[str], shape: Tuple[int, int]):
+        """Like "evaluate", but slices and results are exchanged through the transfer directory.
+
+        Arguments:
+            slices (list): list of slices
+            shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
+
+        Returns:
+            metrics: list [loss, mse, encoded vector], mse and encoded vector as numpy arrays
+        """
+        handle = self.write_transfer(slices)
+        payload = {
+            "type" : 3,
+            "name" : "evaluate",
+            "handle" : handle,
+            "count": len(slices),
+            "shape": shape,
+            "session" : self.session,
+            "reserved" : self.model_name
+        }
+        try:
+            res = self.http.post(self.adress, data=json.dumps(payload))
+            if res.status_code == 413 and len(slices) > 1:
+                return self.evaluate_halves(slices, shape, self.evaluate_transfer)
+            if res.status_code != 200:
+                return False
+            result_handle = res.json()["data"]["handle"]
+            latent = res.json()["data"]["latent"]
+            results = np.fromfile(os.path.join(self.transfer_path, result_handle), np.float32)
+            self.remove_transfer(result_handle)
+            mse = results[:len(slices)]
+            encoded = results[len(slices):].reshape((len(slices), latent))
+            return {"data" : ["dummy", mse, encoded]}
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+        finally:
+            self.remove_transfer(handle)
+
+
+    def evaluate_geometry(self, geometry: dict):
+        """Sends the geometry of a board to the server, which rasterizes and slices it and queries
+         the currently active model with the slices. Much less data has to be sent than with "evaluate".
+
+        Arguments:
+            geometry (dict): the geometry of the board, see "createGeometry"
+
+        Returns:
+            metrics: list [loss, mse, encoded vector, slice positions], mse and encoded vector as numpy arrays
+        """
+        if not self.check_session_local():
+            print("Error: no session")
+            return False
+        payload = {
+            "type" : 14,
+            "name" : "slice_geometry",
+            "mode" : "evaluate",
+            "geometry" : geometry,
+            "results": "npz",
+            "session" : self.session,
+            "reserved" : self.model_name
+        }
+        try:
+            res = self.http.post(self.adress, data=json.dumps(payload))
+            if res.status_code == 200:
+                return read_results(res)
+            else:
+                return False
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+
+
+    def send_geometry(self, geometry: dict, name: str, augment: bool) -> bool:
+        """Sends the geometry of a board to the server, which rasterizes and slices it
+         and saves the slices as a dataset.
+
+        Args:
+            geometry (dict): the geometry of the board, see "createGeometry"
+            name (str): the name of the board
+            augment (bool): whether the data should be augmented
+
+        Returns:
+            bool: True if successfull, else False.
+        """
+        payload = {
+            "type" : 14,
+            "name" : "slice_geometry",
+            "mode" : "store",
+            "geometry" : geometry,
+            "board": name,
+            "aug"  : augment
+        }
+        try:
+            res = self.http.post(self.adress, data=json.dumps(payload))
+            return res.status_code == 204
+        except ConnectionError as error:
+            print("Error: ", error.args)
+            return False
+
+
     def serve(self, model_name: str) -> bool:
         """Instructs the server to serve the model with name "model_name"
          for training and evaluation.
@@ -464,7 +1042,7 @@ class ServerAPI:
             "session" : self.session
         }
         try:
-            res = requests.post(self.adress, data=json.dumps(payload))
+            res = self.http.post(self.adress, data=json.dumps(payload))
             if res.status_code == 204:
                 self.model_name = model_name
             return res.status_code == 204
@@ -478,7 +1056,7 @@ class ServerAPI:
             "name" : "get_session"
         }
         try:
-            res = requests.post(self.adress, data=json.dumps(payload))
+            res = self.http.post(self.adress, data=json.dumps(payload))
             if res.status_code == 200:
                 return res.json()
             else:
@@ -496,7 +1074,7 @@ class ServerAPI:
             "session" : self.session
         }
         try:
-            res = requests.put(self.adress, data=json.dumps(payload))
+            res = self.http.put(self.adress, data=json.dumps(payload))
             return res.status_code == 204
         except ConnectionError as error:
             print("Error: ", error.args)
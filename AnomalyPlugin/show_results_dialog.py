@@ -1,10 +1,12 @@
 """Contains the ShowResultsDialog used by the TrackGUI"""
 import wx
 import wx.aui
+import numpy as np
 from PIL import Image
 import seaborn as sns
 import matplotlib.pyplot as plt
 from AnomalyPlugin.brighten import brighten
+from AnomalyPlugin.overlay import render_overlay, blend
 from ordered_enum import OrderedEnum
 
 class ShowResultsDialog(wx.Frame):
@@ -24,7 +26,8 @@ class ShowResultsDialog(wx.Frame):
 
         self.cached_result_bitmaps = {}
         self.layer_base_bitmaps = []
-        self.layer_base_bitmaps_orig = []
+        # the layers at display size, the overlays are blended into
+        self.layer_base_images = []
         # ([text for Choice GUI Element], [tuples for cached_result_bitmaps])
         self.configurations = ([], [])
         self.cluster_size = None
@@ -58,6 +61,7 @@ class ShowResultsDialog(wx.Frame):
         # I didn't find any good libraries to create distinct colour palettes.
         # There are standalone tools though! https://mokole.com/palette.html
         alpha = 45
+        self.overlay_alpha = alpha / 255
 
         self.colour_pallete_8 = [wx.Brush(colour) for colour in [
             wx.Colour(0x19, 0x19, 0x70, alpha),
@@ -143,23 +147,10 @@ class ShowResultsDialog(wx.Frame):
         self.layouting()
 
         for layer in self.layers:
-            image = wx.Image(
-                self.im_size[0],
-                self.im_size[1],
-                Image.fromarray(layer, "L").resize(self.im_size).convert("RGB").tobytes())
-            image.InitAlpha()
-            self.layer_base_bitmaps.append(wx.Bitmap(image))
-
-        # also create bitmaps with the original size for high resolution screenshots
-        for layer in self.layers:
-            image = wx.Image(
-                self.og_x_size,
-                self.og_y_size,
-                Image.fromarray(layer, "L").resize((
-                    self.og_x_size,
-                    self.og_y_size)).convert("RGB").tobytes())
-            image.InitAlpha()
-            self.layer_base_bitmaps_orig.append(wx.Bitmap(image))
+            base_image = np.asarray(Image.fromarray(np.asarray(layer), "L").resize(self.im_size))
+            self.layer_base_images.append(base_image)
+            self.layer_base_bitmaps.append(
+                wx.Bitmap.FromBuffer(self.im_size[0], self.im_size[1], np.dstack((base_image,) * 3)))
 
         self.change_layer(0)
         self.Fit()
@@ -331,6 +322,38 @@ class ShowResultsDialog(wx.Frame):
                 self.cluster_size,
                 self.threshold,
                 self.cluster_alg)
+
+    def render_clusters(self, cluster, size, scale, radius):
+        """Renders the squares marking the slices passing the threshold, coloured by their cluster.
+         The slices are at the same positions on every layer, so the overlay is blended into all of them.
+
+        Args:
+            cluster (List): The cluster indices of the slices passing the threshold.
+            size (Tuple): Width and height of the overlay.
+            scale (float): Scale of the overlay relative to the layers.
+            radius (int): Distance from the center to the sides of the squares.
+
+        Returns:
+            Tuple: The colour and the opacity of the overlay, see "render_overlay".
+        """
+        cluster = np.asarray(cluster, np.int64)
+        cluster_size = cluster.max() + 1 if len(cluster) else 0
+        if cluster_size <= 8:
+            colour_scheme = self.colour_pallete_8
+        elif cluster_size <= 20:
+            colour_scheme = self.colour_pallete_20
+        else:
+            colour_scheme = self.colour_pallete_40
+        colours = np.array([brush.GetColour().Get(False) for brush in colour_scheme], np.float32)
+        # our clustering only considers values passing the threshold
+        passing = np.asarray(self.results[1]) >= self.threshold
+        positions = np.asarray(self.slice_positions, np.float64).reshape((-1, 2))[passing]
+        return render_overlay(
+            size,
+            (positions * scale).astype(np.int64),
+            colours[np.minimum(cluster, len(colours) - 1)],
+            radius,
+            self.overlay_alpha)
     
     def view_results(self, event):
         """Creates a new configuration (theshold & cluster size)
@@ -350,52 +373,12 @@ class ShowResultsDialog(wx.Frame):
             print("finished clustering")
             
             cluster_size = max(cluster) + 1
-            if cluster_size <= 8:
-                colour_scheme = self.colour_pallete_8
-            elif cluster_size <= 20:
-                colour_scheme = self.colour_pallete_20
-            else:
-                colour_scheme = self.colour_pallete_40
 
+            print("start drawing the layers")
+            colour, opacity = self.render_clusters(cluster, self.im_size, self.scale, self.square_radius_scaled)
             new_layers_bitmaps = [
-                wx.Bitmap(layer_base_bitmap) for layer_base_bitmap in self.layer_base_bitmaps]
-            for new_layer_bitmap in new_layers_bitmaps:
-                print("start drawing a layer")
-                memory_dc = wx.MemoryDC() # <- not able to draw transparently
-                memory_dc.SelectObject(new_layer_bitmap)
-                grc = wx.GraphicsContext.Create(memory_dc) # <- able to draw transparently :D
-                cluster_type_counter = 0
-                for (x_pos, y_pos), mse in zip(self.slice_positions, self.results[1]):
-                    # check the threshold
-                    if mse < self.threshold:
-                        continue
-                    # pick the colour
-                    grc.SetBrush(colour_scheme[min(39, cluster[cluster_type_counter])])
-                    # correct coordinates
-                    x_pos = int(x_pos*self.scale)
-                    y_pos = int(y_pos*self.scale)
-                    # check position
-                    dx_pos = 0
-                    dy_pos = 0
-                    if x_pos > self.square_radius_scaled:
-                        x_pos -= self.square_radius_scaled
-                    else:
-                        dx_pos = self.square_radius_scaled - x_pos
-                        x_pos = 0
-                    if y_pos > self.square_radius_scaled:
-                        y_pos -= self.square_radius_scaled
-                    else:
-                        dy_pos = self.square_radius_scaled - y_pos
-                        y_pos = 0
-                    # draw on graphics
-                    grc.DrawRectangle(
-                        x_pos, y_pos,
-                        1+2*self.square_radius_scaled-dx_pos,
-                        1+2*self.square_radius_scaled-dy_pos)
-                    # our clustering only considers values passing the threshold
-                    cluster_type_counter += 1
-                grc.Flush()
-                memory_dc.SelectObject(wx.NullBitmap) # properly close DeviceController
+                wx.Bitmap.FromBuffer(self.im_size[0], self.im_size[1], blend(base_image, colour, opacity))
+                for base_image in self.layer_base_images]
             print("finished drawing, now caching")
 
             # Cache newly generated layers!
@@ -451,58 +434,12 @@ class ShowResultsDialog(wx.Frame):
             # get colours for the clusters
             cluster = self.run_clustering()
             print("finished clustering")
-            cluster_size = max(cluster)
-            if cluster_size <= 8:
-                colour_scheme = self.colour_pallete_8
-            elif cluster_size <= 20:
-                colour_scheme = self.colour_pallete_20
-            else:
-                colour_scheme = self.colour_pallete_40
 
-            new_layers_bitmaps = [
-                wx.Bitmap(layer_base_bitmap_orig) for
-                layer_base_bitmap_orig in self.layer_base_bitmaps_orig]
-            bitmap_sum = wx.Bitmap(self.og_x_size, self.og_y_size*len(new_layers_bitmaps))
-            dc_sum = wx.MemoryDC()
-            dc_sum.SelectObject(bitmap_sum)
-
-            for new_layer_bitmap, bitmap_sum_counter in zip(new_layers_bitmaps, range(len(new_layers_bitmaps))):
-                print("start drawing a layer")
-                memory_dc = wx.MemoryDC() # <- not able to draw transparently
-                memory_dc.SelectObject(new_layer_bitmap)
-                grc = wx.GraphicsContext.Create(memory_dc) # <- able to draw transparently :D
-                cluster_type_counter = 0
-                for (x_pos, y_pos), mse in zip(self.slice_positions, self.results[1]):
-                    # check the threshold
-                    if mse < self.threshold:
-                        continue
-                    # pick the colour
-                    grc.SetBrush(colour_scheme[min(39, cluster[cluster_type_counter])])
-                    # check position
-                    dx_pos = 0
-                    dy_pos = 0
-                    if x_pos > self.square_radius:
-                        x_pos -= self.square_radius
-                    else:
-                        dx_pos = self.square_radius - x_pos
-                        x_pos = 0
-                    if y_pos > self.square_radius:
-                        y_pos -= self.square_radius
-                    else:
-                        dy_pos = self.square_radius - y_pos
-                        y_pos = 0
-                    # draw on graphics
-                    grc.DrawRectangle(x_pos, y_pos, 1+2*self.square_radius-dx_pos, 1+2*self.square_radius-dy_pos)
-                    # our clustering only considers values passing the threshold
-                    cluster_type_counter += 1
-                grc.Flush()
-                dc_sum.Blit(
-                    0,
-                    self.og_y_size*bitmap_sum_counter,
-                    self.og_x_size, self.og_y_size, memory_dc, 0, 0)
-                memory_dc.SelectObject(wx.NullBitmap) # properly close DeviceController
-            dc_sum.SelectObject(wx.NullBitmap)
-            image = bitmap_sum.ConvertToImage()
+            print("start drawing the layers")
+            colour, opacity = self.render_clusters(cluster, (self.og_x_size, self.og_y_size), 1, self.square_radius)
+            # the layers below each other
+            layers_sum = np.concatenate([blend(layer, colour, opacity) for layer in self.layers])
+            image = wx.Image(self.og_x_size, self.og_y_size * len(self.layers), layers_sum.tobytes())
             if pathname.split(".")[-1].lower() == "png":
                 image.SaveFile(pathname, wx.BITMAP_TYPE_PNG)
             else:
@@ -534,49 +471,15 @@ class ShowResultsDialog(wx.Frame):
             # get colours for the clusters
             cluster = self.run_clustering()
             print("finished clustering")
-            cluster_size = max(cluster)
-            if cluster_size <= 8:
-                colour_scheme = self.colour_pallete_8
-            elif cluster_size <= 20:
-                colour_scheme = self.colour_pallete_20
-            else:
-                colour_scheme = self.colour_pallete_40
-
-            bitmap_sum = wx.Bitmap(self.og_x_size, self.og_y_size, depth=32)
-            dc_sum = wx.MemoryDC()
-            dc_sum.SelectObject(bitmap_sum)
-
-            print("start drawing a layer")
-            grc = wx.GraphicsContext.Create(dc_sum) # <- able to draw transparently :D
-            # grc.SetBrush(wx.Brush(wx.Colour(0xFF, 0xFF, 0xFF, 0x00)))
-            # grc.DrawRectangle(0, 0, self.og_x_size, self.og_y_size)
-            cluster_type_counter = 0
-            for (x_pos, y_pos), mse in zip(self.slice_positions, self.results[1]):
-                # check the threshold
-                if mse < self.threshold:
-                    continue
-                # pick the colour
-                grc.SetBrush(colour_scheme[min(39, cluster[cluster_type_counter])])
-                # check position
-                dx_pos = 0
-                dy_pos = 0
-                if x_pos > self.square_radius:
-                    x_pos -= self.square_radius
-                else:
-                    dx_pos = self.square_radius - x_pos
-                    x_pos = 0
-                if y_pos > self.square_radius:
-                    y_pos -= self.square_radius
-                else:
-                    dy_pos = self.square_radius - y_pos
-                    y_pos = 0
-                # draw on graphics
-                grc.DrawRectangle(x_pos, y_pos, 1+2*self.square_radius-dx_pos, 1+2*self.square_radius-dy_pos)
-                # our clustering only considers values passing the threshold
-                cluster_type_counter += 1
-                grc.Flush()
-            dc_sum.SelectObject(wx.NullBitmap)
-            image = bitmap_sum.ConvertToImage()
+
+            print("start drawing the mask")
+            colour, opacity = self.render_clusters(cluster, (self.og_x_size, self.og_y_size), 1, self.square_radius)
+            # transparent where no slice is marked
+            image = wx.Image(
+                self.og_x_size,
+                self.og_y_size,
+                np.clip(np.rint(colour), 0, 255).astype(np.uint8).tobytes(),
+                np.rint(opacity * 255).astype(np.uint8).tobytes())
             image.SaveFile(pathname, wx.BITMAP_TYPE_PNG)
 
     def update_clustering_radio(self, event):
@@ -1,7 +1,6 @@
 """Contains the Main GUI."""
 import os
 import time
-import json
 import numpy as np
 import pcbnew
 import wx
@@ -178,7 +177,7 @@ class TrackGUI(wx.Panel):
         """
         if self.plugin.maybe_start_anopcb_server():
             # wait for the server to boot
-            time.sleep(3)
+            self.plugin.server_api.wait_for_server(60, idle=False)
 
         dia = TrainModelDialog(self, self.plugin)
         dia.Show()
@@ -201,19 +200,12 @@ class TrackGUI(wx.Panel):
             dia.ShowModal()
             return
 
-        with open(self.plugin.anopcb_filter_slices_path) as slices_json:
-            slices = json.load(slices_json)
-        with open(self.plugin.anopcb_filter_results_path) as results_json:
-            results = json.load(results_json)
-        with open(self.plugin.anopcb_filter_layers_path) as layers_json:
-            layers = json.load(layers_json)
-        layers = np.asarray(layers, dtype=np.int8)
-
-        def get_slice_position(slice_meta):
-            splitted = slice_meta.split("_")
-            return (int(splitted[0]), int(splitted[1]))
-
-        slice_positions = [get_slice_position(slice[0]) for slice in slices]
+        with np.load(self.plugin.anopcb_filter_slices_path) as slices:
+            slice_positions = [tuple(position) for position in slices["positions"].tolist()]
+        with np.load(self.plugin.anopcb_filter_results_path) as results:
+            results = ["dummy", results["mse"], results["encoded"], str(results["date"])]
+        # mapped and only read when shown, copy-on-write as the dialog brightens the layers
+        layers = np.load(self.plugin.anopcb_filter_layers_path, mmap_mode="c")
 
         # open a results dialog
         dialog = ShowResultsDialog(self, self.plugin, layers, slice_positions, results)
@@ -225,7 +217,7 @@ class TrackGUI(wx.Panel):
         """
         if self.plugin.maybe_start_anopcb_server():
             # wait for the server to boot
-            time.sleep(3)
+            self.plugin.server_api.wait_for_server(60, idle=False)
 
         dia = ConfModelDialog(self, self.plugin)
         dia.Show()
@@ -23,6 +23,8 @@ class TrainModelDialog(wx.Frame):
         """
         wx.Frame.__init__(self, parent, size=(637, 442))
         self.plugin = plugin
+        # dataset name -> metadata from the server
+        self.dataset_info = dict()
         self.datasets = self.get_data()
         self.active_model, self.input_shape = self.get_active_model()
         self.augment = False
@@ -72,6 +74,9 @@ class TrainModelDialog(wx.Frame):
         self.count_ctrl_train = wx.TextCtrl(self.train_panel, value="0")
         self.count_ctrl_val = wx.TextCtrl(self.val_panel, value="0")
         self.count_ctrl_test = wx.TextCtrl(self.test_panel, value="0")
+        self.stream_check = wx.CheckBox(self.test_panel, label="Stream all samples")
+        self.percentiles_text = wx.StaticText(self.test_panel, label="Percentiles:")
+        self.percentiles_ctrl = wx.TextCtrl(self.test_panel, value="50, 90, 95, 99, 99.9")
         self.duration_text1 = wx.StaticText(
             self.duration_panel,
             label="Maximum training time (min): ")
@@ -146,6 +151,22 @@ class TrainModelDialog(wx.Frame):
             pos=(0, 1),
             flag=wx.EXPAND | wx.RIGHT | wx.LEFT,
             border=5)
+        self.count_sizer_test.Add(
+            self.stream_check,
+            pos=(1, 0),
+            span=(1, 2),
+            flag=wx.TOP | wx.BOTTOM,
+            border=5)
+        self.count_sizer_test.Add(
+            self.percentiles_text,
+            pos=(2, 0),
+            flag=wx.TOP | wx.BOTTOM,
+            border=5)
+        self.count_sizer_test.Add(
+            self.percentiles_ctrl,
+            pos=(2, 1),
+            flag=wx.EXPAND | wx.RIGHT | wx.LEFT,
+            border=5)
         self.count_sizer_test.AddGrowableCol(1)
 
         self.train_sizer.Add(
@@ -275,24 +296,33 @@ class TrainModelDialog(wx.Frame):
     def update_data(self):
         """Updates the available datasets.
         """
-        self.train_data_ctrl.ClearAll()
-        self.train_data_ctrl.InsertColumn(0, "Datasets for training")
-        self.train_data_ctrl.SetColumnWidth(0, 200)
-        [self.train_data_ctrl.InsertItem(0, item) for item in self.datasets]
-        self.val_data_ctrl.ClearAll()
-        self.val_data_ctrl.InsertColumn(0, "Datasets for validation")
-        self.val_data_ctrl.SetColumnWidth(0, 200)
-        [self.val_data_ctrl.InsertItem(0, item) for item in self.datasets]
-        self.test_data_ctrl.ClearAll()
-        self.test_data_ctrl.InsertColumn(0, "Datasets for testing")
-        self.test_data_ctrl.SetColumnWidth(0, 200)
-        [self.test_data_ctrl.InsertItem(0, item) for item in self.datasets]
+        for ctrl, title in (
+                (self.train_data_ctrl, "Datasets for training"),
+                (self.val_data_ctrl, "Datasets for validation"),
+                (self.test_data_ctrl, "Datasets for testing")):
+            ctrl.ClearAll()
+            ctrl.InsertColumn(0, title)
+            ctrl.SetColumnWidth(0, 200)
+            ctrl.InsertColumn(1, "Slices")
+            ctrl.InsertColumn(2, "Size")
+            for item in self.datasets:
+                row = ctrl.InsertItem(0, item)
+                info = self.dataset_info.get(item)
+                if info is not None:
+                    ctrl.SetItem(row, 1, str(info["count"]))
+                    ctrl.SetItem(row, 2, f"{info['bytes'] / 2**20:.1f} MB")
 
 
     def get_data(self):
         """Queries the server for all available datasets.
         """
         if not self.plugin.server_api.is_busy():
+            resp = self.plugin.server_api.get_datasets_info()
+            if resp:
+                self.dataset_info = {info["name"]: info for info in resp["data"]}
+                return list(self.dataset_info)
+            # server without dataset metadata
+            self.dataset_info = dict()
             return self.plugin.server_api.get_datasets()["data"]
         else:
             wx.MessageBox(
@@ -325,11 +355,11 @@ class TrainModelDialog(wx.Frame):
         while self.plugin.server_api.is_busy():
             dia = wx.MessageDialog(
                 parent=self,
-                message="The server can't be reached, is not listening on the chosen port or busy. Wait 10 seconds?",
+                message=f"{self.plugin.server_api.status_message()} Wait for it?",
                 caption="Server not responding",
                 style=wx.OK | wx.CANCEL | wx.OK_DEFAULT)
             if dia.ShowModal() == wx.ID_OK:
-                time.sleep(10)
+                self.plugin.server_api.wait_for_server(60)
             else:
                 return
 
@@ -423,7 +453,9 @@ class TrainModelDialog(wx.Frame):
     def on_test(self, evt):
         """Called by the "Test Model" button. Sends a list of dataset names and a batch-size
          to the server. The currently active model will be evaluated on "batch_size"
-         samples taken from the selected datasets.
+         samples taken from the selected datasets, with a batch-size of 0 on all samples at once.
+         When streaming all samples are evaluated in batches of "batch_size" samples (0 for the
+         servers default) and the distribution of the error is shown with the entered percentiles.
 
         Args:
             evt (wx.EVENT): unused
@@ -445,15 +477,40 @@ class TrainModelDialog(wx.Frame):
                     "Batch size must be an integer.",
                     'Error',
                     wx.OK | wx.ICON_ERROR)
-            else:
-                resp = self.plugin.server_api.test(datasets, int(batch_size))
-                if not resp is False:
-                    wx.MessageBox(f"Test loss: {resp['data']}")
-                else:
+                return
+            stream = self.stream_check.GetValue()
+            percentiles = None
+            if stream:
+                try:
+                    percentiles = [float(q) for q in self.percentiles_ctrl.GetValue().split(",") if q.strip()]
+                except ValueError:
+                    percentiles = []
+                if not percentiles or not all(0 <= q <= 100 for q in percentiles):
                     wx.MessageBox(
-                        "Error during testing.",
+                        "Percentiles must be numbers between 0 and 100, separated by commas.",
                         'Error',
                         wx.OK | wx.ICON_ERROR)
+                    return
+            resp = self.plugin.server_api.test(datasets, int(batch_size), stream, percentiles)
+            if not resp is False and stream:
+                stats = resp['data']
+                if stats['count'] == 0:
+                    wx.MessageBox("The datasets contain no samples.")
+                else:
+                    percentiles = "\n".join(f"  {q}%: {v:.5f}" for q, v in stats['percentiles'].items())
+                    wx.MessageBox(
+                        f"Test loss: {stats['loss']}\n"
+                        f"Samples: {stats['count']}\n"
+                        f"Error mean: {stats['mean']:.5f}, std: {stats['std']:.5f}\n"
+                        f"Error min: {stats['min']:.5f}, max: {stats['max']:.5f}\n"
+                        f"Error percentiles:\n{percentiles}")
+            elif not resp is False:
+                wx.MessageBox(f"Test loss: {resp['data']}")
+            else:
+                wx.MessageBox(
+                    "Error during testing.",
+                    'Error',
+                    wx.OK | wx.ICON_ERROR)
 
 
     def on_augment(self, evt):
@@ -486,12 +543,17 @@ class TrainModelDialog(wx.Frame):
         if not dia.ShowModal() == wx.ID_OK:
             return
 
-        slices = self.plugin.create_slices_mp()
-        slices = slices[1]
-        send_slices = [y.decode("utf-8") for x, y in slices] # x is metadata (e.g. position), y is slice in bytes
-        slice_count = str(len(send_slices))
-        x_dim = str(self.plugin.get_preference("slice_x"))
-        y_dim = str(self.plugin.get_preference("slice_y"))
+        server_slicing = self.plugin.get_preference("server_slicing")
+        if server_slicing:
+            # the server slices the board itself
+            geometry = self.plugin.create_geometry()
+        else:
+            slices = self.plugin.create_slices_mp()
+            slices = slices[1]
+            send_slices = [y.decode("utf-8") for x, y in slices] # x is metadata (e.g. position), y is slice in bytes
+            slice_count = str(len(send_slices))
+            x_dim = str(self.plugin.get_preference("slice_x"))
+            y_dim = str(self.plugin.get_preference("slice_y"))
         board = pcbnew.GetBoard()
         filename = board.GetFileName()
         name = re.search(r'[^\/]*\.kicad_pcb', filename).group(0)[:-10]
@@ -499,21 +561,24 @@ class TrainModelDialog(wx.Frame):
         while self.plugin.server_api.is_busy():
             dia = wx.MessageDialog(
                 parent=self,
-                message="The server can't be reached, is not listening on the chosen port or busy. Wait 10 seconds?",
+                message=f"{self.plugin.server_api.status_message()} Wait for it?",
                 caption="Server not responding",
                 style=wx.OK | wx.CANCEL | wx.OK_DEFAULT)
             if dia.ShowModal() == wx.ID_OK:
-                time.sleep(10)
+                self.plugin.server_api.wait_for_server(60)
             else:
                 return
 
-        resp = self.plugin.server_api.send_slices(
-            send_slices,
-            name,
-            slice_count,
-            x_dim,
-            y_dim,
-            self.augment)
+        if server_slicing:
+            resp = self.plugin.server_api.send_geometry(geometry, name, self.augment)
+        else:
+            resp = self.plugin.server_api.send_slices(
+                send_slices,
+                name,
+                slice_count,
+                x_dim,
+                y_dim,
+                self.augment)
         if resp == False:
             wx.MessageBox(
                 "Sending Dataset to the server failed.",
@@ -1,8 +1,13 @@
 """The module containing the ML-Server. Can be run to start
  the server, expects a port as argument."""
 import time
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+import multiprocessing
+import functools
 import json
+import io
 import base64
 from tensorflow import keras
 from threading import Thread
@@ -14,8 +19,23 @@ from numba import njit, prange
 from numba.typed import List
 from threading import Lock
 from threading import Thread
-import random
 import shutil
+if __package__ is None or __package__ == "":
+    import InferenceWorkers
+    import LiteModels
+    import Reservations
+    import Scheduler
+    import Slicer
+    import Spooling
+    import Storage
+else:
+    from Server import InferenceWorkers
+    from Server import LiteModels
+    from Server import Reservations
+    from Server import Scheduler
+    from Server import Slicer
+    from Server import Spooling
+    from Server import Storage
 
 
 SAVED_MODEL_FORMAT = "h5"
@@ -23,9 +43,43 @@ IP = "0.0.0.0"
 NR_CHANNELS = 8
 SAMPLES_PER_BATCH = 5000
 PATIENCE_MAX = 5
-
-
-@njit(parallel=True)
+# requests not reported as jobs by the status
+UNQUEUED_TYPES = (15, 16)
+# assumed duration in seconds of jobs that did not run yet
+DEFAULT_JOB_DURATION = 1.0
+# content type of requests with a binary body, their json payload is sent in the "Payload" header
+BINARY_CONTENT_TYPE = "application/octet-stream"
+# seconds after which uploads without new chunks are removed
+UPLOAD_MAX_AGE = 24*60*60
+# seconds after which transfer files left behind by plugins that crashed are removed, unless a job reads them
+TRANSFER_MAX_AGE = 24*60*60
+# megabytes of decoded datasets kept in memory, can be set with ${ANOPCB_DATASET_CACHE}
+DATASET_CACHE_MB = 1024
+# slices copied by one worker when loading datasets
+LOAD_SHARD_SIZE = 65536
+# slices evaluated at once when testing on whole datasets
+STREAM_BATCH_SIZE = 8192
+# percentiles of the error reported by default when testing on whole datasets
+DEFAULT_PERCENTILES = (50, 90, 95, 99, 99.9)
+# logarithmic bins of the error histogram, 100 per decade
+HISTOGRAM_EDGES = np.logspace(-6, 3, 901)
+# batch sizes the predict function of served models is traced for, larger batches are split
+PREDICT_BUCKETS = (64, 256, 1024, 4096)
+# slices evaluated in one turn of the fair scheduler
+EVALUATE_CHUNK_SIZE = 4096
+# megabytes of estimated peak memory the requests may reserve together, can be set with ${ANOPCB_MEMORY_BUDGET}
+MEMORY_BUDGET_MB = 4096
+# requests estimated to need less bytes aren't accounted
+ADMISSION_MIN_BYTES = 2**20
+# memory of a parsed json body relative to its length
+JSON_MEMORY_FACTOR = 4
+# json bodies of at least this many bytes are spooled to a file and parsed incrementally
+SPOOL_MIN_BYTES = 8 * 2**20
+# memory of a result value sent as json: python float, list entry and text
+JSON_RESULT_BYTES = 56
+
+
+@njit(parallel=True, nogil=True)
 def reshape_array(restored, new_shape, shape):
     """Reshapes the 2D array restored into a 3D array.
      each entry in the original array is turned into a one-hot vector.
@@ -47,10 +101,253 @@ def reshape_array(restored, new_shape, shape):
     return reshaped
 
 
+def copy_rows(target, array, rows):
+    """Copies rows of an array into a part of a preallocated array, run by the workers loading datasets.
+
+    Args:
+        target (array): the part of the preallocated array
+        array (array): the array to copy from
+        rows (slice or array): the rows to copy
+    """
+    target[...] = array[rows]
+
+
+class ErrorStatistics:
+    """Aggregates the loss and the error output of a model over batches: count, mean, standard deviation,
+     minimum, maximum and a histogram with logarithmic bins, from which percentiles are estimated.
+     The memory used doesn't depend on the amount of slices.
+    """
+    def __init__(self):
+        """Initializes the ErrorStatistics."""
+        self.count = 0
+        self.loss_sum = 0.0
+        self.mean = 0.0
+        # sum of squared differences from the mean
+        self.m2 = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+        # one bin below and one above the edges
+        self.counts = np.zeros(len(HISTOGRAM_EDGES) + 1, np.int64)
+
+    def add(self, errors, loss):
+        """Adds the results of a batch.
+
+        Args:
+            errors (array): the error of each slice
+            loss (float): the mean loss of the batch
+        """
+        errors = np.asarray(errors, np.float64).ravel()
+        if len(errors) == 0:
+            return
+        total = self.count + len(errors)
+        batch_mean = errors.mean()
+        delta = batch_mean - self.mean
+        self.m2 += ((errors - batch_mean)**2).sum() + delta**2 * self.count * len(errors) / total
+        self.mean += delta * len(errors) / total
+        self.loss_sum += loss * len(errors)
+        self.count = total
+        self.minimum = min(self.minimum, errors.min())
+        self.maximum = max(self.maximum, errors.max())
+        bins = np.searchsorted(HISTOGRAM_EDGES, errors, side="right")
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def edges(self):
+        """Gets the edges of all bins, the outer bins are bounded by minimum and maximum."""
+        return np.concatenate(([min(self.minimum, HISTOGRAM_EDGES[0])], HISTOGRAM_EDGES, [max(self.maximum, HISTOGRAM_EDGES[-1])]))
+
+    def percentile(self, q):
+        """Estimates a percentile of the errors, interpolating inside the bin it falls into.
+
+        Args:
+            q (float): the percentile, between 0 and 100
+
+        Returns:
+            float: the estimated error
+        """
+        cumulative = np.cumsum(self.counts)
+        target = q / 100 * self.count
+        i = min(int(np.searchsorted(cumulative, target, side="left")), len(self.counts) - 1)
+        below = cumulative[i - 1] if i > 0 else 0
+        fraction = (target - below) / self.counts[i] if self.counts[i] else 0
+        edges = self.edges()
+        value = edges[i] + fraction * (edges[i + 1] - edges[i])
+        return float(min(max(value, self.minimum), self.maximum))
+
+    def summary(self, percentiles):
+        """Summarizes the aggregated results.
+
+        Args:
+            percentiles (list): the percentiles to estimate
+
+        Returns:
+            dict: "count", "loss", "mean", "std", "min", "max", "percentiles" (percentile -> error)
+                and "histogram" ("edges" and "counts" of the non-empty range)
+        """
+        if self.count == 0:
+            return {"count" : 0}
+        edges = self.edges()
+        used = np.nonzero(self.counts)[0]
+        first, last = used[0], used[-1]
+        return {
+            "count" : int(self.count),
+            "loss" : self.loss_sum / self.count,
+            "mean" : float(self.mean),
+            "std" : float(np.sqrt(self.m2 / self.count)),
+            "min" : float(self.minimum),
+            "max" : float(self.maximum),
+            "percentiles" : {str(q) : self.percentile(q) for q in percentiles},
+            "histogram" : {
+                "edges" : edges[first:last + 2].tolist(),
+                "counts" : self.counts[first:last + 1].tolist()
+            }
+        }
+
+
+class Predictor:
+    """Predicts with a traced function of a served model instead of "predict", which sets up a
+     new data pipeline on every call. Batches are split into parts of at most the largest bucket size,
+     each part is padded to the next bucket size, so the function is traced once per bucket.
+    """
+    def __init__(self, model):
+        """Initializes the Predictor.
+
+        Args:
+            model (Model): the served model, later training of the model is seen by the predictor
+        """
+        self.model = model
+        self.function = tf.function(model.__call__, autograph=False)
+
+    def warm_up(self):
+        """Traces the function for all bucket sizes."""
+        for bucket in PREDICT_BUCKETS:
+            self.function(tf.zeros((bucket,) + tuple(self.model.input.shape[1:])), training=False)
+
+    def predict(self, inp):
+        """Predicts the outputs of the model.
+
+        Args:
+            inp (array): input of the model
+
+        Returns:
+            list: the outputs as numpy arrays, in the order of the model outputs
+        """
+        parts = []
+        for start in range(0, len(inp), PREDICT_BUCKETS[-1]):
+            part = inp[start:start + PREDICT_BUCKETS[-1]]
+            bucket = next(size for size in PREDICT_BUCKETS if size >= len(part))
+            padded = np.zeros((bucket,) + part.shape[1:], np.float32)
+            padded[:len(part)] = part
+            outputs = self.function(tf.constant(padded), training=False)
+            parts.append([output.numpy()[:len(part)] for output in outputs])
+        return [np.concatenate(outputs) for outputs in zip(*parts)]
+
+
+def load_predictor(path):
+    """Loads a model for inference and warms it up, used by the inference workers.
+
+    Args:
+        path (str): path of the model file
+
+    Returns:
+        function: predicts the outputs of the model for slices (count x x-size x y-size)
+    """
+    model = tf.keras.models.load_model(path, compile=False)
+    predictor = Predictor(model)
+    predictor.warm_up()
+    shape = tuple(model.input.shape[1:3])
+    new_shape = (shape[0], shape[1], NR_CHANNELS)
+    predict = lambda slices: predictor.predict(reshape_array(slices, new_shape, shape))
+    # the conversion of the slices is compiled on its first call
+    predict(np.zeros((1,) + shape, np.uint8))
+    return predict
+
+
+def job(method):
+    """Decorator for the request handling methods of the AnomalyHandler.
+     Requests are handled as jobs reported by the status, except requests with a type in UNQUEUED_TYPES.
+     The json payload is parsed beforehand and stored in self.payload. Of requests with a binary body
+     only the payload is read, the remaining self.body_length bytes of the body are read by the request handling.
+     Json bodies are only read once their memory is admitted, see "admit". Large json bodies are spooled
+     to a file and parsed incrementally, see "read_spooled".
+    """
+    @functools.wraps(method)
+    def wrapper(self):
+        length = int(self.headers['Content-Length'])
+        self.reserved_memory = 0
+        self.over_budget = False
+        # transfer files read by the request, removed once it's handled
+        self.transfer_handles = []
+        try:
+            self.body_length = 0
+            payload_raw = None
+            if self.headers.get('Content-Type') == BINARY_CONTENT_TYPE:
+                # binary bodies are read in blocks
+                payload_raw = self.headers.get('Payload', "")
+                self.body_length = length
+            elif length >= SPOOL_MIN_BYTES:
+                # the packed slices are at most as large as the body
+                if not self.admit(length):
+                    self.body_length = length
+                    self.send_bad_response()
+                    return
+            elif self.admit(length * JSON_MEMORY_FACTOR):
+                payload_raw = self.rfile.read(length)
+            else:
+                self.body_length = length
+                self.send_bad_response()
+                return
+            try:
+                if payload_raw is None:
+                    self.payload = self.read_spooled(length)
+                else:
+                    self.payload = json.loads(payload_raw)
+                request_type = self.payload.get("type")
+            except (ValueError, AttributeError):
+                self.send_bad_response()
+                return
+            if request_type in UNQUEUED_TYPES:
+                return method(self)
+            with self.server.run_job(request_type):
+                if "reserved" in self.payload and not self.attach_session(
+                        self.payload.get("session"), self.payload["reserved"]):
+                    self.send_bad_response()
+                    return
+                return method(self)
+        finally:
+            self.server.memory_budget.release(self.reserved_memory)
+            self.server.release_transfers(self.transfer_handles)
+            # an unread body would be taken for the next request on the connection
+            if self.body_length:
+                self.close_connection = True
+    return wrapper
+
+
 class AnomalyHandler(BaseHTTPRequestHandler):
     """The http-Handler handling the requests to the server. Expects requests according to the REST
      interface specified in the "REST definition.txt" and sends responses accordingly.
     """
+    # keep connections open for further requests, idle ones are closed after the timeout
+    protocol_version = "HTTP/1.1"
+    timeout = 300
+    # headers and body are written separately, don't let them wait for the delayed ack of the client
+    disable_nagle_algorithm = True
+
+    def send_response(self, code, message=None):
+        self.response_code = code
+        self.content_length_sent = False
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == "content-length":
+            self.content_length_sent = True
+        super().send_header(keyword, value)
+
+    def end_headers(self):
+        # on a kept open connection the client needs the length of every response with a body
+        if not self.content_length_sent and self.response_code != 204:
+            super().send_header("Content-Length", "0")
+        super().end_headers()
+
     def save_model(self, model_name, data, kind, comp):
         """Compiles and saves the model with the configuration specified in "data"
          under the name "model_name" using compile parameters in "comp".
@@ -64,10 +361,11 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             boolean: True if successfull, else False
         """
         try:
-            if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-                os.chdir("models")
-            if os.path.split(os.getcwd())[1] == "datasets":
-                os.chdir("../models")
+            # the training session compiles its instance from the file
+            if self.server.reservations.is_training(model_name):
+                print(f"Model {model_name} is in training!")
+                return False
+            path = self.server.storage.model_path(model_name)
             if kind == "json":
                 model = tf.keras.models.model_from_json(data)
                 model.compile(
@@ -76,11 +374,12 @@ class AnomalyHandler(BaseHTTPRequestHandler):
                     metrics=comp.get("metrics"),
                     loss_weights=[1.0, 0.0, 0.0]
                     )
-                model.save(f"{model_name}.{SAVED_MODEL_FORMAT}", save_format='h5')
+                with self.server.storage.atomic_path(path) as temporary:
+                    model.save(temporary, save_format='h5')
                 return True
             elif kind == "h5":
                 data = base64.b64decode(data)
-                with open(f"{model_name}.{SAVED_MODEL_FORMAT}", "wb") as f:
+                with self.server.storage.atomic_open(path, "wb") as f:
                     f.write(data)
                 return True
             else:
@@ -174,12 +473,26 @@ class AnomalyHandler(BaseHTTPRequestHandler):
         return res
 
 
+    def augment_array(self, data, shape):
+        """Augments an array of slices like "augment_data".
+
+        Args:
+            data (array): the slices (count x x_dim x y_dim)
+            shape (tuple): shape[0] = x_dim, shape[1] = y_dim
+
+        Returns:
+            array: the augmented slices
+        """
+        data = self.augment_data([a.tobytes().decode("utf-8") for a in data], shape)
+        return np.frombuffer("".join(data).encode("utf-8"), np.uint8).reshape((len(data),) + tuple(shape))
+
+
     def save_data(self, data, name, count, x_dim, y_dim, augment):
-        """Saves the dataset. The saved datasets name is as follows:
-         "name_count_xdim_ydim.json"
+        """Saves the dataset as array. The saved datasets name is as follows:
+         "name_count_xdim_ydim.npy"
 
         Args:
-            data (List): a list of slices
+            data (List): a list of slices or an array of slices
             name (str): name of the board
             count (str): number of slices
             x_dim (str): length of slice in x-dimension
@@ -190,24 +503,22 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             boolean: True if successfull, else False
         """
         try:
-            if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-                os.chdir("datasets")
-            if os.path.split(os.getcwd())[1] == "models":
-                os.chdir("../datasets")
+            self.server.storage.check_name(name)
+            shape = (int(x_dim), int(y_dim))
+            if not isinstance(data, np.ndarray):
+                data = np.frombuffer("".join(data).encode("utf-8"), np.uint8)
+            data = data.reshape((int(count),) + shape)
             if augment:
-                data = self.augment_data(data, (int(x_dim), int(y_dim)))
-                count = str(len(data))
+                data = self.augment_array(data, shape)
                 print("Data Augmentation successful")
-
-                with open(f"{name}_{count}_{x_dim}_{y_dim}_a.json", "w") as f:
-                    json.dump(data, f)
-            else:
-                with open(f"{name}_{count}_{x_dim}_{y_dim}.json", "w") as f:
-                    json.dump(data, f)
+            self.write_dataset(data, name, augment)
             return True
         except IOError as e:
             print("Encountered Error: ", e.args)
             return False
+        except ValueError as e:
+            print("Encountered Error: ", e.args)
+            return False
 
 
     def delete_data(self, name):
@@ -220,19 +531,19 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             boolean: True if successfull, else False
         """
         try:
-            if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-                os.chdir("datasets")
-            if os.path.split(os.getcwd())[1] == "models":
-                os.chdir("../datasets")    
-            os.remove(f"{name}.json")
+            self.server.storage.remove(self.server.storage.dataset_path(name))
+            self.server.dataset_cache.discard(name)
             return True
         except IOError as e:
             print("Encountered Error: ", e.args)
             return False
+        except ValueError as e:
+            print("Encountered Error: ", e.args)
+            return False
 
 
     def delete_model(self, name):
-        """Deletes the model with name "name", except when it is currently active.
+        """Deletes the model with name "name", except when it is currently active or in training.
 
         Args:
             name (str): name of a model
@@ -241,33 +552,25 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             boolean: True if successfull, else False
         """
         try:
-            with self.server.session_lock:
-                if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-                    os.chdir("models")
-                if os.path.split(os.getcwd())[1] == "datasets":
-                    os.chdir("../models")
-                if name in list(map(lambda x: x[0][0], self.server.sessions.values())):
-                    return False
-                else:
-                    os.remove(f"{name}.{SAVED_MODEL_FORMAT}")
-                    return True
+            # the training of a removed session runs until it ends
+            if self.server.reservations.is_reserved(name) or self.server.reservations.is_training(name):
+                return False
+            else:
+                self.server.storage.remove(self.server.storage.model_path(name))
+                return True
         except IOError as e:
             print("Encountered Error: ", e.args)
             return False
+        except ValueError as e:
+            print("Encountered Error: ", e.args)
+            return False
 
     def get_session(self):
-        tmp = self.server.session_counter
-        self.server.session_counter += 1
-        self.server.sessions[tmp] = [[None, None], int(time.time()), False]
-        return tmp
+        return self.server.reservations.new_session()
 
     def remove_session(self, session):
-        with self.server.session_lock:
-            try:
-                self.server.sessions.pop(session)
-            except Exception:
-                pass
-            return True
+        self.server.reservations.remove_session(session)
+        return True
 
     def get_data(self):
         """Gets the names of all available datasets.
@@ -275,29 +578,20 @@ class AnomalyHandler(BaseHTTPRequestHandler):
         Returns:
             List: names of datasets
         """
-        if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-            os.chdir("datasets")
-        if os.path.split(os.getcwd())[1] == "models":
-            os.chdir("../datasets")
-        datasets = os.listdir()
-        datasets = [os.path.splitext(x)[0] for x in datasets]
-        return datasets
+        return self.server.storage.datasets()
 
 
-    def get_model(self, name):
+    def get_model(self, name, compile=True):
         """Loads the model with name "name"
 
         Args:
             name (string): name of model
+            compile (bool, optional): Compile the model and restore the optimizer. Defaults to True.
 
         Returns:
             model: tensorflow model
         """        
-        if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-            os.chdir("models")
-        if os.path.split(os.getcwd())[1] == "datasets":
-            os.chdir("../models")
-        model = tf.keras.models.load_model(f"{name}.{SAVED_MODEL_FORMAT}")
+        model = tf.keras.models.load_model(self.server.storage.model_path(name), compile=compile)
         return model
 
 
@@ -307,12 +601,7 @@ class AnomalyHandler(BaseHTTPRequestHandler):
         Returns:
             list: names of available models
         """        
-        if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-            os.chdir("models")
-        if os.path.split(os.getcwd())[1] == "datasets":
-            os.chdir("../models")
-        files = [os.path.splitext(x)[0] for x in os.listdir() if os.path.splitext(x)[1] == f".{SAVED_MODEL_FORMAT}"]
-        return files
+        return self.server.storage.models()
 
 
     def set_active_model(self, model_name, session):
@@ -326,7 +615,16 @@ class AnomalyHandler(BaseHTTPRequestHandler):
         """        
         self.update_session_time(session)
         try:
-            model = self.get_model(model_name)
+            # compiled when it is trained or tested, see "compile_model"
+            start = time.time()
+            model = self.get_model(model_name, compile=False)
+            loaded = time.time()
+            predictor = Predictor(model)
+            predictor.warm_up()
+            # the conversion of the slices is compiled on its first call
+            shape = tuple(model.input.shape[1:3])
+            self.reconstruct(np.zeros((1,) + shape, np.uint8), shape)
+            print(f"Loaded {model_name} in {loaded - start:.2f}s, warmed up in {time.time() - loaded:.2f}s.")
         except ValueError as e:
             print("Encountered Error: ", e.args)
             return False
@@ -336,35 +634,65 @@ class AnomalyHandler(BaseHTTPRequestHandler):
         except IOError as e:
             print("Encountered Error: ", e.args)
             return False
-        with self.server.session_lock:
-            if list(filter(lambda x: x[0][0]==model_name and x[2], self.server.sessions.values())) != []:
-                return False
-            try:
-                mod_ses = self.server.sessions[session]
-            except:
-                mod_ses = [None, int(time.time()), False]
-            mod_ses[0] = [model_name, model]
-            self.server.sessions[session] = mod_ses
-            return True
+        if not self.server.reservations.reserve(session, model_name, model, predictor):
+            return False
+        if self.server.inference_workers is not None:
+            path = self.server.storage.model_path(model_name)
+            self.server.inference_workers.load(path, self.server.storage.file_version(path))
+        return True
+
+
+    def compile_model(self, session, model):
+        """Gets a compiled instance of a model loaded for inference. The model file is loaded again compiled,
+         with the saved optimizer and its state, the weights of the sessions instance are copied in
+         and the compiled instance replaces it.
+
+        Args:
+            session (int): the session reserving the model
+            model (Model): the sessions instance of the model
+
+        Returns:
+            Model: the compiled instance, None if the session doesn't reserve the instance anymore
+        """
+        with self.server.compile_lock:
+            model_name, current = self.server.reservations.get(session)
+            # compiled by another request of the session meanwhile
+            if current is not model:
+                return current if current is not None and current.optimizer is not None else None
+            if model.optimizer is not None:
+                return model
+            compiled = self.get_model(model_name)
+            compiled.set_weights(model.get_weights())
+            predictor = Predictor(compiled)
+            predictor.warm_up()
+            if not self.server.reservations.replace(session, model, compiled, predictor):
+                return None
+            return compiled
 
 
     def get_active_model(self, session):
         """Gets the currently active model.
 
         Returns:
-            tuple: name and config of active model
+            tuple: name, config and version of active model. The version changes whenever the model file
+             is rewritten, it is None if the sessions instance of the model was trained.
         """     
         self.update_session_time(session)
-        with self.server.session_lock:   
-            conf = self.server.sessions[session][0][1] if session in self.server.sessions.keys() else None
-            if conf != None:
-                conf = conf.to_json()
-            name = self.server.sessions[session][0][0] if session in self.server.sessions.keys() else None
-            return (name, conf)
+        name, conf = self.server.reservations.get(session)
+        version = None
+        if conf != None:
+            conf = conf.to_json()
+            if not self.server.reservations.is_trained(session):
+                try:
+                    version = "{}-{}".format(*self.server.storage.file_version(self.server.storage.model_path(name)))
+                except (OSError, ValueError) as e:
+                    print("Encountered Error: ", e.args)
+        return (name, conf, version)
 
 
     def load_data(self, datasets, batch_size):
-        """Loads a batch of size batch_size with random samples from datasets.
+        """Loads a batch of size batch_size with random samples from datasets. The samples are drawn
+         over all slices of the datasets, only the drawn slices are read from arrays too large for the dataset cache.
 
         Args:
             datasets (list): List of dataset names
@@ -373,29 +701,235 @@ class AnomalyHandler(BaseHTTPRequestHandler):
         Returns:
             Result: data as numpy array if successful, else False
         """
-        if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-            os.chdir("datasets")
-        if os.path.split(os.getcwd())[1] == "models":
-            os.chdir("../datasets")
+        # a dataset selected twice is read once
+        datasets = list(dict.fromkeys(datasets))
+        shape = self.dataset_shape(datasets)
+        if not shape:
+            return False
+
+        pool = self.server.load_pool
+        arrays = list(pool.map(lambda name: self.server.read_dataset(name, shape), datasets))
+        counts = [len(array) for array in arrays]
+        new_shape = (shape[0], shape[1], NR_CHANNELS)
+        sampled = not (batch_size < 1 or batch_size > sum(counts))
+        if sampled:
+            # sorted, so each dataset is read front to back
+            indices = np.sort(np.random.choice(sum(counts), batch_size, replace=False))
+            bounds = np.searchsorted(indices, np.cumsum(counts)[:-1])
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            selections = [part - offset for part, offset in zip(np.split(indices, bounds), offsets)]
+        else:
+            selections = [None] * len(arrays)
+
+        # the workers copy shards of the datasets into their place in the batch
+        restored = np.empty((batch_size if sampled else sum(counts), shape[0], shape[1]), np.uint8)
+        tasks = []
+        start = 0
+        for array, rows in zip(arrays, selections):
+            count = len(array) if rows is None else len(rows)
+            for first in range(0, count, LOAD_SHARD_SIZE):
+                last = min(first + LOAD_SHARD_SIZE, count)
+                part = slice(first, last) if rows is None else rows[first:last]
+                tasks.append((restored[start + first:start + last], array, part))
+            start += count
+        pool.starmap(copy_rows, tasks)
+        if sampled:
+            restored = restored[np.random.permutation(batch_size)]
+        return reshape_array(restored, new_shape, shape)
+
+
+    def dataset_shape(self, datasets):
+        """Gets the shape of the slices of datasets from their metadata.
+
+        Args:
+            datasets (list): List of dataset names
 
+        Returns:
+            tuple: (x_dim, y_dim) if all datasets are known and have the same shape, else False
+        """
         shapes = set()
         for name in datasets:
-            split = name.split("_")
-            shapes.add((int(split[2]), int(split[3])))
+            info = self.server.storage.dataset_info(name)
+            if info is None or info["x_dim"] is None:
+                return False
+            shapes.add((info["x_dim"], info["y_dim"]))
         if len(shapes) != 1:
             return False
-        shape = shapes.pop()
+        return shapes.pop()
 
-        slices = []
-        for name in datasets:
-            with open(f"{name}.json", "r") as f:
-                slices += json.load(f)
-        restored = np.array([np.frombuffer(a.encode(), np.uint8).reshape(shape) for a in slices])
-        new_shape = (shape[0], shape[1], NR_CHANNELS)
-        if not (batch_size < 1 or batch_size > len(slices)):
-            indices = np.random.choice(len(restored), batch_size, replace=False)
-            restored = restored[indices]
-        return reshape_array(restored, new_shape, shape)
+
+    def unique_slices(self, data):
+        """Removes duplicate slices, the first occurrence of each slice is kept in place.
+
+        Args:
+            data (array): the slices (count x x_dim x y_dim)
+
+        Returns:
+            array: the unique slices
+        """
+        rows = np.ascontiguousarray(data).reshape((len(data), -1))
+        rows = rows.view(np.dtype((np.void, rows.shape[1]))).ravel()
+        indices = np.unique(rows, return_index=True)[1]
+        return data[np.sort(indices)]
+
+
+    def write_dataset(self, data, board, augmented):
+        """Saves slices as new dataset, named like the datasets saved by "save_data".
+
+        Args:
+            data (array): the slices (count x x_dim x y_dim)
+            board (str): name of the board
+            augmented (bool): whether the slices are augmented
+
+        Returns:
+            str: name of the dataset
+        """
+        count, x_dim, y_dim = data.shape
+        dataset = f"{board}_{count}_{x_dim}_{y_dim}{'_a' if augmented else ''}"
+        with self.server.storage.atomic_open(self.server.storage.dataset_path(dataset), "wb") as f:
+            np.save(f, data)
+        self.server.storage.record_dataset(dataset, board, int(count), int(x_dim), int(y_dim), bool(augmented))
+        return dataset
+
+
+    def merge_data(self, datasets, board, remove):
+        """Merges datasets into a single dataset without duplicate slices. Merging a single dataset
+         compacts it, older json datasets are converted to arrays.
+
+        Args:
+            datasets (list): List of dataset names
+            board (str): name of the board of the new dataset
+            remove (bool): whether the merged datasets should be removed
+
+        Returns:
+            str: name of the new dataset if successfull, else False
+        """
+        try:
+            self.server.storage.check_name(board)
+            datasets = list(dict.fromkeys(datasets))
+            shape = self.dataset_shape(datasets)
+            if not shape:
+                return False
+            augmented = all(self.server.storage.dataset_info(name)["augmented"] for name in datasets)
+            count = sum(self.server.storage.dataset_info(name)["count"] or 0 for name in datasets)
+            if not self.admit_merge(count, shape):
+                print(f"Merging {count} slices exceeds the memory budget!")
+                return False
+            data = self.unique_slices(np.concatenate([self.server.read_dataset(name, shape) for name in datasets]))
+            dataset = self.write_dataset(data, board, augmented)
+            if remove:
+                for name in datasets:
+                    if name != dataset:
+                        self.delete_data(name)
+            return dataset
+        except IOError as e:
+            print("Encountered Error: ", e.args)
+            return False
+        except ValueError as e:
+            print("Encountered Error: ", e.args)
+            return False
+
+
+    def begin_upload(self, board, count, x_dim, y_dim, augment, chunk, append=None):
+        """Begins the upload of a dataset in chunks.
+
+        Args:
+            board (str): name of the board
+            count (int): number of slices
+            x_dim (int): length of slice in x-dimension
+            y_dim (int): length of slice in y-dimension
+            augment (bool): whether the data should be augmented
+            chunk (int): number of slices per chunk
+            append (str, optional): name of a dataset the slices are appended to. Defaults to None.
+
+        Returns:
+            str: id of the upload if successfull, else False
+        """
+        try:
+            self.server.storage.check_name(board)
+            if append is not None and self.dataset_shape([append]) != (int(x_dim), int(y_dim)):
+                return False
+            return self.server.storage.begin_upload(board, int(count), int(x_dim), int(y_dim), bool(augment), int(chunk), append)
+        except IOError as e:
+            print("Encountered Error: ", e.args)
+            return False
+        except ValueError as e:
+            print("Encountered Error: ", e.args)
+            return False
+
+
+    def append_upload(self, upload, sequence):
+        """Writes the chunk in the binary body of the request into the dataset file of the upload.
+
+        Args:
+            upload (str): id of the upload
+            sequence (int): sequence number of the chunk
+
+        Returns:
+            boolean: True if successfull, else False
+        """
+        try:
+            self.server.storage.write_chunk(upload, int(sequence), self.rfile, self.body_length)
+            self.body_length = 0
+            return True
+        except IOError as e:
+            print("Encountered Error: ", e.args)
+            return False
+        except ValueError as e:
+            print("Encountered Error: ", e.args)
+            return False
+
+
+    def commit_upload(self, upload):
+        """Saves a complete upload as dataset, named like the datasets saved by "save_data".
+         Slices appended to a dataset replace it by a dataset without duplicates, named after its new count.
+         They are augmented if the dataset is augmented.
+
+        Args:
+            upload (str): id of the upload
+
+        Returns:
+            str: name of the dataset if successfull, else False
+        """
+        storage = self.server.storage
+        try:
+            state = storage.upload_state(upload)
+            if state is None or not storage.is_complete(state):
+                return False
+            shape = (state["x_dim"], state["y_dim"])
+            if state.get("append") is not None:
+                info = storage.dataset_info(state["append"])
+                if info is None:
+                    return False
+                # augmenting flips every slice in three directions
+                count = (info["count"] or 0) + state["count"] * (4 if info["augmented"] else 1)
+                if not self.admit_merge(count, shape):
+                    print(f"Appending to {state['append']} exceeds the memory budget!")
+                    return False
+                data = np.load(storage.upload_file(upload, ".npy"))
+                if info["augmented"]:
+                    data = self.augment_array(data, shape)
+                data = self.unique_slices(np.concatenate([self.server.read_dataset(state["append"], shape), data]))
+                dataset = self.write_dataset(data, info["board"], info["augmented"])
+                if dataset != state["append"]:
+                    self.delete_data(state["append"])
+                storage.remove_upload(upload)
+                return dataset
+            if state["augmented"]:
+                data = np.load(storage.upload_file(upload, ".npy"))
+                dataset = self.write_dataset(self.augment_array(data, shape), state["board"], True)
+                storage.remove_upload(upload)
+                return dataset
+            dataset = f"{state['board']}_{state['count']}_{state['x_dim']}_{state['y_dim']}"
+            storage.commit_upload(upload, dataset)
+            storage.record_dataset(dataset, state["board"], state["count"], state["x_dim"], state["y_dim"], False)
+            return dataset
+        except IOError as e:
+            print("Encountered Error: ", e.args)
+            return False
+        except ValueError as e:
+            print("Encountered Error: ", e.args)
+            return False
 
 
     def reconstruct(self, data, shape):
@@ -409,9 +943,60 @@ class AnomalyHandler(BaseHTTPRequestHandler):
         Returns:
             array: correctly formatted input array for the ML model
         """
-        restored = np.array([np.frombuffer(a.encode(), np.uint8).reshape(shape) for a in data])
+        # numba compiles reshape_array again for lists
+        shape = tuple(shape)
         new_shape = (shape[0], shape[1], NR_CHANNELS)
-        return reshape_array(restored, new_shape, shape)
+        return reshape_array(self.restore(data, shape), new_shape, shape)
+
+
+    def restore(self, data, shape):
+        """Converts "data", the slices as strings or as array, to an array of the slices.
+
+        Args:
+            data (list): list of slices
+            shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
+
+        Returns:
+            array: the slices (count x shape[0] x shape[1])
+        """
+        if isinstance(data, np.ndarray):
+            return data.reshape((len(data), shape[0], shape[1]))
+        return np.frombuffer("".join(data).encode(), np.uint8).reshape((len(data), shape[0], shape[1]))
+
+
+    def slice_geometry(self, geometry, mode, session, name=None, augment=False, json_results=True):
+        """Rasterizes and slices the board described by "geometry" on the server. Afterwards the
+         slices are either evaluated on the currently active model or saved as a dataset.
+
+        Args:
+            geometry (dict): geometry of the board as specified in "REST definition.txt"
+            mode (str): "evaluate" or "store"
+            session (int): the session, only needed for "evaluate"
+            name (str): name of the board, only needed for "store"
+            augment (bool): whether the data should be augmented, only used by "store"
+            json_results (bool, optional): The results are sent as json, see "evaluate". Defaults to True.
+
+        Returns:
+            Result: for "evaluate" a list [loss, mse, encoded vector, slice positions] with numpy arrays,
+             for "store" True if successful, else False
+        """
+        try:
+            positions, slices = Slicer.create_slices(geometry)
+        except (KeyError, TypeError, ValueError) as e:
+            print("Encountered Error: ", e.args)
+            return False
+        shape = (slices.shape[2], slices.shape[1])
+        print(f"Created {len(slices)} slices from geometry.")
+        if mode == "evaluate":
+            resp = self.evaluate(slices, shape, session, json_results)
+            if resp is False:
+                return False
+            resp.append(positions)
+            return resp
+        elif mode == "store" and name is not None:
+            return self.save_data(slices, name, str(len(slices)), str(shape[0]), str(shape[1]), augment)
+        else:
+            return False
 
 
     def test(self, datasets, batch_size, session):
@@ -426,11 +1011,12 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             Loss: Loss as Integer if successful, else False
         """
         self.update_session_time(session)
-        with self.server.session_lock:
-            active_model_name = self.server.sessions[session][0][0] if session in self.server.sessions.keys() else None
-            active_model = self.server.sessions[session][0][1] if session in self.server.sessions.keys() else None
-
-            if list(filter(lambda x: x[0][0]==active_model_name and x[2], self.server.sessions.values())) != []:
+        # admitted before reading the model, a request waiting for memory mustn't block the training committing
+        if not self.admit_batches(datasets, batch_size):
+            return False
+        with self.server.reservations.reading(session) as active_model:
+            # False while the session trains the model
+            if active_model is False:
                 return False
             
             if active_model is None:
@@ -440,6 +1026,9 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             if data is False:
                 return False
             try:
+                active_model = self.compile_model(session, active_model)
+                if active_model is None:
+                    return False
                 loss = active_model.evaluate(data, data)[0]
                 return float(loss)
             except ValueError as e:
@@ -450,35 +1039,75 @@ class AnomalyHandler(BaseHTTPRequestHandler):
                 return False
 
 
-    def evaluate(self, data, shape, session):
-        """Evaluates "data" with shape "shape" on the currently active model.
+    def stream_batches(self, datasets, shape, batch_size):
+        """Yields all slices of datasets in batches, ready for the model. The next batch is
+         prepared by a worker while the current batch is evaluated.
 
         Args:
-            data (list): list of slices
+            datasets (list): List of dataset names
             shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
+            batch_size (int): slices per batch
+
+        Yields:
+            array: one-hot representation of a batch
+        """
+        new_shape = (shape[0], shape[1], NR_CHANNELS)
+        prepare = lambda array, start: reshape_array(np.ascontiguousarray(array[start:start + batch_size]), new_shape, shape)
+        pending = None
+        for name in datasets:
+            array = self.server.read_dataset(name, shape)
+            for start in range(0, len(array), batch_size):
+                future = self.server.load_pool.apply_async(prepare, (array, start))
+                if pending is not None:
+                    yield pending.get()
+                pending = future
+        if pending is not None:
+            yield pending.get()
+
+
+    def test_stream(self, datasets, batch_size, percentiles, session):
+        """Evaluates the model on all slices of datasets, streamed in batches of size batch_size.
+         Only the statistics of the loss and the error output are kept.
+
+        Args:
+            datasets (list): List of dataset names
+            batch_size (int): slices per batch
+            percentiles (list): percentiles of the error to report
 
         Returns:
-            metrics: list [loss, mse, encoded vector]
+            dict: the statistics, see "ErrorStatistics.summary", if successful, else False
         """
         self.update_session_time(session)
-        with self.server.session_lock:
-            active_model_name = self.server.sessions[session][0][0] if session in self.server.sessions.keys() else None
-            active_model = self.server.sessions[session][0][1] if session in self.server.sessions.keys() else None
-
-            if list(filter(lambda x: x[0][0]==active_model_name and x[2], self.server.sessions.values())) != []:
+        datasets = list(dict.fromkeys(datasets))
+        shape = self.dataset_shape(datasets)
+        if not shape:
+            return False
+        # the prepared and the prefetched batch, one of them as floats,
+        # admitted before reading the model like in "test"
+        if not self.admit(batch_size * shape[0] * shape[1] * NR_CHANNELS * 6):
+            return False
+        with self.server.reservations.reading(session) as active_model:
+            # False while the session trains the model
+            if active_model is False:
                 return False
-            
             if active_model is None:
                 print("No active ML-Model!")
                 return False
             if active_model.input.shape[1:3] != shape:
-                print(f"Shape {shape} of slices does not match model input {active_model.input.shape}!")
                 return False
             try:
-                inp = self.reconstruct(data, shape)
-                predicts = active_model.predict(inp)
-                # loss not needed in current implementation
-                return ["dummy", predicts[2].tolist(), predicts[1].tolist()]
+                active_model = self.compile_model(session, active_model)
+                if active_model is None:
+                    return False
+                statistics = ErrorStatistics()
+                for inp in self.stream_batches(datasets, shape, batch_size):
+                    with self.server.scheduler.turn(session, len(inp)):
+                        # one pass for the loss and the error output, the loss like "evaluate" computes it
+                        outputs = active_model(inp, training=False)
+                        loss = active_model.compiled_loss(
+                            tf.constant(inp, tf.float32), outputs, regularization_losses=active_model.losses)
+                    statistics.add(outputs[2].numpy(), float(loss))
+                return statistics.summary(percentiles)
             except ValueError as e:
                 print("Encountered Error: ", e.args)
                 return False
@@ -487,114 +1116,336 @@ class AnomalyHandler(BaseHTTPRequestHandler):
                 return False
 
 
-    def update_session_time(self, session):
-        try:
-            self.server.session[session][1] = int(time.time())
-        except Exception:
-            pass
-
-    def new_train(self, datasets, batch_size, train_time, session):
-        """Trains and validates the model on datasets. If datasets for training and validation
-         are the same, they will be split. If the batch size for training is chosen
-         larger than the size of the datasets, no data will be used for validation (bad).
-         The model will train for train_time[1] epochs. One epoch means training
-         on SAMPLES_PER_BATCH (5000 per default) samples, then validating. If the validation loss rises for 5 epochs in
-         succession, the training is stopped (overfitting). Otherwise the training will be stopped
-         after train_time[0] minutes or train_time[1] epochs.
+    def evaluate(self, data, shape, session, json_results=True):
+        """Evaluates "data" with shape "shape" on the currently active model.
 
         Args:
-            datasets (Tuple[List, List]): Tuple of lists of dataset names. One for training, one for validation.
-            batch_size (Tuple[int, int]): Tuple of batch sizes. One for training, one for validation.
-            train_time (Tuple[int, int]): Tuple of train times. One in minutes, one in epochs.
-
+            data (list): list of slices
+            shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
+            json_results (bool, optional): The results are sent as json instead of arrays, used to estimate the memory.
+             Defaults to True.
+
+        Returns:
+            metrics: list [loss, mse, encoded vector], mse and encoded vector as numpy arrays
+        """
+        self.update_session_time(session)
+        # admitted before reading the model like in "test", the outputs don't change while the model trains
+        model = self.server.reservations.get(session)[1]
+        if model is not None:
+            # the slices as strings and as array, a chunk one-hot and as floats, the kept outputs of the chunks
+            # and concatenated, as json the results as python floats, else their encoded copy
+            values = sum(int(np.prod(output.shape[1:])) for output in model.outputs[1:3])
+            slice_bytes = shape[0] * shape[1]
+            memory = (2 * len(data) * slice_bytes + EVALUATE_CHUNK_SIZE * slice_bytes * NR_CHANNELS * 5
+                + len(data) * values * (8 + (JSON_RESULT_BYTES if json_results else 4)))
+            if not self.admit(self.reserved_memory + memory):
+                print(f"Evaluating {len(data)} slices exceeds the memory budget!")
+                return False
+        # uses the snapshot while the session trains the model
+        with self.server.reservations.reading(session, snapshot=True) as active_model:
+            if active_model is None:
+                print("No active ML-Model!")
+                return False
+            if active_model.input.shape[1:3] != shape:
+                print(f"Shape {shape} of slices does not match model input {active_model.input.shape}!")
+                return False
+            try:
+                model_name = self.server.reservations.get(session)[0]
+                # a trained instance differs from the model file the workers and the lite model use
+                trained = self.server.reservations.is_trained(session)
+                workers = self.server.inference_workers if not trained else None
+                if workers is not None:
+                    path = self.server.storage.model_path(model_name)
+                    version = self.server.storage.file_version(path)
+                    output_shapes = [tuple(output.shape[1:]) for output in active_model.outputs]
+                predictor = None
+                if self.server.lite_models is not None and not trained:
+                    predictor = self.server.lite_models.get(model_name)
+                if predictor is None:
+                    predictor = self.server.reservations.get_predictor(session, active_model) or active_model
+                slices = self.restore(data, shape)
+                parts = []
+                # large requests take turns with the requests of other sessions
+                for start in range(0, len(slices), EVALUATE_CHUNK_SIZE):
+                    part = slices[start:start + EVALUATE_CHUNK_SIZE]
+                    with self.server.scheduler.turn(session, len(part)):
+                        # the reconstruction isn't sent
+                        predicts = None
+                        if workers is not None:
+                            predicts = workers.evaluate(path, version, part, output_shapes, (1, 2))
+                        if predicts is None:
+                            predicts = predictor.predict(self.reconstruct(part, shape))[1:3]
+                    parts.append(tuple(predicts))
+                encoded, errors = [np.concatenate(outputs) for outputs in zip(*parts)]
+                # loss not needed in current implementation
+                return ["dummy", errors, encoded]
+            except ValueError as e:
+                print("Encountered Error: ", e.args)
+                return False
+            except Exception as e:
+                print("Encountered Error: ", e.args)
+                return False
+
+
+    def transfer_file(self, handle):
+        """Gets the path of a file in the transfer directory shared with a plugin on the same host.
+
+        Args:
+            handle (str): name of the file
+
+        Returns:
+            str: path of the file
+        """
+        if handle != os.path.basename(handle) or handle in ("", ".", ".."):
+            raise ValueError(f"Invalid transfer handle {handle}!")
+        return os.path.join(self.server.transfer_path, handle)
+
+
+    def read_transfer(self, handle, count, shape):
+        """Maps the slices a plugin on the same host wrote into the transfer directory,
+         the slices are not copied.
+
+        Args:
+            handle (str): name of the file
+            count (int): amount of slices
+            shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
+
+        Returns:
+            array: the slices (count x shape[0] x shape[1])
+        """
+        path = self.transfer_file(handle)
+        self.server.claim_transfer(handle)
+        self.transfer_handles.append(handle)
+        return np.memmap(path, np.uint8, mode="r", shape=(int(count), int(shape[0]), int(shape[1])))
+
+
+    def write_transfer(self, handle, arrays):
+        """Writes arrays as float32 one after another into the transfer directory
+         to be read by a plugin on the same host.
+
+        Args:
+            handle (str): name of the file
+            arrays (list): arrays to be written
+        """
+        with open(self.transfer_file(handle), "wb") as f:
+            for array in arrays:
+                f.write(np.ascontiguousarray(array, np.float32).tobytes())
+
+
+    def check_transfer(self, handle, token):
+        """Checks whether a plugin shares the transfer directory with the server.
+
+        Args:
+            handle (str): name of a file the plugin wrote into its transfer directory
+            token (str): the content of the file
+
+        Returns:
+            bool: True if the server sees the file, else False
+        """
+        try:
+            with open(self.transfer_file(handle), "r") as f:
+                return f.read() == token
+        except (IOError, ValueError):
+            return False
+
+
+    def jsonable(self, resp):
+        """Converts the numpy arrays in a list of results to lists, so it can be json encoded.
+
+        Args:
+            resp (list): results
+
+        Returns:
+            list: results without numpy arrays
+        """
+        return [x.tolist() if isinstance(x, np.ndarray) else x for x in resp]
+
+
+    def result_arrays(self, resp):
+        """Gets the arrays of the results of an evaluation, to be sent as npz archive.
+
+        Args:
+            resp (list): results [loss, mse, encoded vector] and of sliced geometries the positions of the slices
+
+        Returns:
+            dict: "mse" (count, float32), "encoded" (count x latent, float32) and "positions" (count x 2, int64)
+        """
+        arrays = {"mse" : np.asarray(resp[1], np.float32), "encoded" : np.asarray(resp[2], np.float32)}
+        if len(resp) > 3:
+            arrays["positions"] = np.asarray(resp[3], np.int64).reshape((-1, 2))
+        return arrays
+
+
+    def send_arrays(self, arrays):
+        """Sends arrays as uncompressed npz archive, the binary alternative to json encoded results.
+
+        Args:
+            arrays (dict): name -> array
+        """
+        body = io.BytesIO()
+        np.savez(body, **arrays)
+        content = body.getbuffer()
+        self.send_response(200)
+        self.send_header("Content-Type", BINARY_CONTENT_TYPE)
+        self.send_header("Content-Length", str(content.nbytes))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+    def update_session_time(self, session):
+        self.server.reservations.touch(session)
+
+    def attach_session(self, session, model_name):
+        """Recreates a removed session and reserves the model the client expects to be reserved.
+         Clients send the reserved model with their requests, instead of checking their session beforehand.
+
+        Args:
+            session (int): The session of the request.
+            model_name (string): Name of the model reserved by the client or None.
+
+        Returns:
+            bool: False if the session wasn't issued by this server, else True.
+        """
+        if session is None:
+            return True
+        if not self.server.reservations.ensure_session(session):
+            print(f"Unknown session {session}, the client needs a new session!")
+            return False
+        if model_name is None or self.server.reservations.get(session)[0] == model_name:
+            return True
+        self.set_active_model(model_name, session)
+        return True
+
+    def new_train(self, datasets, batch_size, train_time, session):
+        """Trains and validates the model on datasets. If datasets for training and validation
+         are the same, they will be split. If the batch size for training is chosen
+         larger than the size of the datasets, no data will be used for validation (bad).
+         The model will train for train_time[1] epochs. One epoch means training
+         on SAMPLES_PER_BATCH (5000 per default) samples, then validating. If the validation loss rises for 5 epochs in
+         succession, the training is stopped (overfitting). Otherwise the training will be stopped
+         after train_time[0] minutes or train_time[1] epochs.
+
+        Args:
+            datasets (Tuple[List, List]): Tuple of lists of dataset names. One for training, one for validation.
+            batch_size (Tuple[int, int]): Tuple of batch sizes. One for training, one for validation.
+            train_time (Tuple[int, int]): Tuple of train times. One in minutes, one in epochs.
+
         Returns:
             metrics: List of Tuples[loss, validation loss] if successful, else False
         """
         self.update_session_time(session)
-        with self.server.session_lock:
-            active_model_name = self.server.sessions[session][0][0] if session in self.server.sessions.keys() else None
-            active_model = self.server.sessions[session][0][1] if session in self.server.sessions.keys() else None
-            
-            if list(filter(lambda x: x[0][0]==active_model_name and x[2], self.server.sessions.values())) != []:
+        with self.server.reservations.training(session) as active_model:
+            # False while the model is in training by another session
+            if active_model is False:
+                return False
+            if active_model is None:
+                print("No active ML-Model!")
                 return False
-            self.server.sessions[session][2] = True
+            snapshot = None
             try:
+                train_datasets = datasets[0]
+                val_datasets = datasets[1]
+                train_batch_size = batch_size[0]
+                val_batch_size = batch_size[1]
+                train_min = train_time[0] if train_time[0] > 0 else 1000000
+                train_ep = train_time[1] if train_time[1] > 0 else 1000000000
+                if not self.admit_batches(list(dict.fromkeys(train_datasets + val_datasets)), train_batch_size + val_batch_size):
+                    return False
+
+                if train_datasets == val_datasets:
+                    # only the slices for both batches are loaded
+                    data = self.load_data(train_datasets, train_batch_size + val_batch_size if train_batch_size > 0 else 0)
+                    if data is False:
+                        return False
+                    ind = np.random.choice(len(data), len(data), replace=False)
+                    b1 = train_batch_size if train_batch_size > 0 and train_batch_size < len(data) else len(data)
+                    b2 = b1 + val_batch_size if b1 + val_batch_size < len(data) else len(data)
+                    ind1 = ind[0:b1]
+                    ind2 = ind[b1:b2]
+                    train_data = data[ind1]
+                    val_data = data[ind2]
+                else:
+                    train_data = self.load_data(train_datasets, train_batch_size)
+                    val_data = self.load_data(val_datasets, val_batch_size)
+                    if train_data is False or val_data is False:
+                        return False
+
+                # compiled and snapshotted once the training is admitted and its data is loaded,
+                # evaluations of the session use the snapshot while it trains, updated after every epoch
+                active_model = self.compile_model(session, active_model)
                 if active_model is None:
-                    print("No active ML-Model!")
                     return False
-                try:
-                    train_datasets = datasets[0]
-                    val_datasets = datasets[1]
-                    train_batch_size = batch_size[0]
-                    val_batch_size = batch_size[1]
-                    train_min = train_time[0] if train_time[0] > 0 else 1000000
-                    train_ep = train_time[1] if train_time[1] > 0 else 1000000000
-
-                    if train_datasets == val_datasets:
-                        data = self.load_data(train_datasets, 0)
-                        if data is False:
-                            return False
-                        ind = np.random.choice(len(data), len(data), replace=False)
-                        b1 = train_batch_size if train_batch_size > 0 and train_batch_size < len(data) else len(data)
-                        b2 = b1 + val_batch_size if b1 + val_batch_size < len(data) else len(data)
-                        ind1 = ind[0:b1]
-                        ind2 = ind[b1:b2]
-                        train_data = data[ind1]
-                        val_data = data[ind2]
+                predictor = self.server.reservations.get_predictor(session, active_model)
+                snapshot = Predictor(tf.keras.models.clone_model(active_model))
+                snapshot.model.set_weights(active_model.get_weights())
+                snapshot.warm_up()
+                self.server.reservations.set_predictor(session, active_model, snapshot)
+
+                patience = 0
+                lastloss = float("inf")
+                noval = len(val_data) == 0
+                start = time.time()
+                metrics = []
+                for epi in range(train_ep):
+                    print(f"Epoch {epi} of {train_ep}.")
+                    sample = train_data[np.random.choice(len(train_data), SAMPLES_PER_BATCH, replace=False)]
+                    if noval:
+                        hs = active_model.fit(
+                            x=sample,
+                            y=sample).history
+                        self.commit_weights(session, active_model, snapshot)
+                        loss = hs["loss"][-1]
+                        metrics.append((str(loss), "0"))
                     else:
-                        train_data = self.load_data(train_datasets, train_batch_size)
-                        val_data = self.load_data(val_datasets, val_batch_size)
-                        if train_data is False or val_data is False:
-                            return False
-
-                    patience = 0
-                    lastloss = float("inf")
-                    noval = len(val_data) == 0
-                    start = time.time()
-                    metrics = []
-                    for epi in range(train_ep):
-                        print(f"Epoch {epi} of {train_ep}.")
-                        sample = train_data[np.random.choice(len(train_data), SAMPLES_PER_BATCH, replace=False)]
-                        if noval:
-                            hs = active_model.fit(
-                                x=sample,
-                                y=sample).history
-                            loss = hs["loss"][-1]
-                            metrics.append((str(loss), "0"))
+                        val_sample = val_data[np.random.choice(len(val_data), SAMPLES_PER_BATCH, replace=False)]
+                        hs = active_model.fit(
+                            x=sample,
+                            y=sample).history
+                        self.commit_weights(session, active_model, snapshot)
+                        loss = hs["loss"][-1]
+                        val_loss = active_model.evaluate(
+                            x=val_sample,
+                            y=val_sample)[0]
+                        metrics.append((str(loss), str(val_loss)))
+                        if val_loss > lastloss:
+                            patience += 1
                         else:
-                            val_sample = val_data[np.random.choice(len(val_data), SAMPLES_PER_BATCH, replace=False)]
-                            hs = active_model.fit(
-                                x=sample,
-                                y=sample).history
-                            loss = hs["loss"][-1]
-                            val_loss = active_model.evaluate(
-                                x=val_sample,
-                                y=val_sample)[0]
-                            metrics.append((str(loss), str(val_loss)))
-                            if val_loss > lastloss:
-                                patience += 1
-                            else:
-                                patience = 0
-                            if patience == PATIENCE_MAX:
-                                break
-                            lastloss = val_loss
-                        now = time.time()
-                        if now - start > train_min*60:
+                            patience = 0
+                        if patience == PATIENCE_MAX:
                             break
-                    if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-                        os.chdir("models")
-                    return metrics
-                except ValueError as e:
-                    print("Encountered ValueError: ", e.args)
-                    return False
-                except IOError as e:
-                    print("Encountered IOError: ", e.args)
-                    return False
-                except Exception as e:
-                    print("Encountered Error: ", e.args)
-                    return False
+                        lastloss = val_loss
+                    now = time.time()
+                    if now - start > train_min*60:
+                        break
+                return metrics
+            except ValueError as e:
+                print("Encountered ValueError: ", e.args)
+                return False
+            except IOError as e:
+                print("Encountered IOError: ", e.args)
+                return False
+            except Exception as e:
+                print("Encountered Error: ", e.args)
+                return False
             finally:
-                self.server.sessions[session][2] = False
+                # the snapshot is dropped with the training, also when it failed,
+                # the predictor of the model shares its weights
+                if snapshot is not None:
+                    self.server.reservations.set_predictor(session, active_model, predictor)
+
+
+    def commit_weights(self, session, model, snapshot):
+        """Copies the weights of a model in training to its snapshot, used by the evaluations of the session.
+
+        Args:
+            session (int): The session training the model.
+            model (Model): The model in training.
+            snapshot (Predictor): The predictor of the snapshot.
+        """
+        weights = model.get_weights()
+        with self.server.reservations.committing(session, model) as current:
+            if current:
+                snapshot.model.set_weights(weights)
 
 
     def train(self, data, shape, fit):
@@ -621,11 +1472,8 @@ class AnomalyHandler(BaseHTTPRequestHandler):
                 epochs=fit.get("epochs") if fit.get("epochs") is not None else 1, 
                 shuffle=fit.get("shuffle") if fit.get("shuffle") is not None else True
             )
-            if os.path.split(os.getcwd())[1] == "Server" or os.path.split(os.getcwd())[1] == "anopcb-server":
-                os.chdir("models")
-            if os.path.split(os.getcwd())[1] == "datasets":
-                os.chdir("../models")
-            self.server.active_model.save(f"{self.server.active_model_name}.{SAVED_MODEL_FORMAT}", save_format='h5')
+            with self.server.storage.atomic_path(self.server.storage.model_path(self.server.active_model_name)) as temporary:
+                self.server.active_model.save(temporary, save_format='h5')
             for met in metrics.history:
                 vals = metrics.history[met]
                 for i in range(len(vals)):
@@ -643,18 +1491,97 @@ class AnomalyHandler(BaseHTTPRequestHandler):
 
 
     def send_bad_response(self):
-        """Sends a http 400 response.
+        """Sends a http 400 response, or 413 if the request exceeded the memory budget.
         """   
-        self.send_response(400)
+        self.send_response(413 if self.over_budget else 400)
         self.end_headers()
 
 
+    def read_spooled(self, length):
+        """Reads a large json body through a temporary file. Slices in its "data" are packed into an array
+         (count x slice bytes) while parsing, instead of being kept as strings.
+
+        Args:
+            length (int): length of the body
+
+        Returns:
+            dict: the payload
+
+        Raises:
+            ValueError: The body isn't valid json or exceeds the memory budget.
+        """
+        directory = self.server.storage.datasets_path
+        with Spooling.spool(self.rfile, length, directory) as spooled:
+            try:
+                return Spooling.parse(spooled, directory)
+            except ValueError:
+                # other payloads are parsed as a whole
+                if not self.admit(length * JSON_MEMORY_FACTOR):
+                    raise
+                spooled.seek(0)
+                return json.load(spooled)
+
+
+    def admit(self, amount):
+        """Reserves the estimated peak memory of the request for the rest of the request, if it's more than
+         reserved so far. Waits until it fits into the memory budget.
+
+        Args:
+            amount (int): the estimated peak memory in bytes
+
+        Returns:
+            bool: False if it exceeds the budget, then the request is answered with 413, else True.
+        """
+        if amount < ADMISSION_MIN_BYTES or amount <= self.reserved_memory:
+            return True
+        budget = self.server.memory_budget
+        # the previous reservation is released while waiting, so requests never wait for each other's memory
+        budget.release(self.reserved_memory)
+        self.reserved_memory = 0
+        if not budget.acquire(amount):
+            self.over_budget = True
+            return False
+        self.reserved_memory = amount
+        return True
+
+
+    def admit_batches(self, datasets, batch_size):
+        """Reserves the memory of batches loaded from datasets, one-hot and as floats.
+
+        Args:
+            datasets (list): List of dataset names
+            batch_size (int): slices of all batches, 0 for all slices of the datasets
+
+        Returns:
+            bool: False if it exceeds the memory budget, else True.
+        """
+        shape = self.dataset_shape(datasets)
+        if not shape:
+            return True
+        if batch_size <= 0:
+            batch_size = sum(self.server.storage.dataset_info(name)["count"] or 0 for name in datasets)
+        return self.admit(batch_size * shape[0] * shape[1] * NR_CHANNELS * 5)
+
+
+    def admit_merge(self, count, shape):
+        """Reserves the memory of merging slices into a dataset without duplicates: the concatenated slices,
+         their sorted copy, the unique slices and the indices sorting them.
+
+        Args:
+            count (int): amount of the merged slices
+            shape (tuple): shape[0] = x_dim, shape[1] = y_dim
+
+        Returns:
+            bool: False if it exceeds the memory budget, else True.
+        """
+        return self.admit(count * (3 * shape[0] * shape[1] + 16))
+
+
+    @job
     def do_GET(self):
         """Handles GET-requests.
         """
-        length = int(self.headers['Content-Length'])
-        payload_raw = self.rfile.read(length)
-        payload = json.loads(payload_raw)
+        payload = self.payload
         if payload.get("type") is None:
             self.send_bad_response()
         elif payload["type"] == 1:
@@ -682,6 +1609,45 @@ class AnomalyHandler(BaseHTTPRequestHandler):
         elif payload["type"] == 6:
             self.send_response(204)
             self.end_headers()
+        elif payload["type"] == 16:
+            resp = {"data" : self.server.get_status()}
+            resp = json.dumps(resp).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "json")
+            self.send_header("Content-Length", str(len(resp)))
+            self.end_headers()
+            self.wfile.write(resp)
+        elif payload["type"] == 15:
+            if payload.get("handle") is not None and payload.get("token") is not None and self.check_transfer(payload["handle"], payload["token"]):
+                self.send_response(204)
+                self.end_headers()
+            else:
+                self.send_bad_response()
+        elif payload["type"] == 17:
+            resp = {"data" : self.server.storage.datasets_info()}
+            resp = json.dumps(resp).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "json")
+            self.send_header("Content-Length", str(len(resp)))
+            self.end_headers()
+            self.wfile.write(resp)
+        elif payload["type"] == 20:
+            state = None
+            if payload.get("upload") is not None:
+                try:
+                    state = self.server.storage.upload_state(payload["upload"])
+                except ValueError:
+                    pass
+            if state is not None:
+                resp = {"data" : {"chunk" : state["chunk"], "received" : state["received"]}}
+                resp = json.dumps(resp).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "json")
+                self.send_header("Content-Length", str(len(resp)))
+                self.end_headers()
+                self.wfile.write(resp)
+            else:
+                self.send_bad_response()
         elif payload["type"] == 10:
             datasets = self.get_data()
             resp = {"data" : datasets}
@@ -695,12 +1661,11 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             self.send_bad_response()
 
 
+    @job
     def do_POST(self):
         """Handles POST-requests.
         """
-        length = int(self.headers['Content-Length'])
-        payload_raw = self.rfile.read(length)
-        payload = json.loads(payload_raw)
+        payload = self.payload
         if payload.get("type") is None:
             self.send_bad_response()
         elif payload["type"] == 2:
@@ -723,13 +1688,37 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             else:
                 self.send_bad_response()
         elif payload["type"] == 3:
-            if payload.get("data") is not None and payload.get("shape") is not None and payload.get("session") is not None:
+            if payload.get("handle") is not None and payload.get("count") is not None and payload.get("shape") is not None and payload.get("session") is not None:
+                # slices and results are exchanged through the transfer directory
+                try:
+                    data = self.read_transfer(payload["handle"], payload["count"], payload["shape"])
+                    resp = self.evaluate(data, payload["shape"], payload["session"], json_results=False)
+                    if resp != False:
+                        result_handle = payload["handle"] + ".res"
+                        self.write_transfer(result_handle, [resp[1], resp[2]])
+                        resp = {"data" : {"handle" : result_handle, "latent" : int(resp[2].shape[1])}}
+                except (IOError, ValueError) as e:
+                    print("Encountered Error: ", e.args)
+                    resp = False
+                if resp != False:
+                    resp = json.dumps(resp).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "json")
+                    self.send_header("Content-Length", str(len(resp)))
+                    self.end_headers()
+                    self.wfile.write(resp)
+                else:
+                    self.send_bad_response()
+            elif payload.get("data") is not None and payload.get("shape") is not None and payload.get("session") is not None:
                 data = payload["data"]
                 shape = payload["shape"]
                 session = payload["session"]
-                resp = self.evaluate(data, shape, session)
-                if resp != False:
-                    resp = {"data" : resp}
+                npz = payload.get("results") == "npz"
+                resp = self.evaluate(data, shape, session, json_results=not npz)
+                if resp != False and npz:
+                    self.send_arrays(self.result_arrays(resp))
+                elif resp != False:
+                    resp = {"data" : self.jsonable(resp)}
                     resp = json.dumps(resp).encode()
                     self.send_response(200)
                     self.send_header("Content-Type", "json")
@@ -756,7 +1745,16 @@ class AnomalyHandler(BaseHTTPRequestHandler):
                 datasets = payload["datasets"]
                 batch_size = payload["batch_size"]
                 session = payload["session"]
-                resp = self.test(datasets, batch_size, session)
+                if payload.get("stream"):
+                    percentiles = payload.get("percentiles", DEFAULT_PERCENTILES)
+                    if not isinstance(percentiles, (list, tuple)) or not all(
+                            isinstance(q, (int, float)) and not isinstance(q, bool) and 0 <= q <= 100 for q in percentiles):
+                        print(f"Invalid percentiles {percentiles}!")
+                        resp = False
+                    else:
+                        resp = self.test_stream(datasets, batch_size if batch_size > 0 else STREAM_BATCH_SIZE, percentiles, session)
+                else:
+                    resp = self.test(datasets, batch_size, session)
                 if resp != False:
                     resp = {"data" : resp}
                     resp = json.dumps(resp).encode()
@@ -769,6 +1767,32 @@ class AnomalyHandler(BaseHTTPRequestHandler):
                     self.send_bad_response()
             else:
                 self.send_bad_response()
+        elif payload["type"] == 14:
+            if payload.get("geometry") is not None and payload.get("mode") is not None:
+                geometry = payload["geometry"]
+                mode = payload["mode"]
+                session = payload.get("session")
+                name = payload.get("board")
+                augment = payload.get("aug") is True
+                npz = payload.get("results") == "npz"
+                resp = self.slice_geometry(geometry, mode, session, name, augment, json_results=not npz)
+                if resp is True:
+                    self.send_response(204)
+                    self.end_headers()
+                elif resp != False and npz:
+                    self.send_arrays(self.result_arrays(resp))
+                elif resp != False:
+                    resp = {"data" : self.jsonable(resp)}
+                    resp = json.dumps(resp).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "json")
+                    self.send_header("Content-Length", str(len(resp)))
+                    self.end_headers()
+                    self.wfile.write(resp)
+                else:
+                    self.send_bad_response()
+            else:
+                self.send_bad_response()
         elif payload["type"] == 12:
             resp = self.get_session()
             if resp != False:
@@ -785,12 +1809,11 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             self.send_bad_response()
 
 
+    @job
     def do_PUT(self):
         """Handles PUT-requests.
         """
-        length = int(self.headers['Content-Length'])
-        payload_raw = self.rfile.read(length)
-        payload = json.loads(payload_raw)
+        payload = self.payload
         if payload.get("type") is None:
             self.send_bad_response()
         elif payload["type"] == 0:
@@ -818,6 +1841,22 @@ class AnomalyHandler(BaseHTTPRequestHandler):
                     self.end_headers()
             else:
                 self.send_bad_response()
+        elif payload["type"] == 8 and payload.get("handle") is not None:
+            if payload.get("count") is not None and payload.get("board") is not None and payload.get("x_dim") is not None and payload.get("y_dim") is not None and payload.get("aug") is not None:
+                try:
+                    data = self.read_transfer(payload["handle"], payload["count"], (payload["x_dim"], payload["y_dim"]))
+                    success = self.save_data(data, payload["board"], str(payload["count"]), str(payload["x_dim"]), str(payload["y_dim"]), payload["aug"])
+                except (IOError, ValueError) as e:
+                    print("Encountered Error: ", e.args)
+                    success = False
+                if success:
+                    self.send_response(204)
+                    self.end_headers()
+                else:
+                    self.send_response(500)
+                    self.end_headers()
+            else:
+                self.send_bad_response()
         elif payload["type"] == 8:
             if payload.get("data") is not None and payload.get("board") is not None and payload.get("count") is not None and payload.get("x_dim") is not None and payload.get("y_dim") is not None and payload.get("aug") is not None:
                 data = payload["data"]
@@ -834,6 +1873,63 @@ class AnomalyHandler(BaseHTTPRequestHandler):
                     self.end_headers()
             else:
                 self.send_bad_response()
+        elif payload["type"] == 18:
+            if payload.get("board") is not None and payload.get("count") is not None and payload.get("x_dim") is not None and payload.get("y_dim") is not None and payload.get("aug") is not None and payload.get("chunk") is not None:
+                upload = self.begin_upload(payload["board"], payload["count"], payload["x_dim"], payload["y_dim"], payload["aug"], payload["chunk"], payload.get("append"))
+                if upload:
+                    resp = {"data" : upload}
+                    resp = json.dumps(resp).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "json")
+                    self.send_header("Content-Length", str(len(resp)))
+                    self.end_headers()
+                    self.wfile.write(resp)
+                else:
+                    self.send_response(500)
+                    self.end_headers()
+            else:
+                self.send_bad_response()
+        elif payload["type"] == 19:
+            if payload.get("upload") is not None and payload.get("sequence") is not None:
+                if self.append_upload(payload["upload"], payload["sequence"]):
+                    self.send_response(204)
+                    self.end_headers()
+                else:
+                    self.send_bad_response()
+            else:
+                self.send_bad_response()
+        elif payload["type"] == 21:
+            if payload.get("upload") is not None:
+                dataset = self.commit_upload(payload["upload"])
+                if dataset:
+                    resp = {"data" : dataset}
+                    resp = json.dumps(resp).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "json")
+                    self.send_header("Content-Length", str(len(resp)))
+                    self.end_headers()
+                    self.wfile.write(resp)
+                else:
+                    self.send_response(500)
+                    self.end_headers()
+            else:
+                self.send_bad_response()
+        elif payload["type"] == 22:
+            if payload.get("datasets") is not None and payload.get("board") is not None and payload.get("remove") is not None:
+                dataset = self.merge_data(payload["datasets"], payload["board"], payload["remove"])
+                if dataset:
+                    resp = {"data" : dataset}
+                    resp = json.dumps(resp).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "json")
+                    self.send_header("Content-Length", str(len(resp)))
+                    self.end_headers()
+                    self.wfile.write(resp)
+                else:
+                    self.send_response(500)
+                    self.end_headers()
+            else:
+                self.send_bad_response()
         elif payload["type"] == 9:
             if payload.get("board") is not None:
                 name = payload["board"]
@@ -860,9 +1956,238 @@ class AnomalyHandler(BaseHTTPRequestHandler):
             self.send_bad_response()
 
 
-class BaseServer(HTTPServer):
-    """Subclass of HTTPServer modified to provide a ML-Model to be accesed by the http-Handler.
+class ServerState:
+    """The sessions and reserved models shared by all requests of a server.
+    """
+    def init_state(self):
+        """Initializes the sessions and starts the thread removing dead sessions."""
+        self.reservations = Reservations.ReservationManager()
+        # models and datasets below the directory the server was started in
+        self.storage = Storage.Storage(os.getcwd(), SAVED_MODEL_FORMAT)
+        cache_mb = int(os.environ.get("ANOPCB_DATASET_CACHE", DATASET_CACHE_MB))
+        self.dataset_cache = Storage.DatasetCache(cache_mb * 2**20)
+        # reduced precision models used by "evaluate", ${ANOPCB_INFERENCE} is "float16" or "int8"
+        inference = os.environ.get("ANOPCB_INFERENCE", "")
+        self.lite_models = LiteModels.LiteModels(self.storage, inference, self.sample_slices) if inference else None
+        # workers reading and copying datasets in parallel, unlike the executors of concurrent.futures
+        # they keep accepting work after the main thread returned from starting the server
+        self.load_pool = ThreadPool(os.cpu_count() or 1)
+        # served models are compiled on first use by training or testing
+        self.compile_lock = Lock()
+        # processes evaluating for the server, ${ANOPCB_INFERENCE_WORKERS} is the amount,
+        # daemonic processes can't start processes
+        workers = int(os.environ.get("ANOPCB_INFERENCE_WORKERS", 0))
+        self.inference_workers = None
+        if workers > 0 and not multiprocessing.current_process().daemon:
+            self.inference_workers = InferenceWorkers.InferenceWorkers(workers, load_predictor)
+        memory_mb = int(os.environ.get("ANOPCB_MEMORY_BUDGET", MEMORY_BUDGET_MB))
+        self.memory_budget = Scheduler.MemoryBudget(memory_mb * 2**20)
+        # the sessions take turns evaluating, as many at once as there are workers, else as there are cpus,
+        # evaluations in the server share the thread pools of tensorflow
+        slots = workers if self.inference_workers is not None else os.cpu_count() or 1
+        self.scheduler = Scheduler.FairScheduler(slots)
+        # datasets decoded before the first training, "*" for all
+        preload = os.environ.get("ANOPCB_PRELOAD_DATASETS", "")
+        if preload:
+            loader = Thread(target=self.preload_datasets, args=(preload.split(","),))
+            loader.daemon = True
+            loader.start()
+
+        # directory shared with plugins on the same host to exchange slices without http, by default
+        # the one of the plugin, independent of the working directory
+        project_path = user_project_path()
+        default_transfer = os.path.join(project_path, 'anopcb-server', 'transfer') if project_path else os.path.abspath("transfer")
+        self.transfer_path = os.environ.get("ANOPCB_TRANSFER_PATH", default_transfer)
+        os.makedirs(self.transfer_path, exist_ok=True)
+
+        self.status_lock = Lock()
+        self.job_counter = 0
+        # job number -> (request type, start time) of the running jobs
+        self.running_jobs = dict()
+        # request type -> average duration in seconds
+        self.job_durations = dict()
+        # transfer file -> amount of running jobs reading it
+        self.transfer_readers = dict()
+
+        timer = Thread(target=self.scheduled_dead_session_check)
+        timer.setDaemon(True)
+        timer.start()
+
+        # initialize the tensorflow runtime, before the server reports to be ready
+        tf.constant(0).numpy()
+        self.ready = True
+
+    def read_dataset(self, name, shape):
+        """Reads the slices of a dataset, stored as array or as json list. Datasets fitting into the
+         dataset cache are kept in memory, larger arrays are mapped and only read from disk when accessed.
+
+        Args:
+            name (str): name of the dataset
+            shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
+
+        Returns:
+            array: the slices (count x shape[0] x shape[1])
+        """
+        path = self.storage.dataset_path(name)
+        version = self.storage.file_version(path)
+        restored = self.dataset_cache.get(name, version)
+        if restored is not None:
+            return restored
+        if path.endswith(".npy"):
+            restored = np.load(path, mmap_mode="r")
+            if not self.dataset_cache.fits(restored.nbytes):
+                return restored
+            restored = np.array(restored)
+        else:
+            with open(path, "r") as f:
+                slices = json.load(f)
+            restored = np.frombuffer("".join(slices).encode(), np.uint8).reshape((len(slices), shape[0], shape[1]))
+        self.dataset_cache.put(name, version, restored)
+        return restored
+
+    def sample_slices(self, shape):
+        """Gets random slices from the datasets with slices of the shape, used to check converted models.
+
+        Args:
+            shape (tuple): shape[0] = x-size, shape[1] = y-size of slice
+
+        Returns:
+            array: one-hot representation of the slices, None if there are no datasets of the shape
+        """
+        names = [info["name"] for info in self.storage.datasets_info() if (info["x_dim"], info["y_dim"]) == tuple(shape)]
+        if not names:
+            return None
+        parts = []
+        for name in names:
+            array = self.read_dataset(name, shape)
+            rows = np.random.choice(len(array), min(len(array), LiteModels.CHECK_SLICES // len(names) + 1), replace=False)
+            parts.append(array[np.sort(rows)])
+        restored = np.concatenate(parts)[:LiteModels.CHECK_SLICES]
+        return reshape_array(np.ascontiguousarray(restored), (shape[0], shape[1], NR_CHANNELS), shape)
+
+    def preload_datasets(self, names):
+        """Reads datasets into the dataset cache.
+
+        Args:
+            names (list): names of the datasets, "*" for all datasets
+        """
+        if "*" in names:
+            names = self.storage.datasets()
+        for name in names:
+            try:
+                info = self.storage.dataset_info(name)
+                if info is not None and info["x_dim"] is not None:
+                    self.read_dataset(name, (info["x_dim"], info["y_dim"]))
+            except (IOError, ValueError) as e:
+                print("Encountered Error: ", e.args)
+        print(f"Preloaded {len(self.dataset_cache.entries)} datasets.")
+
+    @contextmanager
+    def run_job(self, request_type):
+        """Keeps track of a running job for the status while the context is active.
+
+        Args:
+            request_type (int): The type of the request handled by the job.
+        """
+        with self.status_lock:
+            job_number = self.job_counter
+            self.job_counter += 1
+            self.running_jobs[job_number] = (request_type, time.time())
+        try:
+            yield
+        finally:
+            with self.status_lock:
+                started = self.running_jobs.pop(job_number)[1]
+                duration = time.time() - started
+                average = self.job_durations.get(request_type, duration)
+                self.job_durations[request_type] = 0.7 * average + 0.3 * duration
+
+    def claim_transfer(self, handle):
+        """Keeps a transfer file read by a running job from being removed as left behind.
+
+        Args:
+            handle (str): name of the file
+        """
+        with self.status_lock:
+            self.transfer_readers[handle] = self.transfer_readers.get(handle, 0) + 1
+
+    def release_transfers(self, handles):
+        """Removes the transfer files read by a job once it's done, unless other jobs still read them.
+         The plugin writes a new file for each request.
+
+        Args:
+            handles (list): names of the files
+        """
+        for handle in handles:
+            with self.status_lock:
+                self.transfer_readers[handle] -= 1
+                if self.transfer_readers[handle]:
+                    continue
+                self.transfer_readers.pop(handle)
+            try:
+                os.remove(os.path.join(self.transfer_path, handle))
+            except OSError:
+                pass
+
+    def get_status(self):
+        """Gets the readiness and the load of the server.
+
+        Returns:
+            dict: "ready": tensorflow is loaded and requests are accepted,
+                "queued": amount of jobs waiting for a model in use to be trained,
+                "running": types of the running jobs,
+                "running_for": seconds the longest running job is running,
+                "estimated_wait": seconds until the running jobs are done,
+                "sessions": amount of sessions, "models": amount of reserved models,
+                "schedule": session -> "queued" chunks of evaluations and "served" slices,
+                "memory": "budget" and "reserved" bytes of the requests and "waiting" requests.
+        """
+        with self.status_lock:
+            now = time.time()
+            running = []
+            running_for = 0
+            estimated_wait = 0
+            for request_type, started in self.running_jobs.values():
+                running.append(request_type)
+                running_for = max(running_for, now - started)
+                remaining = self.job_durations.get(request_type, DEFAULT_JOB_DURATION) - (now - started)
+                estimated_wait = max(estimated_wait, remaining)
+        session_count, model_count, queued = self.reservations.counts()
+        return {
+            "ready" : self.ready,
+            "queued" : queued,
+            "running" : running,
+            "running_for" : round(running_for, 1),
+            "estimated_wait" : round(estimated_wait, 1),
+            "sessions" : session_count,
+            "models" : model_count,
+            "schedule" : {str(session) : queue for session, queue in self.scheduler.queues().items()},
+            "memory" : self.memory_budget.usage()
+        }
+
+    def scheduled_dead_session_check(self):
+        while True:
+            self.reservations.remove_dead_sessions(30*60)
+            self.scheduler.retain(self.reservations.session_ids())
+            self.storage.remove_stale_uploads(UPLOAD_MAX_AGE)
+            # remove transfer files left behind by plugins that crashed, the ones of jobs are removed by "release_transfers"
+            with self.status_lock:
+                reading = set(self.transfer_readers)
+            for entry in os.scandir(self.transfer_path):
+                try:
+                    if entry.name not in reading and entry.stat().st_mtime + TRANSFER_MAX_AGE < time.time():
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+            time.sleep(60)
+
+
+class BaseServer(ServerState, ThreadingHTTPServer):
+    """Subclass of ThreadingHTTPServer modified to provide a ML-Model to be accesed by the http-Handler.
+     Requests are handled concurrently, the ReservationManager locks the models.
     """
+    daemon_threads = True
+
     def __init__(self, adress, handler):
         """Initializes the BaseServer.
 
@@ -871,27 +2196,54 @@ class BaseServer(HTTPServer):
             handler (BaseHTTPRequestHandler): The handler of the server.
         """
         super().__init__(adress, handler)
+        self.init_state()
 
-        # session -> ((model_name, active_model), timeout_timestamp, train_lock)
-        self.sessions = dict()
-        self.session_lock = Lock()
-        self.session_counter = random.randint(2, 10000)
 
-        timer = Thread(target=self.scheduled_dead_session_check)
-        timer.setDaemon(True)
-        timer.start()
-    
-    def scheduled_dead_session_check(self):
-        while True:
-            with self.session_lock:
-                tmp = []
-                cur_time = int(time.time())
-                for x in self.sessions.keys():
-                    if self.sessions[x][1] + 30*60 < cur_time:
-                        tmp.append(x)
-                for x in tmp:
-                    self.sessions.pop(x)
-            time.sleep(60)
+class LocalServer(ServerState):
+    """Server without a socket, its requests are received over a pipe from the plugin.
+    """
+    def __init__(self):
+        """Initializes the LocalServer."""
+        self.init_state()
+
+
+class PipeHandler(AnomalyHandler):
+    """Handles a single request received over a pipe instead of http.
+     Reuses the request handling of the AnomalyHandler, the response is collected in memory.
+    """
+    def __init__(self, server, method, body, headers=None):
+        """Initializes the PipeHandler.
+
+        Args:
+            server (LocalServer): The server holding the sessions.
+            method (string): The http method of the request (GET, POST or PUT).
+            body (bytes): The json payload or the binary body of the request.
+            headers (dict, optional): Further headers of the request, like "Content-Type". Defaults to None.
+        """
+        self.server = server
+        self.command = method
+        self.headers = dict(headers or {}, **{"Content-Length": str(len(body))})
+        self.rfile = io.BytesIO(body)
+        self.wfile = io.BytesIO()
+        self.status = None
+
+    def send_response(self, code, message=None):
+        self.status = code
+
+    def send_header(self, keyword, value):
+        pass
+
+    def end_headers(self):
+        pass
+
+    def handle_request(self):
+        """Handles the request.
+
+        Returns:
+            Tuple: The status code and the body of the response.
+        """
+        getattr(self, f"do_{self.command}")()
+        return self.status, self.wfile.getvalue()
 
 
 class MainServer:
@@ -920,40 +2272,100 @@ class MainServer:
         self._server.shutdown()
         self._thread = None
 
+def user_project_path():
+    """Gets the directory in the users home containing the servers data directory,
+     the plugin keeps its transfer directory there as well.
+
+    Returns:
+        str: path of the directory, None if the OS is not supported.
+    """
+    if os.name == 'nt':
+        # windows
+        project_path = r'%APPDATA%\.anopcb'
+        return os.path.expandvars(project_path)
+    elif os.name == 'posix':
+        # linux
+        project_path = '~/.anopcb/'
+        return os.path.expanduser(project_path)
+    return None
+
+def prepare_project_path():
+    """Changes into the servers data directory in the users home,
+     on first use it is created and filled with the bundled models and datasets.
+
+    Returns:
+        bool: False if the OS is not supported, else True.
+    """
+    project_path = user_project_path()
+    if project_path is None:
+        print("Not compatible OS detected. Please use windows or linux.")
+        return False
+    project_path_2 = os.path.join(project_path, 'anopcb-server')
+    try:
+        os.mkdir(project_path)
+        # if this passes, no data was put in place yet
+        os.mkdir(project_path_2)
+        datasets_path = os.path.join(project_path_2, 'datasets')
+        os.mkdir(datasets_path)
+        models_path = os.path.join(project_path_2, 'models')
+        os.mkdir(models_path)
+        package_path = os.path.split(__file__)[0]
+        for filename in os.scandir(os.path.join(package_path, 'datasets')):
+            shutil.copy2(filename.path, datasets_path)
+        for filename in os.scandir(os.path.join(package_path, 'models')):
+            shutil.copy2(filename.path, models_path)
+    except Exception:
+        pass
+    os.chdir(project_path_2)
+    return True
+
 def main(port, ip_override=IP, save_local=False):
-    if not save_local:
-        if os.name == 'nt':
-            # windows
-            project_path = r'%APPDATA%\.anopcb'
-            project_path = os.path.expandvars(project_path)
-        elif os.name == 'posix':
-            # linux
-            project_path = '~/.anopcb/'
-            project_path = os.path.expanduser(project_path)
-        else:
-            print("Not compatible OS detected. Please use windows or linux.")
-            return
-        project_path_2 = os.path.join(project_path, 'anopcb-server')
-        try:
-            os.mkdir(project_path)
-            # if this passes, no data was put in place yet
-            os.mkdir(project_path_2)
-            datasets_path = os.path.join(project_path_2, 'datasets')
-            os.mkdir(datasets_path)
-            models_path = os.path.join(project_path_2, 'models')
-            os.mkdir(models_path)
-            package_path = os.path.split(__file__)[0]
-            for filename in os.scandir(os.path.join(package_path, 'datasets')):
-                shutil.copy2(filename.path, datasets_path)
-            for filename in os.scandir(os.path.join(package_path, 'models')):
-                shutil.copy2(filename.path, models_path)
-        except Exception:
-            pass
-        os.chdir(project_path_2)
+    if not save_local and not prepare_project_path():
+        return
     main_server = MainServer(port, ip_override)
     main_server.start()
     print(f"Server serving at ({ip_override}, {port}{' local' if save_local else ''}).")
 
+def serve_pipe(conn):
+    """Serves the requests received over a pipe until it is closed.
+     Used by the local engine of the plugin, which runs the server in a child process.
+     Each request is a tuple (request id, http method, body as bytes, headers),
+     answered with a tuple (request id, status code, body). Like the http server the requests
+     are handled concurrently, each in its own thread. Once ready to serve (None, 204, b"") is sent.
+
+    Args:
+        conn (multiprocessing.connection.Connection): The pipe to the plugin.
+    """
+    if not prepare_project_path():
+        return
+    server = LocalServer()
+    send_lock = Lock()
+
+    def handle(request_id, method, body, headers):
+        try:
+            status, data = PipeHandler(server, method, body, headers).handle_request()
+        except Exception as e:
+            print("Encountered Error: ", e.args)
+            status, data = 400, b""
+        try:
+            with send_lock:
+                conn.send((request_id, status, data))
+        except OSError:
+            pass
+
+    conn.send((None, 204, b""))
+    print("Server serving over pipe.")
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        handler = Thread(target=handle, args=request)
+        handler.daemon = True
+        handler.start()
+
 def main2():
     arguments = argv.copy()
     try:
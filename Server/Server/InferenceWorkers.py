@@ -0,0 +1,197 @@
+"""Worker processes evaluating slices for the http server, so the inference of one request doesn't compete
+ with the request handling of others for the interpreter lock. Used by "evaluate" if enabled with
+ ${ANOPCB_INFERENCE_WORKERS} (amount of workers)."""
+import multiprocessing
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty, Queue
+from threading import Lock, Thread
+
+# seconds a request waits for an idle worker before it is evaluated without the workers
+IDLE_TIMEOUT = 10
+
+
+class Worker:
+    """A worker process, its pipe and the shared memory exchanging slices and results with it.
+     The shared memory is owned by the server and grown when needed.
+    """
+    def __init__(self, context, load):
+        """Initializes the Worker and starts its process.
+
+        Args:
+            context (multiprocessing.context.BaseContext): the context starting the process
+            load (function): loads a model in the worker, see "InferenceWorkers"
+        """
+        self.lock = Lock()
+        self.memory = None
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=serve_worker, args=(child_conn, load), daemon=True)
+        self.process.start()
+
+    def request(self, message):
+        """Sends a request to the worker and waits for the answer, the lock must be held.
+
+        Args:
+            message (Tuple): the request
+
+        Returns:
+            Tuple: the answer
+        """
+        self.conn.send(message)
+        answer = self.conn.recv()
+        if answer[0] == "error":
+            raise RuntimeError(*answer[1])
+        return answer
+
+    def reserve_memory(self, size):
+        """Gets shared memory of at least size bytes, the lock must be held.
+
+        Args:
+            size (int): bytes needed
+
+        Returns:
+            SharedMemory: the shared memory
+        """
+        if self.memory is None or self.memory.size < size:
+            if self.memory is not None:
+                self.memory.close()
+                self.memory.unlink()
+            self.memory = SharedMemory(create=True, size=max(size, 2 * (self.memory.size if self.memory else 0)))
+        return self.memory
+
+
+class InferenceWorkers:
+    """A pool of worker processes, started with the server. Each worker keeps the models it used loaded and
+     warmed up. A request is sent to an idle worker, slices and results are exchanged over shared memory.
+    """
+    def __init__(self, count, load):
+        """Initializes the InferenceWorkers and starts the workers.
+
+        Args:
+            count (int): amount of workers
+            load (function): loads a model in a worker, called with the path of the model file,
+             returns a function predicting the outputs of the model for slices (count x x_dim x y_dim, uint8).
+             Must be importable by the workers.
+        """
+        # spawn, tensorflow isn't safe to fork once it is initialized
+        context = multiprocessing.get_context("spawn")
+        self.workers = [Worker(context, load) for _ in range(count)]
+        self.ready = []
+        self.idle = Queue()
+        for worker in self.workers:
+            waiter = Thread(target=self.wait_ready, args=(worker,))
+            waiter.daemon = True
+            waiter.start()
+
+    def wait_ready(self, worker):
+        """Waits until a worker imported tensorflow, then offers it to requests.
+
+        Args:
+            worker (Worker): the worker
+        """
+        try:
+            worker.conn.recv()
+        except EOFError:
+            return
+        self.ready.append(worker)
+        self.idle.put(worker)
+
+    def load(self, path, version):
+        """Loads and warms up a model in all ready workers, in the background.
+
+        Args:
+            path (str): path of the model file
+            version (Tuple): version of the model file
+        """
+        def load_all():
+            for worker in list(self.ready):
+                with worker.lock:
+                    try:
+                        worker.request(("load", path, version))
+                    except (EOFError, OSError, RuntimeError) as e:
+                        print("Encountered Error: ", e.args)
+        loader = Thread(target=load_all)
+        loader.daemon = True
+        loader.start()
+
+    def evaluate(self, path, version, slices, output_shapes, outputs):
+        """Predicts outputs of a model in an idle worker, waits up to IDLE_TIMEOUT seconds while all workers are busy.
+
+        Args:
+            path (str): path of the model file
+            version (Tuple): version of the model file
+            slices (array): the slices (count x x_dim x y_dim, uint8)
+            output_shapes (list): shapes of the outputs of the model without the batch dimension
+            outputs (list): indices of the outputs needed, only these are copied back
+
+        Returns:
+            list: the needed outputs, None if no worker is ready or idle in time or the worker failed
+        """
+        if not self.ready:
+            return None
+        slices = np.ascontiguousarray(slices, np.uint8)
+        shapes = [(len(slices),) + tuple(output_shapes[index]) for index in outputs]
+        offsets = np.cumsum([slices.nbytes] + [int(np.prod(shape)) * 4 for shape in shapes])
+        try:
+            worker = self.idle.get(timeout=IDLE_TIMEOUT)
+        except Empty:
+            # workers dying while they evaluate are removed, idle ones only once they are used
+            for worker in list(self.ready):
+                if not worker.process.is_alive():
+                    self.ready.remove(worker)
+            return None
+        try:
+            with worker.lock:
+                memory = worker.reserve_memory(int(offsets[-1]))
+                np.ndarray(slices.shape, np.uint8, memory.buf)[...] = slices
+                worker.request(("evaluate", path, version, memory.name, slices.shape, list(outputs), shapes,
+                    offsets[:-1].tolist()))
+                return [np.ndarray(shape, np.float32, memory.buf, offset).copy() for shape, offset in zip(shapes, offsets)]
+        except (EOFError, OSError, RuntimeError, ValueError) as e:
+            print("Encountered Error: ", e.args)
+            return None
+        finally:
+            if worker.process.is_alive():
+                self.idle.put(worker)
+            elif worker in self.ready:
+                self.ready.remove(worker)
+
+
+def serve_worker(conn, load):
+    """Serves the requests of the server in a worker process until the pipe is closed.
+     Requests are ("load", path, version) and ("evaluate", path, version, memory name, shape of the slices,
+     indices of the needed outputs, shapes of the needed outputs, offsets of the needed outputs). Answered with ("ok",) or ("error", arguments).
+     Once ready ("ok",) is sent.
+
+    Args:
+        conn (multiprocessing.connection.Connection): the pipe to the server
+        load (function): loads a model, see "InferenceWorkers"
+    """
+    # path -> (version, predict function)
+    models = dict()
+    memory = None
+    conn.send(("ok",))
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        try:
+            path, version = request[1], request[2]
+            entry = models.get(path)
+            if entry is None or entry[0] != version:
+                entry = (version, load(path))
+                models[path] = entry
+            if request[0] == "evaluate":
+                name, shape, indices, shapes, offsets = request[3:]
+                if memory is None or memory.name != name:
+                    if memory is not None:
+                        memory.close()
+                    # the memory is owned and removed by the server
+                    memory = SharedMemory(name=name)
+                outputs = entry[1](np.ndarray(shape, np.uint8, memory.buf))
+                for index, output_shape, offset in zip(indices, shapes, offsets):
+                    np.ndarray(output_shape, np.float32, memory.buf, offset)[...] = outputs[index]
+            conn.send(("ok",))
+        except Exception as e:
+            conn.send(("error", e.args))
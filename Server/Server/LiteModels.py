@@ -0,0 +1,208 @@
+"""Reduced precision versions of the models for inference on the CPU, converted to TFLite.
+ Used by "evaluate" if enabled with ${ANOPCB_INFERENCE} ("float16" or "int8")."""
+import os
+import glob
+import numpy as np
+import tensorflow as tf
+from threading import Lock, Thread
+try:
+    # the interpreter moved out of tensorflow
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    Interpreter = tf.lite.Interpreter
+
+MODES = ("float16", "int8")
+# slices compared between the converted and the float model
+CHECK_SLICES = 512
+# slices used to calibrate the value ranges of int8 models
+CALIBRATION_SLICES = 200
+# largest accepted mean deviation of the error output, relative to the mean error of the float model
+ACCURACY_TOLERANCE = 0.02
+
+
+class LiteModel:
+    """A model converted to TFLite, offering "predict" like a keras model. Interpreters aren't thread-safe,
+     each running prediction takes one from a pool of idle interpreters.
+    """
+    def __init__(self, content, output_names):
+        """Initializes the LiteModel.
+
+        Args:
+            content (bytes): the converted model
+            output_names (list): names of the outputs of the keras model, in their order
+
+        Raises:
+            ValueError: An output of the keras model is missing in the signature of the converted model.
+        """
+        self.content = content
+        self.lock = Lock()
+        # interpreters not in use
+        self.idle = []
+        # the converter doesn't keep the order of the outputs, its signature names them like the keras outputs
+        details = Interpreter(model_content=content).get_signature_runner().get_output_details()
+        missing = [name for name in output_names if name not in details]
+        if missing:
+            raise ValueError(f"Outputs {missing} missing in the converted model!")
+        self.output_indices = [details[name]["index"] for name in output_names]
+
+    def predict(self, inp):
+        """Predicts the outputs of the model.
+
+        Args:
+            inp (array): input of the model
+
+        Returns:
+            list: the outputs, in the order of the keras model
+        """
+        inp = np.asarray(inp, np.float32)
+        with self.lock:
+            interpreter = self.idle.pop() if self.idle else None
+        if interpreter is None:
+            interpreter = Interpreter(model_content=self.content, num_threads=os.cpu_count())
+            interpreter.allocate_tensors()
+        try:
+            input_index = interpreter.get_input_details()[0]["index"]
+            if tuple(interpreter.get_input_details()[0]["shape"]) != inp.shape:
+                interpreter.resize_tensor_input(input_index, inp.shape)
+                interpreter.allocate_tensors()
+            interpreter.set_tensor(input_index, inp)
+            interpreter.invoke()
+            return [interpreter.get_tensor(index) for index in self.output_indices]
+        finally:
+            with self.lock:
+                self.idle.append(interpreter)
+
+
+class LiteModels:
+    """Converts the models on first use, keeps the converted models in memory and
+     next to the models as ".name.<mode>.<version>.tflite". A converted model is only used
+     if its error output matches the float model, else the float model is used.
+    """
+    def __init__(self, storage, mode, sample):
+        """Initializes the LiteModels.
+
+        Args:
+            storage (Storage): the storage of the models
+            mode (str): "float16" or "int8"
+            sample (function): gets slices for the accuracy check, called with the shape (x_dim, y_dim),
+             returns the input of the model or None if there are no slices of the shape
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown inference mode {mode!r}")
+        self.storage = storage
+        self.mode = mode
+        self.sample = sample
+        self.lock = Lock()
+        # model name -> (version of the model file, LiteModel or None if the conversion was rejected)
+        self.models = dict()
+        self.converting = set()
+
+    def get(self, name):
+        """Gets the converted model. If it isn't converted yet, the conversion is started in the background.
+
+        Args:
+            name (str): name of the model
+
+        Returns:
+            LiteModel: the converted model, None while converting or if it was rejected
+        """
+        try:
+            version = self.storage.file_version(self.storage.model_path(name))
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            entry = self.models.get(name)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            if name in self.converting:
+                return None
+            self.converting.add(name)
+        converter = Thread(target=self.convert, args=(name, version))
+        converter.daemon = True
+        converter.start()
+        return None
+
+    def cache_path(self, name, version):
+        """Gets the path of a converted model.
+
+        Args:
+            name (str): name of the model
+            version (Tuple): version of the model file
+
+        Returns:
+            str: the path
+        """
+        return os.path.join(self.storage.models_path, f".{name}.{self.mode}.{version[0]}-{version[1]}.tflite")
+
+    def convert(self, name, version):
+        """Converts a model and checks its accuracy, or loads it from the disk if it was converted before.
+
+        Args:
+            name (str): name of the model
+            version (Tuple): version of the model file
+        """
+        lite_model = None
+        try:
+            path = self.cache_path(name, version)
+            model = tf.keras.models.load_model(self.storage.model_path(name))
+            output_names = list(model.output_names)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    lite_model = LiteModel(f.read(), output_names)
+            else:
+                inp = self.sample(tuple(model.input.shape[1:3]))
+                if inp is None:
+                    print(f"No slices to check the {self.mode} version of {name}.")
+                else:
+                    content = self.quantize(model, inp)
+                    deviation = self.deviation(model, LiteModel(content, output_names), inp)
+                    print(f"Deviation of the {self.mode} version of {name}: {deviation:.4f}")
+                    if deviation <= ACCURACY_TOLERANCE:
+                        lite_model = LiteModel(content, output_names)
+                        # versions of older model files aren't needed anymore
+                        for old in glob.glob(os.path.join(self.storage.models_path, f".{glob.escape(name)}.{self.mode}.*.tflite")):
+                            os.remove(old)
+                        with self.storage.atomic_open(path, "wb") as f:
+                            f.write(content)
+        except Exception as e:
+            print("Encountered Error: ", e.args)
+        with self.lock:
+            self.models[name] = (version, lite_model)
+            self.converting.discard(name)
+
+    def quantize(self, model, inp):
+        """Converts a keras model to TFLite with reduced precision.
+
+        Args:
+            model (Model): the keras model
+            inp (array): slices, used to calibrate int8 models
+
+        Returns:
+            bytes: the converted model
+        """
+        # converting a function returning the outputs by name keeps these names in the signature
+        spec = tf.TensorSpec((None,) + tuple(model.input.shape[1:]), model.input.dtype)
+        function = tf.function(lambda x: dict(zip(model.output_names, model(x, training=False))))
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([function.get_concrete_function(spec)], model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if self.mode == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        else:
+            calibration = np.asarray(inp[:CALIBRATION_SLICES], np.float32)
+            converter.representative_dataset = lambda: ([calibration[i:i + 1]] for i in range(len(calibration)))
+        return converter.convert()
+
+    def deviation(self, model, lite_model, inp):
+        """Compares the error output (the third output) of a converted model to the float model.
+
+        Args:
+            model (Model): the keras model
+            lite_model (LiteModel): the converted model
+            inp (array): slices
+
+        Returns:
+            float: mean absolute deviation relative to the mean error of the float model
+        """
+        expected = np.asarray(model.predict_on_batch(inp)[2], np.float64)
+        actual = np.asarray(lite_model.predict(inp)[2], np.float64)
+        return float(np.abs(actual - expected).mean() / max(np.abs(expected).mean(), 1e-12))
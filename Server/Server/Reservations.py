@@ -0,0 +1,406 @@
+"""The sessions of the clients, the models they reserved and the locks protecting the models."""
+import random
+import time
+from contextlib import contextmanager
+from threading import Condition, Lock
+
+
+class ReadWriteLock:
+    """A lock held by many readers or by one writer at a time.
+     Waiting writers are preferred to new readers.
+    """
+    def __init__(self):
+        """Initializes the ReadWriteLock."""
+        self.condition = Condition(Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_read(self, blocking=True):
+        """Acquires the lock as reader.
+
+        Args:
+            blocking (bool, optional): Wait while a writer holds or waits for the lock. Defaults to True.
+
+        Returns:
+            bool: True if the lock was acquired, else False.
+        """
+        with self.condition:
+            if not blocking and (self.writer or self.waiting_writers):
+                return False
+            while self.writer or self.waiting_writers:
+                self.condition.wait()
+            self.readers += 1
+            return True
+
+    def release_read(self):
+        """Releases the lock held as reader."""
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        """Acquires the lock as writer, waits until all readers released it."""
+        with self.condition:
+            self.waiting_writers += 1
+            try:
+                while self.writer or self.readers:
+                    self.condition.wait()
+            finally:
+                self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        """Releases the lock held as writer."""
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+
+class ReservationManager:
+    """Keeps the sessions and the models reserved by them. A model may be reserved by many sessions,
+     each session holds its own instance of the model. Every model name has a ReadWriteLock:
+     evaluating and testing share it, committing trained weights holds it exclusively. A model is trained
+     by one session at a time, without holding the lock. Meanwhile the training session evaluates
+     on a snapshot of its instance, updated after every epoch, and can't test the instance.
+     All lookups are indexed, the internal lock is only held briefly.
+    """
+    def __init__(self):
+        """Initializes the ReservationManager."""
+        self.lock = Lock()
+        self.session_counter = random.randint(2, 10000)
+        # the sessions from first_session up to session_counter were issued by this server
+        self.first_session = self.session_counter
+        # session -> [model_name, model, timeout_timestamp, trained, predictor], trained is set once the sessions
+        # instance of the model was trained and differs from the model file
+        self.sessions = dict()
+        # model_name -> sessions reserving the model
+        self.holders = dict()
+        # model_name -> entry of the session training the model, a recreated session has a new entry
+        self.trainers = dict()
+        # model_name -> ReadWriteLock
+        self.model_locks = dict()
+
+    def new_session(self):
+        """Creates a new session.
+
+        Returns:
+            int: The session.
+        """
+        with self.lock:
+            while self.session_counter in self.sessions:
+                self.session_counter += 1
+            session = self.session_counter
+            self.session_counter += 1
+            self.sessions[session] = [None, None, int(time.time()), False, None]
+            return session
+
+    def ensure_session(self, session):
+        """Recreates the session if it was removed. Only sessions issued by this server are recreated,
+         a client with another session has to get a new one.
+
+        Args:
+            session (int): The session.
+
+        Returns:
+            bool: True if the session exists, else False.
+        """
+        with self.lock:
+            return self.restore(session)
+
+    def restore(self, session):
+        """Recreates the session if it was removed and was issued by this server, the internal lock must be held.
+
+        Args:
+            session (int): The session.
+
+        Returns:
+            bool: True if the session exists, else False.
+        """
+        if session in self.sessions:
+            return True
+        if not isinstance(session, int) or not self.first_session <= session < self.session_counter:
+            return False
+        self.sessions[session] = [None, None, int(time.time()), False, None]
+        return True
+
+    def remove_session(self, session):
+        """Removes the session and its reservation.
+
+        Args:
+            session (int): The session.
+        """
+        with self.lock:
+            self.release(session)
+            self.sessions.pop(session, None)
+
+    def remove_dead_sessions(self, max_age):
+        """Removes the sessions without activity.
+
+        Args:
+            max_age (int): Seconds without activity after which a session is removed.
+        """
+        with self.lock:
+            now = int(time.time())
+            for session in [s for s, entry in self.sessions.items() if entry[2] + max_age < now]:
+                self.release(session)
+                self.sessions.pop(session)
+
+    def session_ids(self):
+        """Gets the existing sessions.
+
+        Returns:
+            set: The sessions.
+        """
+        with self.lock:
+            return set(self.sessions)
+
+    def touch(self, session):
+        """Updates the timeout timestamp of the session.
+
+        Args:
+            session (int): The session.
+        """
+        with self.lock:
+            if session in self.sessions:
+                self.sessions[session][2] = int(time.time())
+
+    def get(self, session):
+        """Gets the model reserved by the session.
+
+        Args:
+            session (int): The session.
+
+        Returns:
+            Tuple: name of the model and the model, both None if nothing is reserved.
+        """
+        with self.lock:
+            entry = self.sessions.get(session)
+            if entry is None:
+                return None, None
+            return entry[0], entry[1]
+
+    def get_predictor(self, session, model):
+        """Gets the predictor of the model reserved by the session.
+
+        Args:
+            session (int): The session.
+            model (Model): The sessions instance of the model, as yielded by "reading".
+
+        Returns:
+            Predictor: The predictor, None if the session doesn't reserve the instance anymore.
+        """
+        with self.lock:
+            entry = self.sessions.get(session)
+            return entry[4] if entry is not None and entry[1] is model else None
+
+    def set_predictor(self, session, model, predictor):
+        """Replaces the predictor of the model reserved by the session.
+
+        Args:
+            session (int): The session.
+            model (Model): The sessions instance of the model.
+            predictor (Predictor): The new predictor.
+        """
+        with self.lock:
+            entry = self.sessions.get(session)
+            if entry is not None and entry[1] is model:
+                entry[4] = predictor
+
+    def replace(self, session, model, new_model, predictor):
+        """Replaces the sessions instance of its model, the reservation is kept.
+
+        Args:
+            session (int): The session.
+            model (Model): The sessions current instance of the model.
+            new_model (Model): The new instance.
+            predictor (Predictor): The predictor of the new instance.
+
+        Returns:
+            bool: True if the instance was replaced, False if the session doesn't reserve the instance anymore.
+        """
+        with self.lock:
+            entry = self.sessions.get(session)
+            if entry is None or entry[1] is not model:
+                return False
+            entry[1] = new_model
+            entry[4] = predictor
+            return True
+
+    def is_trained(self, session):
+        """Checks whether the sessions instance of its model was trained.
+
+        Args:
+            session (int): The session.
+
+        Returns:
+            bool: True if it was trained, else False.
+        """
+        with self.lock:
+            entry = self.sessions.get(session)
+            return entry is not None and entry[3]
+
+    def release(self, session):
+        """Removes the reservation of a session, the internal lock must be held.
+
+        Args:
+            session (int): The session.
+        """
+        entry = self.sessions.get(session)
+        if entry is None or entry[0] is None:
+            return
+        holders = self.holders.get(entry[0])
+        if holders is not None:
+            holders.discard(session)
+            if not holders:
+                self.holders.pop(entry[0])
+                # running jobs keep the lock they hold, a new reservation gets a new lock
+                self.model_locks.pop(entry[0], None)
+        entry[0] = None
+        entry[1] = None
+        entry[3] = False
+        entry[4] = None
+
+    def reserve(self, session, model_name, model, predictor=None):
+        """Reserves the model for the session, replacing the previous reservation.
+
+        Args:
+            session (int): The session.
+            model_name (string): Name of the model.
+            model (Model): The sessions instance of the model.
+            predictor (Predictor, optional): Traced predict function of the instance. Defaults to None.
+
+        Returns:
+            bool: True if the session exists, else False.
+        """
+        with self.lock:
+            if not self.restore(session):
+                return False
+            self.release(session)
+            entry = self.sessions[session]
+            entry[0] = model_name
+            entry[1] = model
+            entry[4] = predictor
+            self.holders.setdefault(model_name, set()).add(session)
+            self.model_locks.setdefault(model_name, ReadWriteLock())
+            return True
+
+    def is_reserved(self, model_name):
+        """Checks whether any session reserved the model.
+
+        Args:
+            model_name (string): Name of the model.
+
+        Returns:
+            bool: True if it is reserved, else False.
+        """
+        with self.lock:
+            return model_name in self.holders
+
+    def is_training(self, model_name):
+        """Checks whether the model is in training.
+
+        Args:
+            model_name (string): Name of the model.
+
+        Returns:
+            bool: True if it is in training, else False.
+        """
+        with self.lock:
+            return model_name in self.trainers
+
+    def counts(self):
+        """Counts sessions and reserved models.
+
+        Returns:
+            Tuple: amount of sessions, amount of reserved models and amount of jobs waiting for a model lock.
+        """
+        with self.lock:
+            waiting = sum(lock.waiting_writers for lock in self.model_locks.values())
+            return len(self.sessions), len(self.holders), waiting
+
+    @contextmanager
+    def reading(self, session, snapshot=False):
+        """Holds the lock of the model reserved by the session as reader, used to evaluate and test.
+         Waits while trained weights of the model are committed.
+
+        Args:
+            session (int): The session.
+            snapshot (bool, optional): The caller uses the snapshot of the instance while the session
+             trains it. Defaults to False.
+
+        Yields:
+            Model: The model, None if nothing is reserved, False if the session trains it and snapshot is False.
+        """
+        with self.lock:
+            entry = self.sessions.get(session)
+            model_name, model = (entry[0], entry[1]) if entry is not None else (None, None)
+            if model is not None and not snapshot and self.trainers.get(model_name) is entry:
+                model = False
+            model_lock = self.model_locks.get(model_name)
+        if not model:
+            yield model
+            return
+        model_lock.acquire_read()
+        try:
+            yield model
+        finally:
+            model_lock.release_read()
+
+    @contextmanager
+    def training(self, session):
+        """Marks the model reserved by the session as in training, used to train.
+         The lock of the model is only held by "committing".
+
+        Args:
+            session (int): The session.
+
+        Yields:
+            Model: The model, None if nothing is reserved, False if the model already is in training.
+        """
+        with self.lock:
+            entry = self.sessions.get(session)
+            model_name, model = (entry[0], entry[1]) if entry is not None else (None, None)
+            if model is not None:
+                if model_name in self.trainers:
+                    model = False
+                else:
+                    self.trainers[model_name] = entry
+        if not model:
+            yield model
+            return
+        try:
+            yield model
+        finally:
+            with self.lock:
+                if self.trainers.get(model_name) is entry:
+                    self.trainers.pop(model_name)
+
+    @contextmanager
+    def committing(self, session, model):
+        """Holds the lock of the model reserved by the session as writer, used to update the snapshot
+         with the trained weights. Waits until running evaluations of the model are done.
+
+        Args:
+            session (int): The session.
+            model (Model): The sessions instance of the model, as yielded by "training".
+
+        Yields:
+            bool: True if the session still reserves the instance, else False.
+        """
+        with self.lock:
+            entry = self.sessions.get(session)
+            current = entry is not None and entry[1] is model
+            model_lock = self.model_locks.get(entry[0]) if current else None
+        if not current:
+            yield False
+            return
+        model_lock.acquire_write()
+        try:
+            yield True
+        finally:
+            model_lock.release_write()
+            with self.lock:
+                if entry[1] is model:
+                    entry[3] = True
@@ -0,0 +1,136 @@
+"""Fair sharing of the inference between the sessions and admission of requests to the memory."""
+import heapq
+import itertools
+from contextlib import contextmanager
+from threading import Condition, Lock
+
+
+class FairScheduler:
+    """Start-time fair queuing of chunks of work, keyed by session. A chunk costs the amount of its slices.
+     Each chunk gets a start tag, the later of the current virtual time and the finish tag of the previous
+     chunk of its session, and chunks run in the order of their start tags. A session with much work queued
+     takes turns with the others, instead of delaying them until it is done.
+    """
+    def __init__(self, slots):
+        """Initializes the FairScheduler.
+
+        Args:
+            slots (int): amount of chunks running at the same time
+        """
+        self.condition = Condition(Lock())
+        self.free = slots
+        # start tag of the last started chunk
+        self.virtual_time = 0.0
+        # session -> [finish tag of its last chunk, queued chunks, served slices]
+        self.sessions = dict()
+        # (start tag, sequence number) of the waiting chunks
+        self.waiting = []
+        self.sequence = itertools.count()
+
+    @contextmanager
+    def turn(self, session, cost):
+        """Waits for the turn of a chunk of work and holds a slot while it runs.
+
+        Args:
+            session (int): the session of the work
+            cost (int): amount of slices of the chunk
+        """
+        with self.condition:
+            state = self.sessions.setdefault(session, [0.0, 0, 0])
+            start = max(self.virtual_time, state[0])
+            state[0] = start + cost
+            state[1] += 1
+            entry = (start, next(self.sequence))
+            heapq.heappush(self.waiting, entry)
+            while self.free == 0 or self.waiting[0] != entry:
+                self.condition.wait()
+            heapq.heappop(self.waiting)
+            self.free -= 1
+            self.virtual_time = start
+            state[1] -= 1
+            # the next waiting chunk may run in another free slot
+            self.condition.notify_all()
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.free += 1
+                state[2] += cost
+                self.condition.notify_all()
+
+    def retain(self, sessions):
+        """Forgets the sessions without queued work which aren't in sessions.
+
+        Args:
+            sessions (set): the existing sessions
+        """
+        with self.condition:
+            for session in [s for s, state in self.sessions.items() if s not in sessions and state[1] == 0]:
+                self.sessions.pop(session)
+
+    def queues(self):
+        """Gets the queued and served work of the sessions.
+
+        Returns:
+            dict: session -> {"queued": queued chunks, "served": served slices}
+        """
+        with self.condition:
+            return {session : {"queued" : state[1], "served" : state[2]} for session, state in self.sessions.items()}
+
+
+class MemoryBudget:
+    """Admission control against a memory budget. Requests reserve their estimated peak memory and wait
+     in order of arrival until it fits into the budget. Requests which never fit are rejected.
+    """
+    def __init__(self, limit):
+        """Initializes the MemoryBudget.
+
+        Args:
+            limit (int): the budget in bytes
+        """
+        self.condition = Condition(Lock())
+        self.limit = limit
+        self.reserved = 0
+        # tickets of the waiting requests, in order of arrival
+        self.waiting = []
+        self.sequence = itertools.count()
+
+    def acquire(self, amount):
+        """Reserves memory, waits until it fits into the budget and all earlier requests got theirs.
+
+        Args:
+            amount (int): bytes to reserve
+
+        Returns:
+            bool: False if the amount exceeds the budget, else True.
+        """
+        if amount > self.limit:
+            return False
+        with self.condition:
+            ticket = next(self.sequence)
+            self.waiting.append(ticket)
+            while self.waiting[0] != ticket or self.reserved + amount > self.limit:
+                self.condition.wait()
+            self.waiting.pop(0)
+            self.reserved += amount
+            self.condition.notify_all()
+        return True
+
+    def release(self, amount):
+        """Releases reserved memory.
+
+        Args:
+            amount (int): bytes to release
+        """
+        with self.condition:
+            self.reserved -= amount
+            self.condition.notify_all()
+
+    def usage(self):
+        """Gets the usage of the budget.
+
+        Returns:
+            dict: "budget" and "reserved" in bytes, "waiting" requests
+        """
+        with self.condition:
+            return {"budget" : self.limit, "reserved" : self.reserved, "waiting" : len(self.waiting)}
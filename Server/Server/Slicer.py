@@ -0,0 +1,337 @@
+"""Rasterizes and slices a PCB on the server. The plugin only sends a compact description
+ of the boards geometry (see "REST definition.txt", type 14), the expensive part of creating
+ the slices runs on the servers cores. Mirrors "generate_slices_mp.py" of the plugin,
+ so slices created here are identical to the ones created by the plugin."""
+import numpy as np
+from skimage import draw
+import multiprocessing
+from ctypes import c_byte
+
+
+var_dict = {}
+def _worker_init(layers_raw, layers_shape, width, geometry):
+    """Initializes the workers for multiprocessing."""
+    var_dict["layers_raw"] = layers_raw
+    var_dict["layers_shape"] = layers_shape
+    var_dict["width"] = width
+    var_dict["geometry"] = geometry
+
+
+def _cut(layers, x_pos, y_pos, width):
+    """Cuts the two slices (along the x- and the y-axis) centered at x_pos, y_pos out of layers.
+     Indexing follows pythons rules like in the plugin: negative indices wrap around, indices
+     out of range are left empty.
+
+    Args:
+        layers (3D byte-Array): The rasterized board
+        x_pos (float): x-position of the center
+        y_pos (float): y-position of the center
+        width (int): length of a slice
+
+    Returns:
+        Tuple[bytes, bytes]: slice along the x-axis, slice along the y-axis
+    """
+    layercount, size_y, size_x = layers.shape
+    offsets = np.arange(width) - (width // 2)
+    slice_x = np.zeros((layercount, width), np.uint8)
+    slice_y = np.zeros((layercount, width), np.uint8)
+
+    row = int(y_pos)
+    cols = np.trunc(x_pos + offsets).astype(np.int64)
+    valid = (cols >= -size_x) & (cols < size_x)
+    if -size_y <= row < size_y:
+        slice_x[:, valid] = layers[:, row, cols[valid]]
+
+    col = int(x_pos)
+    rows = np.trunc(y_pos + offsets).astype(np.int64)
+    valid = (rows >= -size_y) & (rows < size_y)
+    if -size_x <= col < size_x:
+        slice_y[:, valid] = layers[:, rows[valid], col]
+    return slice_x.tobytes(), slice_y.tobytes()
+
+
+def _walk(layers, positions, slices, x_pos, y_pos, step, count, width):
+    """Creates slices at "count" positions along a line starting at x_pos, y_pos."""
+    for _ in range(count):
+        slice_x, slice_y = _cut(layers, x_pos, y_pos, width)
+        positions.append((int(x_pos), int(y_pos)))
+        positions.append((int(x_pos), int(y_pos)))
+        slices.append(slice_x)
+        slices.append(slice_y)
+        x_pos = x_pos + step[0]
+        y_pos = y_pos + step[1]
+
+
+def _walk_until(layers, positions, slices, x_pos, y_pos, end_x, end_y, direc, width):
+    """Creates slices along a line starting at x_pos, y_pos until end_x, end_y is passed."""
+    x_dir = 1 if direc[0] > 0 else -1
+    y_dir = 1 if direc[1] > 0 else -1
+    while (x_pos - end_x) * x_dir <= 0 and (y_pos - end_y) * y_dir <= 0:
+        slice_x, slice_y = _cut(layers, x_pos, y_pos, width)
+        positions.append((int(x_pos), int(y_pos)))
+        positions.append((int(x_pos), int(y_pos)))
+        slices.append(slice_x)
+        slices.append(slice_y)
+        x_pos = x_pos + direc[0]
+        y_pos = y_pos + direc[1]
+
+
+def _walk_circle(layers, positions, slices, x_pos, y_pos, radius, width):
+    """Creates slices along a circle with radius "radius" around x_pos, y_pos."""
+    direc = np.array([radius, 0])
+    rot = np.array([[np.cos(1/radius), np.sin(1/radius)], [-np.sin(1/radius), np.cos(1/radius)]])
+    for _ in range(int(2 * np.pi * radius)+1):
+        slice_x, slice_y = _cut(layers, x_pos+direc[0], y_pos+direc[1], width)
+        positions.append((int(x_pos+direc[0]), int(y_pos+direc[1])))
+        positions.append((int(x_pos+direc[0]), int(y_pos+direc[1])))
+        slices.append(slice_x)
+        slices.append(slice_y)
+        direc = np.dot(direc, rot)
+
+
+def _slice_track(start, stop):
+    """Slices the tracks from start to stop."""
+    layers = np.frombuffer(var_dict["layers_raw"], np.uint8).reshape(var_dict["layers_shape"])
+    width = var_dict["width"]
+    positions = []
+    slices = []
+
+    for t_xstart, t_ystart, t_xend, t_yend, t_width, _, _ in var_dict["geometry"]["tracks"][start:stop]:
+        direc = np.array([t_xend - t_xstart, t_yend - t_ystart])
+        direc_l = np.linalg.norm(direc)
+        if direc_l == 0:
+            continue
+        direc = direc / direc_l
+        # cross-section in y- and x-direction depending on the tracks direction
+        actual_t_width = t_width / max(np.sqrt(1-np.square(np.dot(direc, np.array([1, 0])))), np.abs(np.dot(direc, np.array([1, 0]))))
+
+        if actual_t_width < width:
+            # go along the track and create slices
+            _walk_until(layers, positions, slices, t_xstart, t_ystart, t_xend, t_yend, direc, width)
+        else:
+            rot90 = np.array([[0, 1], [-1, 0]])
+            offsets = np.dot(direc, rot90)
+            offsets = offsets * t_width // 2
+            buffer = direc * t_width // 2
+            # go along the edges of the track and create slices
+            _walk_until(
+                layers, positions, slices,
+                t_xstart + offsets[0] - buffer[0], t_ystart + offsets[1] - buffer[1],
+                t_xend + offsets[0] + buffer[0], t_yend + offsets[1] + buffer[1],
+                direc, width)
+            _walk_until(
+                layers, positions, slices,
+                t_xstart - offsets[0] - buffer[0], t_ystart - offsets[1] - buffer[1],
+                t_xend - offsets[0] + buffer[0], t_yend - offsets[1] + buffer[1],
+                direc, width)
+    return positions, slices
+
+
+def _slice_via(start, stop):
+    """Slices the vias from start to stop."""
+    layers = np.frombuffer(var_dict["layers_raw"], np.uint8).reshape(var_dict["layers_shape"])
+    width = var_dict["width"]
+    positions = []
+    slices = []
+
+    for v_xpos, v_ypos, v_width, _, _, _ in var_dict["geometry"]["vias"][start:stop]:
+        # if the via is bigger than the slice: create slices along its edge
+        if v_width >= width:
+            _walk_circle(layers, positions, slices, v_xpos, v_ypos, v_width // 2, width)
+        else:
+            # create slices through via along the x- and the y-axis
+            _walk(layers, positions, slices, v_xpos - (v_width//2), v_ypos, (1, 0), v_width, width)
+            _walk(layers, positions, slices, v_xpos, v_ypos - (v_width//2), (0, 1), v_width, width)
+    return positions, slices
+
+
+def _slice_pad(start, stop):
+    """Slices the pads from start to stop."""
+    layers = np.frombuffer(var_dict["layers_raw"], np.uint8).reshape(var_dict["layers_shape"])
+    width = var_dict["width"]
+    positions = []
+    slices = []
+
+    for p_shape, p_xpos, p_ypos, p_xsize, p_ysize, p_orien, _, _, _ in var_dict["geometry"]["pads"][start:stop]:
+        # if pad is circular: treat it like a via
+        if p_shape == 0:
+            if p_xsize >= width:
+                _walk_circle(layers, positions, slices, p_xpos, p_ypos, p_xsize // 2, width)
+            else:
+                _walk(layers, positions, slices, p_xpos - (p_xsize//2), p_ypos, (1, 0), p_xsize, width)
+                _walk(layers, positions, slices, p_xpos, p_ypos - (p_xsize//2), (0, 1), p_xsize, width)
+
+        # if pad is not circular: treat it as a rectangle
+        else:
+            x_vertices, y_vertices = _pad_vertices(p_xpos, p_ypos, p_xsize, p_ysize, p_orien)
+            x_vector = np.array([x_vertices[3] - x_vertices[0], y_vertices[3] - y_vertices[0]])
+            y_vector = np.array([x_vertices[1] - x_vertices[0], y_vertices[1] - y_vertices[0]])
+            x_vector = x_vector / np.linalg.norm(x_vector)
+            y_vector = y_vector / np.linalg.norm(y_vector)
+
+            # if there is the possibility (depending on its angle) that the pad is bigger than the slice: create slices along its edge
+            if np.sqrt(np.square(p_xsize) + np.square(p_ysize)) >= width:
+                _walk(layers, positions, slices, x_vertices[0], y_vertices[0], x_vector, p_xsize, width)
+                _walk(layers, positions, slices, x_vertices[1], y_vertices[1], x_vector, p_xsize, width)
+                _walk(layers, positions, slices, x_vertices[0], y_vertices[0], y_vector, p_ysize, width)
+                _walk(layers, positions, slices, x_vertices[3], y_vertices[3], y_vector, p_ysize, width)
+            # if the pad is smaller than the slice: create slices along its x- and y-axis
+            else:
+                _walk(
+                    layers, positions, slices,
+                    x_vertices[0] + (y_vector[0] * p_ysize // 2), y_vertices[0] + (y_vector[1] * p_ysize // 2),
+                    x_vector, p_xsize, width)
+                _walk(
+                    layers, positions, slices,
+                    x_vertices[0] + (x_vector[0] * p_xsize // 2), y_vertices[0] + (x_vector[1] * p_xsize // 2),
+                    y_vector, p_ysize, width)
+    return positions, slices
+
+
+def _pad_vertices(p_xpos, p_ypos, p_xsize, p_ysize, p_orien):
+    """Computes the corners of a rotated rectangular pad.
+
+    Returns:
+        Tuple[array, array]: x- and y-coordinates of the four corners
+    """
+    rot = np.array([[np.cos(p_orien), -np.sin(p_orien)], [np.sin(p_orien), np.cos(p_orien)]])
+    directions_y = [-p_ysize // 2, p_ysize // 2, p_ysize // 2, -p_ysize // 2]
+    directions_x = [-p_xsize // 2, -p_xsize // 2, p_xsize // 2, p_xsize // 2]
+    directions = np.array([directions_x, directions_y]).transpose()
+    directions = np.dot(directions, rot).transpose()
+    return directions[0] + p_xpos, directions[1] + p_ypos
+
+
+def scale_geometry(geometry):
+    """Scales the geometry sent by the plugin (pcbnew units) down to the raster
+     and moves it to the origin of the boards bounding box.
+
+    Args:
+        geometry (dict): geometry as specified in "REST definition.txt"
+
+    Returns:
+        dict: the scaled geometry, the shape of the raster under "shape"
+    """
+    step_value = int(geometry["step_value"])
+    left, top, right, bottom = [int(v) // step_value for v in geometry["box"]]
+    layercount = int(geometry["layercount"])
+
+    def pos(value, origin):
+        return int(value) // step_value - origin
+
+    tracks = [
+        (pos(xs, left), pos(ys, top), pos(xe, left), pos(ye, top), int(w) // step_value, int(layer), int(signal))
+        for xs, ys, xe, ye, w, layer, signal in geometry["tracks"]]
+    vias = [
+        (pos(x, left), pos(y, top), int(w) // step_value, int(top_id), int(bottom_id), int(signal))
+        for x, y, w, top_id, bottom_id, signal in geometry["vias"]]
+    pads = [
+        (int(shape), pos(x, left), pos(y, top), int(xs) // step_value, int(ys) // step_value, float(orien), int(top_id), int(bottom_id), int(signal))
+        for shape, x, y, xs, ys, orien, top_id, bottom_id, signal in geometry["pads"]]
+    return {
+        "shape": (layercount, bottom-top, right-left),
+        "tracks": tracks,
+        "vias": vias,
+        "pads": pads
+    }
+
+
+def rasterize(geometry, layers):
+    """Draws the scaled geometry into layers. Tracks, vias and pads are drawn with
+     the signal of their net.
+
+    Args:
+        geometry (dict): geometry as returned by "scale_geometry"
+        layers (3D byte-Array): the zero initialized raster
+    """
+    layercount = layers.shape[0]
+    for i in range(layercount):
+        for p_shape, p_xpos, p_ypos, p_xsize, p_ysize, p_orien, top_id, bottom_id, signal in geometry["pads"]:
+            # pads penetrate layers
+            if top_id <= i and bottom_id >= i:
+                # everything that is not a circle is treated as a rectangle
+                if p_shape == 0:
+                    rr, cc = draw.disk((p_ypos, p_xpos), p_xsize // 2)
+                else:
+                    c, r = _pad_vertices(p_xpos, p_ypos, p_xsize, p_ysize, p_orien)
+                    rr, cc = draw.polygon(r, c)
+                try:
+                    layers[i, rr, cc] = signal
+                except IndexError:
+                    pass
+
+        for v_xpos, v_ypos, v_width, top_id, bottom_id, signal in geometry["vias"]:
+            # vias penetrate layers, vias are always circles
+            if top_id <= i and bottom_id >= i:
+                rr, cc = draw.disk((v_ypos, v_xpos), v_width // 2)
+                try:
+                    layers[i, rr, cc] = signal
+                except IndexError:
+                    pass
+
+        for t_xstart, t_ystart, t_xend, t_yend, t_width, layer_id, signal in geometry["tracks"]:
+            if layer_id == i or (layer_id == 31 and i == layercount-1):
+                direction1 = np.array([t_xend - t_xstart, t_yend - t_ystart])
+                rot90 = np.array([[0, 1], [-1, 0]])
+                direc_l = np.linalg.norm(direction1)
+                if direc_l == 0:
+                    continue
+                direction1 = direction1 / direc_l
+                direction1 = direction1 * t_width // 2
+                direction1 = np.dot(direction1, rot90)
+                direction2 = -direction1
+                r = np.array([t_ystart + direction1[1], t_ystart + direction2[1], t_yend + direction2[1], t_yend + direction1[1]])
+                c = np.array([t_xstart + direction1[0], t_xstart + direction2[0], t_xend + direction2[0], t_xend + direction1[0]])
+                # a track is represented as a rectangle with two half-circles at its ends
+                rr, cc = draw.polygon(r, c)
+                qq, tt = draw.disk((t_ystart, t_xstart), t_width // 2)
+                vv, ww = draw.disk((t_yend, t_xend), t_width // 2)
+                try:
+                    layers[i, rr, cc] = signal
+                    layers[i, qq, tt] = signal
+                    layers[i, vv, ww] = signal
+                except IndexError:
+                    pass
+
+
+def create_slices(geometry):
+    """Rasterizes the board described by "geometry" and slices it along its components
+     using all CPU cores of the server.
+
+    Args:
+        geometry (dict): geometry as specified in "REST definition.txt"
+
+    Returns:
+        Tuple[array, array]: positions of the slices (N x 2 int32) and the slices (N x layercount x width uint8)
+    """
+    width = int(geometry["width"])
+    scaled = scale_geometry(geometry)
+    layers_shape = scaled["shape"]
+    # spawn, tensorflow of the server isn't safe to fork once it is initialized
+    context = multiprocessing.get_context("spawn")
+    # array in shared memory for multiprocessing, handed to the workers when they start
+    layers_raw = context.RawArray(c_byte, layers_shape[0]*layers_shape[1]*layers_shape[2])
+    layers = np.frombuffer(layers_raw, np.uint8).reshape(layers_shape)
+    rasterize(scaled, layers)
+
+    cpus = context.cpu_count()
+    with context.Pool(processes=cpus, initializer=_worker_init, initargs=(layers_raw, layers_shape, width, scaled)) as pool:
+        tasks = []
+        for func, items in ((_slice_track, scaled["tracks"]), (_slice_via, scaled["vias"]), (_slice_pad, scaled["pads"])):
+            if len(items) > 100:
+                tasks += [pool.apply_async(func, (i * len(items) // cpus, (i+1) * len(items) // cpus)) for i in range(cpus)]
+            else:
+                tasks.append(pool.apply_async(func, (0, len(items))))
+        results = [task.get() for task in tasks]
+
+    count = sum(len(res[1]) for res in results)
+    positions = np.zeros((count, 2), np.int32)
+    slices = np.zeros((count, layers_shape[0], width), np.uint8)
+    i = 0
+    for res_positions, res_slices in results:
+        if len(res_slices) == 0:
+            continue
+        positions[i:i+len(res_slices)] = res_positions
+        slices[i:i+len(res_slices)] = np.frombuffer(b"".join(res_slices), np.uint8).reshape((-1, layers_shape[0], width))
+        i += len(res_slices)
+    return positions, slices
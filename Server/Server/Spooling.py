@@ -0,0 +1,210 @@
+"""Large json request bodies, spooled to a file and parsed incrementally. The slices in the "data" array
+ are packed into an array while parsing, the strings of all slices are never held at once."""
+import codecs
+import json
+import tempfile
+import numpy as np
+
+# bytes read from the body or the spooled file at once
+BLOCK_SIZE = 1 << 20
+
+
+def spool(stream, length, directory):
+    """Copies a request body to a temporary file.
+
+    Args:
+        stream (file): the stream to read the body from
+        length (int): length of the body
+        directory (str): directory of the temporary file
+
+    Returns:
+        file: the temporary file, removed once closed
+
+    Raises:
+        ValueError: The body ended early.
+    """
+    spooled = tempfile.TemporaryFile(dir=directory)
+    try:
+        while length:
+            block = stream.read(min(length, BLOCK_SIZE))
+            if not block:
+                raise ValueError("Body ended early")
+            spooled.write(block)
+            length -= len(block)
+        spooled.seek(0)
+        return spooled
+    except Exception:
+        spooled.close()
+        raise
+
+
+class JsonStream:
+    """Reads json values from a file, holding only the unread part of the current blocks."""
+    def __init__(self, file):
+        """Initializes the JsonStream.
+
+        Args:
+            file (file): the file, read from its current position
+        """
+        self.file = file
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.value_decoder = json.JSONDecoder()
+
+    def fill(self, size=BLOCK_SIZE):
+        """Reads more of the file into the buffer, dropping the consumed part.
+
+        Args:
+            size (int, optional): bytes to read. Defaults to BLOCK_SIZE.
+
+        Returns:
+            bool: False at the end of the file, else True.
+        """
+        if self.eof:
+            return False
+        block = self.file.read(size)
+        self.eof = not block
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(block, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def peek(self):
+        """Skips whitespace and gets the next character.
+
+        Returns:
+            str: the character, "" at the end of the file
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, characters):
+        """Consumes the next character.
+
+        Args:
+            characters (str): the allowed characters
+
+        Returns:
+            str: the character
+
+        Raises:
+            ValueError: The next character isn't allowed.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"Expected one of {characters!r} at {self.pos}")
+        self.pos += 1
+        return character
+
+    def string(self):
+        """Reads a string.
+
+        Returns:
+            str: the string
+        """
+        self.expect('"')
+        while True:
+            try:
+                value, self.pos = json.decoder.scanstring(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                # the string or an escape continues in the next block
+                if not self.fill():
+                    raise
+
+    def value(self):
+        """Reads any value.
+
+        Returns:
+            object: the value
+        """
+        self.peek()
+        size = BLOCK_SIZE
+        while True:
+            try:
+                value, end = self.value_decoder.raw_decode(self.buffer, self.pos)
+                # a number could continue in the next block
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # large values are read with growing blocks
+            self.fill(size)
+            size *= 2
+
+
+def pack_slices(stream, directory):
+    """Reads an array of equally long strings and packs it into an array. The packed rows are collected in
+     a temporary file, which is read into an array of the final size at the end.
+
+    Args:
+        stream (JsonStream): the stream, positioned at the array
+        directory (str): directory of the temporary file
+
+    Returns:
+        array: the strings as bytes (count x length, uint8)
+
+    Raises:
+        ValueError: The array contains other values than strings of the same length.
+    """
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.pos += 1
+        return []
+    length = None
+    with tempfile.TemporaryFile(dir=directory) as packed:
+        rows = []
+        while True:
+            row = stream.string().encode()
+            if length is None:
+                length = len(row)
+                if not length:
+                    raise ValueError("Empty slices")
+            elif len(row) != length:
+                raise ValueError("Slices of different length")
+            rows.append(row)
+            if len(rows) * length >= BLOCK_SIZE:
+                packed.write(b"".join(rows))
+                rows = []
+            if stream.expect(",]") == "]":
+                break
+        packed.write(b"".join(rows))
+        packed.seek(0)
+        data = np.fromfile(packed, np.uint8)
+    return data.reshape((-1, length))
+
+
+def parse(file, directory):
+    """Parses a json object from a spooled body. A "data" array of equally long strings is returned as array
+     (count x length, uint8), as taken by the request handling instead of the list of slices.
+
+    Args:
+        file (file): the spooled body
+        directory (str): directory of temporary files
+
+    Returns:
+        dict: the parsed object
+
+    Raises:
+        ValueError: The body isn't a json object, or its "data" array can't be packed.
+    """
+    stream = JsonStream(file)
+    payload = dict()
+    stream.expect("{")
+    if stream.peek() == "}":
+        return payload
+    while True:
+        key = stream.string()
+        stream.expect(":")
+        if key == "data" and stream.peek() == "[":
+            payload[key] = pack_slices(stream, directory)
+        else:
+            payload[key] = stream.value()
+        if stream.expect(",}") == "}":
+            return payload
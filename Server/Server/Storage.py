@@ -0,0 +1,610 @@
+"""The models and datasets of the server. They are stored below fixed absolute directories,
+ so requests handled in parallel never depend on the working directory of the process."""
+import os
+import json
+import time
+import uuid
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock, Thread
+
+# seconds between checks of the directories for changes made by others
+WATCH_INTERVAL = 2
+# file in the datasets directory keeping the metadata of the datasets
+MANIFEST = ".manifest.json"
+# prefix of the files of unfinished uploads in the datasets directory
+UPLOAD_PREFIX = ".upload."
+
+
+class Storage:
+    """Stores models as "name.<model_format>" in "models" and datasets as "name.npy" (uint8 array of
+     count x x_dim x y_dim) or "name.json" (list of slices, older datasets) in "datasets" below the root
+     directory. Files are written to a temporary file first and renamed afterwards,
+     so readers never see partially written files. An in-memory catalog of the names is kept,
+     it's updated by the writes of the server and by watching the directories for other changes.
+     The metadata of the datasets is kept in a manifest file, so it's known without opening them.
+    """
+    def __init__(self, root, model_format):
+        """Initializes the Storage and starts watching the directories.
+
+        Args:
+            root (str): Directory containing the "models" and "datasets" directories.
+            model_format (str): File extension of the models.
+        """
+        self.models_path = os.path.abspath(os.path.join(root, "models"))
+        self.datasets_path = os.path.abspath(os.path.join(root, "datasets"))
+        os.makedirs(self.models_path, exist_ok=True)
+        os.makedirs(self.datasets_path, exist_ok=True)
+        self.model_extension = f".{model_format}"
+        # preferred first, new datasets are written with the first one
+        self.dataset_extensions = (".npy", ".json")
+
+        self.lock = Lock()
+        # held while the manifest is written, taken before the internal lock
+        self.manifest_lock = Lock()
+        # directory -> names of the files with the right extension, without extension
+        self.catalog = dict()
+        # directory -> modification time when it was listed
+        self.listed = dict()
+        # dataset name -> metadata, see "describe_dataset"
+        self.manifest = dict()
+        self.manifest_path = os.path.join(self.datasets_path, MANIFEST)
+        # upload id -> state of the upload, see "begin_upload"
+        self.uploads = dict()
+        try:
+            with open(self.manifest_path, "r") as f:
+                self.manifest = json.load(f)
+        except (IOError, ValueError):
+            pass
+        self.refresh()
+
+        watcher = Thread(target=self.watch)
+        watcher.daemon = True
+        watcher.start()
+
+    def check_name(self, name):
+        """Makes sure a name sent by a client doesn't reach outside of the storage.
+
+        Args:
+            name (str): name of a model or dataset
+
+        Raises:
+            ValueError: The name contains path components.
+        """
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"Invalid name {name!r}")
+
+    def model_path(self, name):
+        """Gets the absolute path of a model.
+
+        Args:
+            name (str): name of the model
+
+        Returns:
+            str: the path
+        """
+        self.check_name(name)
+        return os.path.join(self.models_path, name + self.model_extension)
+
+    def dataset_path(self, name):
+        """Gets the absolute path of a dataset. If it doesn't exist yet, the path to write it to.
+
+        Args:
+            name (str): name of the dataset
+
+        Returns:
+            str: the path
+        """
+        self.check_name(name)
+        for extension in self.dataset_extensions:
+            path = os.path.join(self.datasets_path, name + extension)
+            if os.path.exists(path):
+                return path
+        return os.path.join(self.datasets_path, name + self.dataset_extensions[0])
+
+    def models(self):
+        """Gets the names of all models from the catalog.
+
+        Returns:
+            List: names of the models
+        """
+        with self.lock:
+            return sorted(self.catalog[self.models_path])
+
+    def datasets(self):
+        """Gets the names of all datasets from the catalog.
+
+        Returns:
+            List: names of the datasets
+        """
+        with self.lock:
+            return sorted(self.catalog[self.datasets_path])
+
+    @contextmanager
+    def atomic_path(self, path):
+        """Provides a temporary path to write a file to, which is renamed to "path" once the context is left
+         without an error. On errors the temporary file is removed.
+
+        Args:
+            path (str): The final path of the file.
+
+        Yields:
+            str: The temporary path, in the same directory and with the same extension as "path".
+        """
+        directory, filename = os.path.split(path)
+        extension = os.path.splitext(filename)[1]
+        # hidden, so it's left out of the catalog
+        temporary = os.path.join(directory, f".{filename}.{uuid.uuid4().hex}.tmp{extension}")
+        try:
+            yield temporary
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
+        self.added(path)
+
+    @contextmanager
+    def atomic_open(self, path, mode="w"):
+        """Opens a temporary file, which is renamed to "path" once the context is left without an error.
+
+        Args:
+            path (str): The final path of the file.
+            mode (str, optional): Mode to open the file with, "w" or "wb". Defaults to "w".
+
+        Yields:
+            file: The opened temporary file.
+        """
+        with self.atomic_path(path) as temporary:
+            with open(temporary, mode) as f:
+                yield f
+
+    def remove(self, path):
+        """Removes a file from the storage.
+
+        Args:
+            path (str): path of the file
+
+        Raises:
+            IOError: The file doesn't exist or can't be removed.
+        """
+        os.remove(path)
+        directory, filename = os.path.split(path)
+        name = os.path.splitext(filename)[0]
+        with self.lock:
+            self.catalog[directory].discard(name)
+            changed = directory == self.datasets_path and self.manifest.pop(name, None) is not None
+        if changed:
+            self.save_manifest()
+
+    def added(self, path):
+        """Adds a file written by the server to the catalog.
+
+        Args:
+            path (str): path of the file
+        """
+        directory, filename = os.path.split(path)
+        if filename.startswith("."):
+            return
+        with self.lock:
+            self.catalog[directory].add(os.path.splitext(filename)[0])
+
+    def file_version(self, path):
+        """Gets the version of a model or dataset file, it changes whenever the file is rewritten.
+
+        Args:
+            path (str): path of the file
+
+        Returns:
+            Tuple: modification time in nanoseconds and size
+        """
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def dataset_info(self, name):
+        """Gets the metadata of a dataset.
+
+        Args:
+            name (str): name of the dataset
+
+        Returns:
+            dict: the metadata, see "describe_dataset", None if the dataset is unknown
+        """
+        with self.lock:
+            info = self.manifest.get(name)
+            return dict(info) if info is not None else None
+
+    def datasets_info(self):
+        """Gets the metadata of all datasets.
+
+        Returns:
+            List: the metadata of each dataset with its "name" added
+        """
+        with self.lock:
+            return [dict(info, name=name) for name, info in sorted(self.manifest.items())]
+
+    def describe_dataset(self, name, board, count, x_dim, y_dim, augmented, created=None):
+        """Creates the metadata of a dataset file.
+
+        Args:
+            name (str): name of the dataset
+            board (str): name of the board the slices were taken from
+            count (int): number of slices
+            x_dim (int): length of slice in x-dimension
+            y_dim (int): length of slice in y-dimension
+            augmented (bool): whether the slices were augmented
+            created (float, optional): creation time, defaults to the modification time of the file
+
+        Returns:
+            dict: "board", "count", "x_dim", "y_dim", "augmented", "bytes", "hash" (sha256 of the file) and "created"
+        """
+        path = self.dataset_path(name)
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        stat = os.stat(path)
+        return {
+            "board" : board,
+            "count" : count,
+            "x_dim" : x_dim,
+            "y_dim" : y_dim,
+            "augmented" : augmented,
+            "bytes" : stat.st_size,
+            "hash" : digest.hexdigest(),
+            "created" : created if created is not None else stat.st_mtime
+        }
+
+    def describe_unknown_dataset(self, name):
+        """Creates the metadata of a dataset not written by the server, like "describe_dataset".
+         Board, count and shape are taken from the name "board_count_xdim_ydim[_a]".
+
+        Args:
+            name (str): name of the dataset
+
+        Returns:
+            dict: the metadata, with None for what's missing in the name
+        """
+        augmented = name.endswith("_a")
+        parts = (name[:-2] if augmented else name).rsplit("_", 3)
+        try:
+            board, count, x_dim, y_dim = parts[0], int(parts[1]), int(parts[2]), int(parts[3])
+        except (IndexError, ValueError):
+            board, count, x_dim, y_dim = name, None, None, None
+        return self.describe_dataset(name, board, count, x_dim, y_dim, augmented)
+
+    def record_dataset(self, name, board, count, x_dim, y_dim, augmented):
+        """Adds the metadata of a dataset written by the server to the manifest.
+         Arguments like "describe_dataset".
+        """
+        info = self.describe_dataset(name, board, count, x_dim, y_dim, augmented, time.time())
+        with self.lock:
+            self.manifest[name] = info
+        self.save_manifest()
+
+    def save_manifest(self):
+        """Writes the manifest, the internal lock must not be held. Writes are serialized and each writes
+         the manifest as it is when it's copied, so the last write has the latest changes.
+        """
+        with self.manifest_lock:
+            with self.lock:
+                manifest = dict(self.manifest)
+            with self.atomic_open(self.manifest_path) as f:
+                json.dump(manifest, f)
+
+    def list_directory(self, directory, extension):
+        """Lists the names of the files in a directory with the extension, temporary files are left out.
+
+        Args:
+            directory (str): the directory
+            extension (str or Tuple): the extension or the extensions
+
+        Returns:
+            set: names without extension
+        """
+        return set(
+            os.path.splitext(entry.name)[0] for entry in os.scandir(directory)
+            if entry.is_file() and not entry.name.startswith(".") and entry.name.endswith(extension))
+
+    def refresh(self):
+        """Lists the directories again if they changed since they were listed."""
+        for directory, extension in ((self.models_path, self.model_extension), (self.datasets_path, self.dataset_extensions)):
+            try:
+                modified = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            if self.listed.get(directory) == modified:
+                continue
+            names = self.list_directory(directory, extension)
+            if directory == self.datasets_path:
+                self.update_manifest(names)
+            with self.lock:
+                self.catalog[directory] = names
+                self.listed[directory] = modified
+
+    def update_manifest(self, names):
+        """Adds the datasets missing in the manifest and removes the ones no longer existing.
+
+        Args:
+            names (set): names of the existing datasets
+        """
+        with self.lock:
+            unknown = names - set(self.manifest)
+        described = dict()
+        for name in unknown:
+            try:
+                described[name] = self.describe_unknown_dataset(name)
+            except IOError:
+                pass
+        with self.lock:
+            # datasets written since "names" was listed exist, but aren't in it
+            removed = set(name for name in set(self.manifest) - names if not os.path.exists(self.dataset_path(name)))
+            if not described and not removed:
+                return
+            for name in removed:
+                self.manifest.pop(name)
+            for name, info in described.items():
+                self.manifest.setdefault(name, info)
+        self.save_manifest()
+
+    def upload_file(self, upload, extension):
+        """Gets the path of a file of an unfinished upload.
+
+        Args:
+            upload (str): id of the upload
+            extension (str): ".npy" for the slices, ".json" for the state
+
+        Raises:
+            ValueError: The id is invalid.
+
+        Returns:
+            str: the path
+        """
+        if not upload or not upload.isalnum():
+            raise ValueError(f"Invalid upload {upload!r}")
+        return os.path.join(self.datasets_path, f"{UPLOAD_PREFIX}{upload}{extension}")
+
+    def begin_upload(self, board, count, x_dim, y_dim, augmented, chunk, append=None):
+        """Creates a dataset file receiving slices in chunks. The file is preallocated and
+         hidden, the chunks are written to their place in any order.
+
+        Args:
+            board (str): name of the board the slices are taken from
+            count (int): number of slices
+            x_dim (int): length of slice in x-dimension
+            y_dim (int): length of slice in y-dimension
+            augmented (bool): whether the slices should be augmented
+            chunk (int): number of slices per chunk
+            append (str, optional): name of a dataset the slices are appended to. Defaults to None.
+
+        Returns:
+            str: id of the upload
+        """
+        if count < 1 or x_dim < 1 or y_dim < 1 or chunk < 1:
+            raise ValueError("Invalid upload shape")
+        upload = uuid.uuid4().hex
+        array = np.lib.format.open_memmap(self.upload_file(upload, ".npy"), mode="w+", dtype=np.uint8, shape=(count, x_dim, y_dim))
+        offset = array.offset
+        del array
+        state = {
+            "board" : board,
+            "count" : count,
+            "x_dim" : x_dim,
+            "y_dim" : y_dim,
+            "augmented" : augmented,
+            "chunk" : chunk,
+            "append" : append,
+            "offset" : offset,
+            "received" : []
+        }
+        with self.lock:
+            self.uploads[upload] = state
+            self.save_upload(upload)
+        return upload
+
+    def upload_state(self, upload):
+        """Gets the state of an unfinished upload, also of uploads begun before the server was restarted.
+
+        Args:
+            upload (str): id of the upload
+
+        Returns:
+            dict: "board", "count", "x_dim", "y_dim", "augmented", "chunk", "append" and "received" (sequence
+                numbers of the received chunks), None if the upload doesn't exist
+        """
+        path = self.upload_file(upload, ".json")
+        with self.lock:
+            if upload not in self.uploads:
+                try:
+                    with open(path, "r") as f:
+                        self.uploads[upload] = json.load(f)
+                except (IOError, ValueError):
+                    return None
+            state = self.uploads[upload]
+            return dict(state, received=list(state["received"]))
+
+    def save_upload(self, upload):
+        """Writes the state of an upload, the internal lock must be held."""
+        with self.atomic_open(self.upload_file(upload, ".json")) as f:
+            json.dump(self.uploads[upload], f)
+
+    def write_chunk(self, upload, sequence, stream, length):
+        """Writes a chunk of an upload read from a stream into the dataset file.
+
+        Args:
+            upload (str): id of the upload
+            sequence (int): sequence number of the chunk, the first chunk is 0
+            stream (file): stream to read the slices from
+            length (int): number of bytes to read
+
+        Raises:
+            ValueError: The upload doesn't exist, the sequence number or the length doesn't fit.
+            IOError: The stream ended early or the file can't be written.
+        """
+        state = self.upload_state(upload)
+        if state is None:
+            raise ValueError(f"Unknown upload {upload!r}")
+        slice_bytes = state["x_dim"] * state["y_dim"]
+        first = sequence * state["chunk"]
+        if sequence < 0 or first >= state["count"]:
+            raise ValueError(f"Invalid sequence number {sequence}")
+        if length != (min(first + state["chunk"], state["count"]) - first) * slice_bytes:
+            raise ValueError(f"Invalid length {length} of chunk {sequence}")
+        with open(self.upload_file(upload, ".npy"), "r+b") as f:
+            f.seek(state["offset"] + first * slice_bytes)
+            while length:
+                block = stream.read(min(length, 1 << 20))
+                if not block:
+                    raise IOError(f"Chunk {sequence} incomplete")
+                f.write(block)
+                length -= len(block)
+        with self.lock:
+            received = self.uploads[upload]["received"]
+            if sequence not in received:
+                received.append(sequence)
+                self.save_upload(upload)
+
+    def is_complete(self, state):
+        """Checks whether all chunks of an upload were received.
+
+        Args:
+            state (dict): the state of the upload
+
+        Returns:
+            bool: True if complete, else False
+        """
+        return len(state["received"]) * state["chunk"] >= state["count"]
+
+    def commit_upload(self, upload, name):
+        """Turns a complete upload into the dataset "name".
+
+        Args:
+            upload (str): id of the upload
+            name (str): name of the dataset
+        """
+        path = os.path.join(self.datasets_path, name + self.dataset_extensions[0])
+        self.check_name(name)
+        os.replace(self.upload_file(upload, ".npy"), path)
+        self.added(path)
+        self.remove_upload(upload)
+
+    def remove_upload(self, upload):
+        """Removes the files of an upload.
+
+        Args:
+            upload (str): id of the upload
+        """
+        with self.lock:
+            self.uploads.pop(upload, None)
+        for extension in (".npy", ".json"):
+            try:
+                os.remove(self.upload_file(upload, extension))
+            except OSError:
+                pass
+
+    def remove_stale_uploads(self, max_age):
+        """Removes the uploads without new chunks, left behind by clients that gave up.
+
+        Args:
+            max_age (int): Seconds without a new chunk after which an upload is removed.
+        """
+        for entry in os.scandir(self.datasets_path):
+            if not (entry.name.startswith(UPLOAD_PREFIX) and entry.name.endswith(".json")):
+                continue
+            try:
+                if entry.stat().st_mtime + max_age < time.time():
+                    self.remove_upload(entry.name[len(UPLOAD_PREFIX):-len(".json")])
+            except OSError:
+                pass
+
+    def watch(self):
+        """Refreshes the catalog periodically, to notice files added or removed by others."""
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            self.refresh()
+
+
+class DatasetCache:
+    """Keeps decoded datasets in memory up to a budget of bytes, the least recently used are evicted first.
+     Entries are keyed by name and file version, so a rewritten dataset is read again.
+    """
+    def __init__(self, budget):
+        """Initializes the DatasetCache.
+
+        Args:
+            budget (int): Bytes the cached datasets may occupy.
+        """
+        self.budget = budget
+        self.lock = Lock()
+        # name -> (version, array), least recently used first
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def fits(self, size):
+        """Checks whether a dataset is small enough to be cached.
+
+        Args:
+            size (int): bytes of the dataset
+
+        Returns:
+            bool: True if it fits into the budget, else False
+        """
+        return size <= self.budget
+
+    def get(self, name, version):
+        """Gets a cached dataset.
+
+        Args:
+            name (str): name of the dataset
+            version (Tuple): version of the dataset file, see "Storage.file_version"
+
+        Returns:
+            array: the slices, None if the dataset of this version isn't cached
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return None
+            if entry[0] != version:
+                self.remove(name)
+                return None
+            self.entries.move_to_end(name)
+            return entry[1]
+
+    def put(self, name, version, array):
+        """Caches a dataset, evicting the least recently used ones if the budget is exceeded.
+         The array is made read-only, since it's shared by all requests.
+
+        Args:
+            name (str): name of the dataset
+            version (Tuple): version of the dataset file
+            array (array): the slices
+        """
+        if not self.fits(array.nbytes):
+            return
+        array.setflags(write=False)
+        with self.lock:
+            self.remove(name)
+            while self.entries and self.size + array.nbytes > self.budget:
+                self.remove(next(iter(self.entries)))
+            self.entries[name] = (version, array)
+            self.size += array.nbytes
+
+    def discard(self, name):
+        """Removes a dataset from the cache.
+
+        Args:
+            name (str): name of the dataset
+        """
+        with self.lock:
+            self.remove(name)
+
+    def remove(self, name):
+        """Removes a dataset from the cache, the internal lock must be held."""
+        entry = self.entries.pop(name, None)
+        if entry is not None:
+            self.size -= entry[1].nbytes
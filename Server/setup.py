@@ -13,6 +13,6 @@ setuptools.setup(
      package_data={
         'Server': ['datasets/', 'datasets/*', 'models/', 'models/*']
      }, 
-     install_requires=['tensorflow', 'numpy', 'numba'],
+     install_requires=['tensorflow', 'numpy', 'numba', 'scikit-image'],
      classifiers=[]
  )
\ No newline at end of file